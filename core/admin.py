@@ -1,7 +1,7 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.urls import path
 from core.admin_dashboard_extra import admin_dashboard_extra
-from .models import SubscriptionPlan, Subscription, Payment, Referral, ReferralReward, Ticket, ReferralConfig, Notification, UserProfile, Badge, UserBadge, AnalyticsEvent, UserLevel, ExpertAdvisor, EAFile, LicenseKey, SupportTicket, ForumCategory, ForumTopic, ForumPost, ForumBadge, UserForumBadge, AuditLog, ApiKey
+from .models import SubscriptionPlan, Subscription, Payment, Referral, ReferralReward, Ticket, ReferralConfig, Notification, UserProfile, Badge, UserBadge, AnalyticsEvent, UserLevel, ExpertAdvisor, EAFile, LicenseKey, SupportTicket, ForumCategory, ForumTopic, ForumPost, ForumBadge, UserForumBadge, AuditLog, ApiKey, EAUsageDaily, EAConfigProfile
 from .admin_learning import LearningCategoryAdmin, LearningResourceAdmin, UserProgressAdmin
 from .models_learning import LearningCategory, LearningResource, UserProgress
 from .views import activate_subscription
@@ -91,13 +91,43 @@ admin.site.register(UserLevel, admin.ModelAdmin)
 admin.site.register(ExpertAdvisor, admin.ModelAdmin)
 admin.site.register(EAFile, admin.ModelAdmin)
 admin.site.register(LicenseKey, admin.ModelAdmin)
+
+# --- EA usage rollups: read-only, written by the usage ingestion pipeline ---
+class EAUsageDailyAdmin(admin.ModelAdmin):
+    list_display = ('license', 'date', 'report_count', 'first_report_at', 'last_report_at')
+    list_filter = ('date',)
+    search_fields = ('license__key', 'license__user__username')
+    readonly_fields = ('license', 'date', 'report_count', 'first_report_at', 'last_report_at', 'totals')
+
+admin.site.register(EAUsageDaily, EAUsageDailyAdmin)
+
+# --- EA config profiles: global, per-plan, per-EA and per-EA-and-plan settings layers ---
+class EAConfigProfileAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'ea', 'plan', 'updated_at')
+    list_filter = ('ea', 'plan')
+
+admin.site.register(EAConfigProfile, EAConfigProfileAdmin)
 admin.site.register(SupportTicket, admin.ModelAdmin)
 admin.site.register(ForumCategory, admin.ModelAdmin)
 admin.site.register(ForumTopic, admin.ModelAdmin)
 admin.site.register(ForumPost, admin.ModelAdmin)
 admin.site.register(ForumBadge, admin.ModelAdmin)
 admin.site.register(UserForumBadge, admin.ModelAdmin)
-admin.site.register(ApiKey, admin.ModelAdmin)
+
+# --- API key admin: keys are stored hashed, so the plaintext is shown once on creation ---
+class ApiKeyAdmin(admin.ModelAdmin):
+    list_display = ('user', 'prefix', 'created_at', 'last_used')
+    search_fields = ('user__username', 'prefix')
+    fields = ('user', 'prefix', 'created_at', 'last_used')
+    readonly_fields = ('prefix', 'created_at', 'last_used')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        plain_key = getattr(obj, 'plain_key', None)
+        if plain_key:
+            self.message_user(request, f"New API key for {obj.user.username}: {plain_key} (copy it now, it will not be shown again).", messages.WARNING)
+
+admin.site.register(ApiKey, ApiKeyAdmin)
 
 class AuditLogAdmin(admin.ModelAdmin):
     list_display = ('user', 'action', 'object_type', 'object_id', 'timestamp')
@@ -3,8 +3,10 @@ from django.http import JsonResponse
 from django.db.models import Count, Sum
 from django.shortcuts import render
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from .models import UserLevel, LicenseKey, SupportTicket, ForumPost, ExpertAdvisor, EAFile, Referral, Payment, AnalyticsEvent
+from .models import UserLevel, LicenseKey, SupportTicket, ForumPost, ExpertAdvisor, EAFile, Referral, Payment, AnalyticsEvent, XPLedger
 from .trading_analytics import TradingMetrics, TradeDetail
+from .trading_summary import get_trading_summary
+from .rollups import load_rollups, latest_snapshot, metric_total
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import datetime, timedelta
@@ -13,32 +15,22 @@ import json
 @login_required
 def user_analytics_data(request):
     user = request.user
-    # Example: XP over time (last 30 days)
-    today = timezone.now().date()
+    # XP over time from the XP ledger, one grouped query for the whole window
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 366)
+    except ValueError:
+        days = 30
+    today = timezone.localdate()
+    daily_xp = XPLedger.daily_totals(user, today - timedelta(days=days - 1), today)
     xp_data = []
-    for i in range(29, -1, -1):
+    for i in range(days - 1, -1, -1):
         day = today - timedelta(days=i)
-        xp = UserLevel.objects.filter(user=user, last_activity__date=day).values_list('xp', flat=True).first() or 0
-        xp_data.append({'date': day.isoformat(), 'xp': xp})
+        xp_data.append({'date': day.isoformat(), 'xp': daily_xp.get(day, 0)})
     # Forum contributions
     forum_posts = ForumPost.objects.filter(user=user).count()
     
-    # Trading performance - now using real trading metrics
-    last_30_days = today - timedelta(days=30)
-    metrics = TradingMetrics.objects.filter(user=user, date__gte=last_30_days)
-    
-    profit = metrics.aggregate(total=Sum('net_profit'))['total'] or 0
-    
-    # Calculate win rate
-    total_trades = metrics.aggregate(trades=Sum('total_trades'))['trades'] or 0
-    winning_trades = metrics.aggregate(wins=Sum('winning_trades'))['wins'] or 0
-    
-    win_rate = 0
-    if total_trades > 0:
-        win_rate = (winning_trades / total_trades) * 100
-        
-    # Get max drawdown
-    drawdown = metrics.aggregate(max=Sum('max_drawdown'))['max'] or 0
+    # Trading performance from the shared (cached) trading summary
+    summary = get_trading_summary(user.pk, days=30)
     
     # EA usage
     ea_usage = list(LicenseKey.objects.filter(user=user).values('ea__name').annotate(count=Count('id')).order_by('-count'))
@@ -50,9 +42,9 @@ def user_analytics_data(request):
     return JsonResponse({
         'xp_over_time': xp_data,
         'forum_posts': forum_posts,
-        'profit': float(profit),
-        'win_rate': round(win_rate, 2),
-        'drawdown': float(drawdown),
+        'profit': float(summary['total_profit']),
+        'win_rate': summary['win_rate'],
+        'drawdown': float(summary['max_drawdown']),
         'ea_usage': ea_usage,
         'referral_count': referral_count,
         'referral_rewards': float(rewards)
@@ -60,57 +52,47 @@ def user_analytics_data(request):
 
 @user_passes_test(lambda u: u.is_staff)
 def admin_analytics_data(request):
-    # User growth (last 30 days)
-    today = timezone.now().date()
-    user_model = get_user_model()
+    # Everything comes from the daily rollups (see core.rollups) in one range query
+    today = timezone.localdate()
+    rollups = load_rollups(today - timedelta(days=30), today)
+    joined = rollups['users_joined']['']
     growth = []
     for i in range(29, -1, -1):
         day = today - timedelta(days=i)
-        count = user_model.objects.filter(date_joined__date=day).count()
-        growth.append({'date': day.isoformat(), 'users': count})
-    # License activations
-    licenses = LicenseKey.objects.filter(created_at__gte=today - timedelta(days=29)).count()
-    # Support tickets
-    open_tickets = SupportTicket.objects.filter(status='open').count()
-    closed_tickets = SupportTicket.objects.filter(status='closed').count()
-    # Forum activity
-    forum_posts = ForumPost.objects.filter(created_at__gte=today - timedelta(days=29)).count()
-    # Revenue
-    revenue = Payment.objects.aggregate(total=Sum('amount'))['total'] or 0
-    # Churn/retention (dummy)
-    active_users = user_model.objects.filter(is_active=True).count()
-    churned_users = user_model.objects.filter(is_active=False).count()
-    
-    # Trading metrics
-    last_30_days = today - timedelta(days=30)
-    total_trades = TradeDetail.objects.filter(close_time__gte=last_30_days).count()
-    profitable_trades = TradeDetail.objects.filter(close_time__gte=last_30_days, profit__gt=0).count()
-    trading_profit = TradeDetail.objects.filter(close_time__gte=last_30_days).aggregate(total=Sum('profit'))['total'] or 0
+        growth.append({'date': day.isoformat(), 'users': int(joined.get(day, 0))})
+    last_30_days = today - timedelta(days=29)
+    tickets = latest_snapshot(rollups, 'tickets_by_status')
+    users = latest_snapshot(rollups, 'users_by_state')
+    revenue = latest_snapshot(rollups, 'revenue_total').get('', 0)
     
     return JsonResponse({
         'user_growth': growth,
-        'license_activations': licenses,
-        'open_tickets': open_tickets,
-        'closed_tickets': closed_tickets,
-        'forum_posts': forum_posts,
+        'license_activations': int(metric_total(rollups, 'licenses_created', last_30_days)),
+        'open_tickets': int(tickets.get('open', 0)),
+        'closed_tickets': int(tickets.get('closed', 0)),
+        'forum_posts': int(metric_total(rollups, 'forum_posts', last_30_days)),
         'revenue': float(revenue),
-        'active_users': active_users,
-        'churned_users': churned_users,
-        'total_trades': total_trades,
-        'profitable_trades': profitable_trades,
-        'trading_profit': float(trading_profit)
+        'active_users': int(users.get('active', 0)),
+        'churned_users': int(users.get('inactive', 0)),
+        'total_trades': int(metric_total(rollups, 'trades_closed')),
+        'profitable_trades': int(metric_total(rollups, 'trades_profitable')),
+        'trading_profit': float(metric_total(rollups, 'trade_profit'))
     })
 
 @user_passes_test(lambda u: u.is_staff)
 def admin_analytics_data_chartjs(request):
-    now = timezone.now()
-    labels = []
-    signups = []
-    for i in range(11, -1, -1):
-        month = (now - timedelta(days=now.day-1)).replace(day=1) - timedelta(days=30*i)
-        next_month = (month + timedelta(days=32)).replace(day=1)
-        label = month.strftime('%b %Y')
-        count = User.objects.filter(date_joined__gte=month, date_joined__lt=next_month).count()
-        labels.append(label)
-        signups.append(count)
-    return JsonResponse({'labels': labels[::-1], 'signups': signups[::-1]})
+    # Monthly signups over the last 12 calendar months, newest first, from the daily rollups
+    today = timezone.localdate()
+    months = []
+    month = today.replace(day=1)
+    for _ in range(12):
+        months.append(month)
+        month = (month - timedelta(days=1)).replace(day=1)
+    joined = load_rollups(months[-1], today, metrics=['users_joined'])['users_joined']['']
+    signups = {month: 0 for month in months}
+    for day, value in joined.items():
+        signups[day.replace(day=1)] += int(value)
+    return JsonResponse({
+        'labels': [month.strftime('%b %Y') for month in months],
+        'signups': [signups[month] for month in months],
+    })
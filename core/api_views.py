@@ -1,44 +1,90 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.authtoken.models import Token
 from django.shortcuts import get_object_or_404
 from .models import LicenseKey, ExpertAdvisor
-from .serializers import LicenseKeyValidateSerializer, LicenseKeyActionSerializer, LicenseKeyStatusSerializer
+from .serializers import (
+    LicenseKeyValidateSerializer, LicenseKeyBatchValidateSerializer, LicenseKeyActionSerializer, LicenseKeyStatusSerializer,
+    LicenseKeyListSerializer, SubscriptionStatusSerializer, PaymentHistorySerializer, TradeIngestSerializer,
+)
+from .trading_analytics import upsert_trades
+from .license_cache import get_license_status, validate_license, validate_licenses
+from .ea_usage import record_usage
+from .ea_config import get_ea_config
+from .authentication import ApiAuthentication, resolve_api_key
+from .throttling import ApiKeyRateThrottle
+from .license_tokens import issue_license_token, revoked_since, parse_since
 from django.utils import timezone
+from django.utils.http import parse_etags
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.contrib.auth import authenticate
 from core.models import LicenseKey, Subscription, Payment, ApiKey
 from django.utils.decorators import method_decorator
 from django.views import View
-from rest_framework.throttling import UserRateThrottle
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from itertools import islice
+import json
+
+TRADE_INGEST_BATCH_SIZE = 1000
 
 class ApiKeyAuthMixin:
     def get_user_from_apikey(self, request):
         api_key = request.headers.get('X-API-KEY') or request.GET.get('api_key')
-        if not api_key:
+        return resolve_api_key(api_key)
+
+    def get_user_from_license(self, request):
+        license_key = request.headers.get('X-LICENSE-KEY')
+        if not license_key:
             return None
-        try:
-            key_obj = ApiKey.objects.get(key=api_key)
-            key_obj.last_used = timezone.now()
-            key_obj.save(update_fields=['last_used'])
-            return key_obj.user
-        except ApiKey.DoesNotExist:
+        lic = LicenseKey.objects.select_related('user').filter(key=license_key, status='active').first()
+        if not lic or lic.is_expired:
             return None
+        return lic.user
 
-class ApiKeyRateThrottle(UserRateThrottle):
-    scope = 'apikey'
-    def get_cache_key(self, request, view):
-        api_key = request.headers.get('X-API-KEY') or request.GET.get('api_key')
-        if api_key:
-            return self.cache_format % {
-                'scope': self.scope,
-                'ident': api_key
-            }
-        return super().get_cache_key(request, view)
+class ClientApiPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+class PaginatedListMixin:
+    """Serialize one page of a queryset under ``key``, with count/next/previous links"""
+    pagination_class = ClientApiPagination
+    def list_response(self, queryset, serializer_class, key):
+        page = self.paginator.paginate_queryset(queryset, self.request, view=self)
+        return Response({
+            'count': self.paginator.page.paginator.count,
+            'next': self.paginator.get_next_link(),
+            'previous': self.paginator.get_previous_link(),
+            key: serializer_class(page, many=True).data,
+        })
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = self.pagination_class()
+        return self._paginator
+
+PAGE_PARAMETERS = [
+    openapi.Parameter('page', openapi.IN_QUERY, description='Page number (1-based)', type=openapi.TYPE_INTEGER),
+    openapi.Parameter('page_size', openapi.IN_QUERY, description='Items per page (default 50, max 500)', type=openapi.TYPE_INTEGER),
+]
+
+def paginated_schema(key, item_properties):
+    """Response schema of ``PaginatedListMixin.list_response`` with the page items under ``key``"""
+    link = lambda description: openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_URI, x_nullable=True, description=description)
+    return openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'count': openapi.Schema(type=openapi.TYPE_INTEGER, description='Total number of items'),
+            'next': link('URL of the next page, null on the last page'),
+            'previous': link('URL of the previous page, null on the first page'),
+            key: openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT, properties=item_properties)),
+        },
+        required=['count', 'next', 'previous', key],
+    )
 
 class LicenseValidateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -47,11 +93,26 @@ class LicenseValidateView(APIView):
         serializer.is_valid(raise_exception=True)
         key = serializer.validated_data['key']
         ea_id = serializer.validated_data['ea_id']
-        lic = get_object_or_404(LicenseKey, key=key, ea_id=ea_id)
-        data = LicenseKeyStatusSerializer(lic).data
-        data['valid'] = lic.status == 'active'
+        data = validate_license(key, ea_id)
+        if data is None:
+            return Response({'detail': 'Not found.'}, status=404)
         return Response(data)
 
+class LicenseBatchValidateView(APIView):
+    """Validate every EA of a terminal in one call; accepts ``{"licenses": [...]}`` or a bare list"""
+    permission_classes = [permissions.IsAuthenticated]
+    def post(self, request):
+        payload = {'licenses': request.data} if isinstance(request.data, list) else request.data
+        serializer = LicenseKeyBatchValidateSerializer(data=payload)
+        serializer.is_valid(raise_exception=True)
+        pairs = [(item['key'], item['ea_id']) for item in serializer.validated_data['licenses']]
+        results = []
+        for (key, ea_id), data in zip(pairs, validate_licenses(pairs)):
+            if data is None:
+                data = {'key': key, 'ea': ea_id, 'valid': False, 'detail': 'Not found.'}
+            results.append(data)
+        return Response({'licenses': results})
+
 class LicenseActivateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def post(self, request):
@@ -60,9 +121,7 @@ class LicenseActivateView(APIView):
         key = serializer.validated_data['key']
         lic = get_object_or_404(LicenseKey, key=key)
         if lic.status != 'active':
-            lic.status = 'active'
-            lic.activated_at = timezone.now()
-            lic.save()
+            lic.activate()
         return Response({'activated': True, 'key': lic.key})
 
 class LicenseDeactivateView(APIView):
@@ -73,99 +132,142 @@ class LicenseDeactivateView(APIView):
         key = serializer.validated_data['key']
         lic = get_object_or_404(LicenseKey, key=key)
         if lic.status != 'revoked':
-            lic.status = 'revoked'
-            lic.deactivated_at = timezone.now()
-            lic.save()
+            lic.revoke()
         return Response({'deactivated': True, 'key': lic.key})
 
+class LicenseTokenView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    def post(self, request):
+        serializer = LicenseKeyValidateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        issued = issue_license_token(serializer.validated_data['key'], serializer.validated_data['ea_id'])
+        if issued is None:
+            return Response({'detail': 'License is not valid for this EA.'}, status=403)
+        return Response(issued)
+
+class LicenseRevocationListView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    def get(self, request):
+        try:
+            since = parse_since(request.query_params.get('since'))
+        except ValueError:
+            return Response({'detail': 'since must be epoch seconds or an ISO 8601 datetime.'}, status=400)
+        now = int(timezone.now().timestamp())
+        return Response({'now': now, 'revoked': revoked_since(since)})
+
 class EAConfigView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def get(self, request):
         key = request.query_params.get('key')
         if not key:
             return Response({'detail': 'Missing license key.'}, status=400)
-        lic = get_object_or_404(LicenseKey, key=key, status='active')
-        # Example config, extend as needed
-        config = {
-            'ea_name': lic.ea.name,
-            'plan': lic.plan.name,
-            'user': lic.user.username,
-            'settings': {
-                'max_trades': 5,
-                'risk_level': 'medium',
-            }
-        }
-        return Response({'config': config})
+        compiled = get_ea_config(key)
+        if compiled is None:
+            return Response({'detail': 'Not found.'}, status=404)
+        headers = {'ETag': compiled['etag'], 'Cache-Control': 'private, no-cache'}
+        if compiled['etag'] in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=304, headers=headers)
+        return Response({'config': compiled['config']}, headers=headers)
 
     def post(self, request):
-        # Usage tracking (optional)
+        # Usage reports are buffered and written in batches (core.ea_usage)
         key = request.data.get('key')
         usage = request.data.get('usage')
         if not key or not usage:
             return Response({'detail': 'Missing key or usage.'}, status=400)
-        lic = get_object_or_404(LicenseKey, key=key, status='active')
-        # Log or process usage as needed
-        # For now, just acknowledge receipt
+        if not isinstance(usage, dict):
+            return Response({'detail': 'Usage must be a JSON object.'}, status=400)
+        entry = get_license_status(key)
+        if entry is None or entry['data']['status'] != 'active':
+            return Response({'detail': 'Not found.'}, status=404)
+        if not record_usage(entry['license_id'], usage):
+            # Ingestion is saturated; ask the EA to retry instead of queueing without bound
+            return Response({'detail': 'Usage ingestion is busy, retry shortly.'}, status=503, headers={'Retry-After': '1'})
         return Response({'received': True})
 
-class LicenseListView(APIView, ApiKeyAuthMixin):
+class LicenseListView(PaginatedListMixin, APIView):
+    authentication_classes = [ApiAuthentication]
+    permission_classes = [permissions.AllowAny]
     throttle_classes = [ApiKeyRateThrottle]
+
+    @swagger_auto_schema(
+        operation_description="List the authenticated user's license keys, newest first, one page at a time.",
+        manual_parameters=PAGE_PARAMETERS,
+        responses={
+            200: openapi.Response(
+                description="One page of the user's license keys.",
+                schema=paginated_schema('licenses', {
+                    'key': openapi.Schema(type=openapi.TYPE_STRING),
+                    'status': openapi.Schema(type=openapi.TYPE_STRING),
+                    'created_at': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+                    'expires_at': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME, x_nullable=True),
+                    'ea': openapi.Schema(type=openapi.TYPE_STRING),
+                    'plan': openapi.Schema(type=openapi.TYPE_STRING, x_nullable=True),
+                }),
+            ),
+            403: openapi.Response(description="Invalid credentials or API key")
+        }
+    )
     def post(self, request):
-        user = self.get_user_from_apikey(request)
-        if not user:
-            username = request.data.get('username')
-            password = request.data.get('password')
-            user = authenticate(username=username, password=password)
-        if not user:
+        if not request.user.is_authenticated:
             return Response({'error': 'Invalid credentials or API key'}, status=403)
-        licenses = LicenseKey.objects.filter(user=user)
-        data = [
-            {
-                'key': lic.key,
-                'ea': lic.ea.name,
-                'plan': lic.plan.name,
-                'status': lic.status,
-                'created_at': lic.created_at,
-                'expires_at': lic.expires_at,
-            }
-            for lic in licenses
-        ]
-        return Response({'licenses': data})
-
-class SubscriptionStatusView(APIView, ApiKeyAuthMixin):
+        user = request.user
+        licenses = (
+            LicenseKey.objects.filter(user=user)
+            .select_related('ea', 'plan')
+            .only('key', 'status', 'created_at', 'expires_at', 'ea__name', 'plan__name')
+            .order_by('-created_at', '-id')
+        )
+        return self.list_response(licenses, LicenseKeyListSerializer, 'licenses')
+
+class SubscriptionStatusView(PaginatedListMixin, APIView):
+    authentication_classes = [ApiAuthentication]
+    permission_classes = [permissions.AllowAny]
     throttle_classes = [ApiKeyRateThrottle]
+
+    @swagger_auto_schema(
+        operation_description="List the authenticated user's subscriptions, newest first, one page at a time.",
+        manual_parameters=PAGE_PARAMETERS,
+        responses={
+            200: openapi.Response(
+                description="One page of the user's subscriptions.",
+                schema=paginated_schema('subscriptions', {
+                    'plan': openapi.Schema(type=openapi.TYPE_STRING),
+                    'is_active': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                    'start_date': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+                    'end_date': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME, x_nullable=True),
+                }),
+            ),
+            403: openapi.Response(description="Invalid credentials or API key")
+        }
+    )
     def post(self, request):
-        user = self.get_user_from_apikey(request)
-        if not user:
-            username = request.data.get('username')
-            password = request.data.get('password')
-            user = authenticate(username=username, password=password)
-        if not user:
+        if not request.user.is_authenticated:
             return Response({'error': 'Invalid credentials or API key'}, status=403)
-        subs = Subscription.objects.filter(user=user)
-        data = [
-            {
-                'plan': sub.plan.name,
-                'is_active': sub.is_active,
-                'start_date': sub.start_date,
-                'end_date': sub.end_date,
-            }
-            for sub in subs
-        ]
-        return Response({'subscriptions': data})
-
-class PaymentHistoryView(APIView, ApiKeyAuthMixin):
+        user = request.user
+        subs = (
+            Subscription.objects.filter(user=user)
+            .select_related('plan')
+            .only('is_active', 'start_date', 'end_date', 'plan__name')
+            .order_by('-start_date', '-id')
+        )
+        return self.list_response(subs, SubscriptionStatusSerializer, 'subscriptions')
+
+class PaymentHistoryView(PaginatedListMixin, APIView):
+    authentication_classes = [ApiAuthentication]
+    permission_classes = [permissions.AllowAny]
     throttle_classes = [ApiKeyRateThrottle]
 
     @swagger_auto_schema(
         operation_description="""
         Retrieve the payment history for the authenticated user.
         
-        **Authentication:**
-        - Token or API key required in the Authorization header.
-        - Example: `Authorization: Token <your_token>`
+        **Authentication** (any one of):
+        - API key: `X-API-KEY: <your_api_key>` header or `?api_key=<your_api_key>`
+        - Token: `Authorization: Token <your_token>`
+        - `username` and `password` in the request body (legacy clients)
         
-        **Request Example:**
+        **Request Example** (body only needed for username/password):
         ```json
         {
             "username": "user1",
@@ -176,16 +278,26 @@ class PaymentHistoryView(APIView, ApiKeyAuthMixin):
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             properties={
-                'username': openapi.Schema(type=openapi.TYPE_STRING, description='User username'),
-                'password': openapi.Schema(type=openapi.TYPE_STRING, description='User password'),
+                'username': openapi.Schema(type=openapi.TYPE_STRING, description='User username; only when no API key or token is sent'),
+                'password': openapi.Schema(type=openapi.TYPE_STRING, description='User password; only when no API key or token is sent'),
             },
-            required=['username', 'password']
         ),
+        manual_parameters=PAGE_PARAMETERS,
         responses={
             200: openapi.Response(
-                description="List of payment records for the user.",
+                description="One page of the user's payment records, newest first.",
+                schema=paginated_schema('payments', {
+                    'amount': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DECIMAL),
+                    'status': openapi.Schema(type=openapi.TYPE_STRING),
+                    'created_at': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+                    'method': openapi.Schema(type=openapi.TYPE_STRING),
+                    'invoice_url': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_URI, x_nullable=True),
+                }),
                 examples={
                     "application/json": {
+                        "count": 1,
+                        "next": None,
+                        "previous": None,
                         "payments": [
                             {
                                 "amount": "49.99",
@@ -198,26 +310,89 @@ class PaymentHistoryView(APIView, ApiKeyAuthMixin):
                     }
                 }
             ),
-            403: openapi.Response(description="Invalid credentials or API key")
+            401: openapi.Response(description="Invalid API key, token or username/password"),
+            403: openapi.Response(description="No credentials sent")
         }
     )
     def post(self, request):
-        user = self.get_user_from_apikey(request)
-        if not user:
-            username = request.data.get('username')
-            password = request.data.get('password')
-            user = authenticate(username=username, password=password)
-        if not user:
+        if not request.user.is_authenticated:
             return Response({'error': 'Invalid credentials or API key'}, status=403)
-        payments = Payment.objects.filter(user=user)
-        data = [
-            {
-                'amount': pay.amount,
-                'status': pay.status,
-                'created_at': pay.created_at,
-                'method': pay.method,
-                'invoice_url': getattr(pay, 'invoice_url', None),
-            }
-            for pay in payments
-        ]
-        return Response({'payments': data})
+        user = request.user
+        payments = (
+            Payment.objects.filter(user=user)
+            .only('amount', 'status', 'created_at', 'method')
+            .order_by('-created_at', '-id')
+        )
+        return self.list_response(payments, PaymentHistorySerializer, 'payments')
+
+class TradeBulkIngestView(APIView, ApiKeyAuthMixin):
+    """
+    Upsert closed/open trades pushed by EAs, keyed by (user, ticket_id).
+    
+    Accepts either a JSON array (or ``{"trades": [...]}``) or an NDJSON body
+    (``Content-Type: application/x-ndjson``), which is consumed line by line so
+    large uploads never have to be held in memory as a whole.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        user = self.get_user_from_license(request) or self.get_user_from_apikey(request)
+        if not user:
+            return Response({'error': 'Invalid license key or API key'}, status=403)
+
+        if request.content_type.startswith('application/x-ndjson'):
+            rows = self._iter_ndjson(request)
+        else:
+            payload = request.data
+            if isinstance(payload, dict):
+                payload = payload.get('trades')
+            if not isinstance(payload, list):
+                return Response({'detail': 'Expected a JSON array of trades.'}, status=400)
+            rows = iter(payload)
+
+        results = []
+        summary = {'created': 0, 'updated': 0, 'superseded': 0, 'invalid': 0}
+        index = 0
+        while True:
+            batch = list(islice(rows, TRADE_INGEST_BATCH_SIZE))
+            if not batch:
+                break
+            for result in self._ingest_batch(user, batch, index):
+                summary[result['status']] += 1
+                results.append(result)
+            index += len(batch)
+
+        return Response({'received': index, **summary, 'results': results})
+
+    def _iter_ndjson(self, request):
+        for line in request.stream or []:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+    def _ingest_batch(self, user, batch, offset):
+        results = [None] * len(batch)
+        valid = []
+        for i, row in enumerate(batch):
+            if not isinstance(row, dict):
+                results[i] = {'index': offset + i, 'ticket_id': None, 'status': 'invalid', 'errors': {'non_field_errors': ['Malformed trade record.']}}
+                continue
+            serializer = TradeIngestSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((i, serializer.validated_data))
+            else:
+                results[i] = {'index': offset + i, 'ticket_id': row.get('ticket_id'), 'status': 'invalid', 'errors': serializer.errors}
+
+        # Later duplicates of a ticket in the same batch supersede earlier ones
+        last_seen = {data['ticket_id']: i for i, data in valid}
+        outcome = upsert_trades(user, [data for i, data in valid if last_seen[data['ticket_id']] == i])
+        for i, data in valid:
+            ticket_id = data['ticket_id']
+            status_ = outcome[ticket_id] if last_seen[ticket_id] == i else 'superseded'
+            results[i] = {'index': offset + i, 'ticket_id': ticket_id, 'status': status_}
+        return results
@@ -0,0 +1,141 @@
+"""
+Async (ASGI-native) variants of the license API views.
+
+Under ASGI these views run on the event loop instead of occupying a
+worker thread per request, which suits EAs that keep thousands of
+mostly idle connections open. They mirror the DRF views in
+core/api_views.py (same payloads, same responses) and are served under
+/api/async/. Cache and ORM access go through the async APIs; model saves
+still run their signal handlers in a thread via sync_to_async.
+"""
+from django.http import JsonResponse, HttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
+from functools import wraps
+import json
+
+from .authentication import resolve_token
+from .ea_config import aget_ea_config
+from .license_cache import avalidate_license
+from .models import LicenseKey
+from .serializers import LicenseKeyValidateSerializer, LicenseKeyActionSerializer
+
+
+def _no_response(request):
+    return None
+
+
+async def _authenticate(request):
+    """
+    Token header first, then the session with the CSRF check DRF applies
+    to it. Returns ``(user, None)``, or ``(None, response)`` for a failed
+    CSRF check; ``user`` is None without valid credentials.
+    """
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) == 2 and auth[0].lower() == 'token':
+        return await sync_to_async(resolve_token)(auth[1]), None
+    user = await request.auser()
+    if not user.is_authenticated:
+        return None, None
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        rejected = await sync_to_async(CsrfViewMiddleware(_no_response).process_view)(request, None, (), {})
+        if rejected is not None:
+            return None, rejected
+    return user, None
+
+
+def async_api_view(*methods):
+    """Restrict methods and require an authenticated user, DRF style"""
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            user, rejected = await _authenticate(request)
+            if rejected is not None:
+                return rejected
+            if user is None:
+                return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _request_data(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST
+
+
+def _validated(serializer_class, request):
+    data = _request_data(request)
+    if data is None:
+        return None, JsonResponse({'detail': 'JSON parse error.'}, status=400)
+    serializer = serializer_class(data=data)
+    if not serializer.is_valid():
+        return None, JsonResponse(serializer.errors, status=400)
+    return serializer.validated_data, None
+
+
+@async_api_view('POST')
+async def license_validate(request):
+    data, error = _validated(LicenseKeyValidateSerializer, request)
+    if error:
+        return error
+    result = await avalidate_license(data['key'], data['ea_id'])
+    if result is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    return JsonResponse(result)
+
+
+async def _get_license(key):
+    return await LicenseKey.objects.filter(key=key).afirst()
+
+
+@async_api_view('POST')
+async def license_activate(request):
+    data, error = _validated(LicenseKeyActionSerializer, request)
+    if error:
+        return error
+    lic = await _get_license(data['key'])
+    if lic is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    if lic.status != 'active':
+        await sync_to_async(lic.activate)()
+    return JsonResponse({'activated': True, 'key': lic.key})
+
+
+@async_api_view('POST')
+async def license_deactivate(request):
+    data, error = _validated(LicenseKeyActionSerializer, request)
+    if error:
+        return error
+    lic = await _get_license(data['key'])
+    if lic is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    if lic.status != 'revoked':
+        await sync_to_async(lic.revoke)()
+    return JsonResponse({'deactivated': True, 'key': lic.key})
+
+
+@async_api_view('GET')
+async def ea_config(request):
+    key = request.GET.get('key')
+    if not key:
+        return JsonResponse({'detail': 'Missing license key.'}, status=400)
+    compiled = await aget_ea_config(key)
+    if compiled is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    if compiled['etag'] in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=304)
+    else:
+        response = JsonResponse({'config': compiled['config']})
+    response['ETag'] = compiled['etag']
+    response['Cache-Control'] = 'private, no-cache'
+    return response
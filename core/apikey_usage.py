@@ -0,0 +1,50 @@
+"""
+Write-behind buffer for ApiKey.last_used.
+
+Stamping last_used on every authenticated call turns read-only API
+traffic into writes. Instead each use is queued on a ``BatchBuffer``
+and written by its flush thread once API_KEY_LAST_USED_BATCH_SIZE uses
+are waiting or API_KEY_LAST_USED_FLUSH_INTERVAL seconds after the first
+one, with one bulk update that keeps only the latest use of each key.
+Pending uses are also flushed at interpreter exit, so a quiet period or
+a restart does not lose them; last_used is at most one interval stale.
+"""
+from django.conf import settings
+from django.utils import timezone
+from typing import List, Tuple
+
+from .buffering import BatchBuffer
+from .models import ApiKey
+
+FLUSH_INTERVAL = getattr(settings, 'API_KEY_LAST_USED_FLUSH_INTERVAL', 60)
+
+
+def write_last_used(rows: List[Tuple[int, object]]) -> None:
+    """Store the latest queued use of each key in one bulk update"""
+    latest = {}
+    for key_id, when in rows:
+        if key_id not in latest or when > latest[key_id]:
+            latest[key_id] = when
+    ApiKey.objects.bulk_update(
+        [ApiKey(id=key_id, last_used=when) for key_id, when in latest.items()],
+        ['last_used'],
+    )
+
+
+usage_buffer = BatchBuffer(
+    write_last_used,
+    batch_size=getattr(settings, 'API_KEY_LAST_USED_BATCH_SIZE', 1000),
+    flush_interval=FLUSH_INTERVAL,
+    max_pending=getattr(settings, 'API_KEY_LAST_USED_MAX_PENDING', 20000),
+    name='apikey-last-used',
+)
+
+
+def touch_api_key(key_id: int, when=None) -> None:
+    """Record a use of an API key; written by the buffer's next flush"""
+    usage_buffer.put((key_id, when or timezone.now()))
+
+
+def flush_api_key_usage() -> int:
+    """Write all pending last_used timestamps now; returns the uses handed over"""
+    return usage_buffer.flush()
@@ -0,0 +1,313 @@
+"""
+Month-partitioned archival of append-only log tables.
+
+AnalyticsEvent and AuditLog only ever grow. ``archive_before`` moves
+rows older than a cutoff out of the hot table into compressed files
+partitioned by local calendar month under ``settings.ARCHIVE_ROOT``
+(default MEDIA_ROOT/archive): Parquet when pyarrow is installed, gzip'd
+CSV otherwise. Each run writes one part file per month under a
+temporary name, renames it into place and only then deletes the rows
+from the table in small chunks, so a crash never loses rows (at worst
+a re-run archives a row twice, which the readers de-duplicate by id).
+
+Next to each part file goes a ``.summary.json`` with the counters in
+``SUMMARIES`` (e.g. EA downloads per file) and the part's last id, so
+reports like the bot download ranking add ``archived_counts`` to a
+hot-table aggregate instead of reading every archived row. A row that a
+re-run archives again has an id no greater than the month's previous
+parts and is left out of the new summary. Parts written before
+summaries existed get theirs the first time they are counted.
+
+``history`` reads a table the way reports need it: archived months
+first, then whatever is still in the hot table, as plain dicts.
+"""
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import csv
+import glob
+import gzip
+import json
+import os
+
+from .models import AnalyticsEvent, AuditLog
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Archive name -> (model, timestamp field)
+ARCHIVES = {
+    'analytics_events': (AnalyticsEvent, 'created_at'),
+    'audit_logs': (AuditLog, 'timestamp'),
+}
+# Archive name -> {summary name: row -> the key the row counts towards, or None}
+SUMMARIES: Dict[str, Dict[str, Callable[[Dict[str, Any]], Optional[str]]]] = {
+    'audit_logs': {
+        'ea_downloads': lambda row: row['object_id'] if row['action'] == 'ea_download' and row['object_type'] == 'EAFile' else None,
+    },
+}
+PART_EXTENSIONS = ('.parquet', '.csv.gz')
+SUMMARY_SUFFIX = '.summary.json'
+# Internal types stored as text in the archive files that read back as int
+INTEGER_FIELDS = ('AutoField', 'BigAutoField', 'ForeignKey', 'IntegerField', 'BigIntegerField', 'PositiveIntegerField')
+
+
+def archive_root() -> str:
+    return getattr(settings, 'ARCHIVE_ROOT', None) or os.path.join(settings.MEDIA_ROOT, 'archive')
+
+
+def _archive(name: str):
+    try:
+        return ARCHIVES[name]
+    except KeyError:
+        raise ValueError(f"Unknown archive {name!r}; expected one of {', '.join(ARCHIVES)}")
+
+
+def _columns(model) -> List[str]:
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _month_start(day: date) -> datetime:
+    return timezone.make_aware(datetime(day.year, day.month, 1))
+
+
+def _next_month(start: datetime) -> datetime:
+    return _month_start((start.replace(tzinfo=None) + timedelta(days=32)).date())
+
+
+def _encoders(model) -> List:
+    encoders = []
+    for field in model._meta.concrete_fields:
+        if field.get_internal_type() == 'JSONField':
+            encoders.append(lambda value: None if value is None else json.dumps(value))
+        elif field.get_internal_type() == 'DateTimeField':
+            encoders.append(lambda value: None if value is None else value.isoformat())
+        else:
+            encoders.append(lambda value: value)
+    return encoders
+
+
+def _decode(model, row: Dict[str, Any]) -> Dict[str, Any]:
+    # CSV gives back strings (and Parquet keeps our encoded strings); restore field types
+    for field in model._meta.concrete_fields:
+        value = row.get(field.attname)
+        if value is None or value == '':
+            row[field.attname] = None if field.null or field.is_relation else value
+        elif field.get_internal_type() in INTEGER_FIELDS:
+            row[field.attname] = int(value)
+        elif field.get_internal_type() == 'DateTimeField':
+            row[field.attname] = datetime.fromisoformat(value)
+        elif field.get_internal_type() == 'JSONField':
+            row[field.attname] = json.loads(value)
+    return row
+
+
+def _write_month(path: str, extension: str, columns: List[str], rows: Iterator[Tuple]) -> int:
+    """Write rows to ``path`` as Parquet or gzip'd CSV; returns the row count"""
+    count = 0
+    if extension == 'parquet':
+        schema = pyarrow.schema([(column, pyarrow.string()) for column in columns])
+        writer = pyarrow.parquet.ParquetWriter(path, schema, compression='zstd')
+        batch = []
+        try:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= 10000:
+                    count += len(batch)
+                    writer.write_table(_parquet_table(schema, columns, batch))
+                    batch = []
+            if batch:
+                count += len(batch)
+                writer.write_table(_parquet_table(schema, columns, batch))
+        finally:
+            writer.close()
+        return count
+    with gzip.open(path, 'wt', newline='', encoding='utf-8') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def _parquet_table(schema, columns: List[str], batch: List[Tuple]):
+    return pyarrow.table(
+        {column: [None if row[i] is None else str(row[i]) for row in batch] for i, column in enumerate(columns)},
+        schema=schema,
+    )
+
+
+def _parts(name: str, label: str) -> List[str]:
+    """Finished part files of one month, oldest first"""
+    return sorted(
+        path for path in glob.glob(os.path.join(archive_root(), name, label, 'part-*'))
+        if path.endswith(PART_EXTENSIONS)
+    )
+
+
+class _Tally:
+    """Counts ``SUMMARIES[name]`` over rows whose id is above ``after_id``"""
+    def __init__(self, name: str, after_id: int):
+        self.summaries = SUMMARIES.get(name, {})
+        self.after_id = after_id
+        self.last_id = after_id
+        self.counts = {summary: Counter() for summary in self.summaries}
+
+    def add(self, row: Dict[str, Any]) -> None:
+        if row['id'] <= self.after_id:
+            return
+        self.last_id = max(self.last_id, row['id'])
+        for summary, key_of in self.summaries.items():
+            key = key_of(row)
+            if key is not None:
+                self.counts[summary][str(key)] += 1
+
+    def write(self, path: str) -> None:
+        with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+            json.dump({'last_id': self.last_id, 'counts': self.counts}, handle)
+        os.replace(path + '.tmp', path)
+
+
+def _summaries(name: str, label: str) -> Iterator[Dict[str, Any]]:
+    """Summaries of one month's parts, writing any that are missing"""
+    model, _ = _archive(name)
+    last_id = 0
+    for path in _parts(name, label):
+        summary_path = path + SUMMARY_SUFFIX
+        try:
+            with open(summary_path, encoding='utf-8') as handle:
+                summary = json.load(handle)
+        except FileNotFoundError:
+            tally = _Tally(name, last_id)
+            for row in _read_part(path):
+                tally.add(_decode(model, row))
+            tally.write(summary_path)
+            summary = {'last_id': tally.last_id, 'counts': tally.counts}
+        last_id = max(last_id, summary['last_id'])
+        yield summary
+
+
+def _month_last_id(name: str, label: str) -> int:
+    return max((summary['last_id'] for summary in _summaries(name, label)), default=0)
+
+
+def archive_before(name: str, cutoff: datetime, chunk_size: int = 5000) -> Dict[str, int]:
+    """
+    Move rows of archive ``name`` older than ``cutoff`` into monthly files
+
+    Returns:
+        Rows archived per month, e.g. ``{'2024-05': 1200}``
+    """
+    model, field = _archive(name)
+    columns = _columns(model)
+    encoders = _encoders(model)
+    old = model.objects.filter(**{f'{field}__lt': cutoff})
+    first = old.aggregate(first=Min(field))['first']
+    archived = {}
+    if first is None:
+        return archived
+    extension = 'parquet' if pyarrow is not None else 'csv.gz'
+    start = _month_start(timezone.localtime(first).date())
+    while start < cutoff:
+        end = min(_next_month(start), cutoff)
+        month = old.filter(**{f'{field}__gte': start, f'{field}__lt': end})
+        last_pk = month.aggregate(last=Max('pk'))['last']
+        if last_pk is not None:
+            # Freeze the month at its current rows so late inserts are left for the next run
+            month = month.filter(pk__lte=last_pk)
+            label = start.strftime('%Y-%m')
+            directory = os.path.join(archive_root(), name, label)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{timezone.now():%Y%m%dT%H%M%S%f}.{extension}")
+            tally = _Tally(name, _month_last_id(name, label))
+            count = _write_month(path + '.tmp', extension, columns, _tallied(tally, columns, encoders, month, chunk_size))
+            # Summary first, so every finished part already has one
+            tally.write(path + SUMMARY_SUFFIX)
+            os.replace(path + '.tmp', path)
+            while True:
+                pks = list(month.values_list('pk', flat=True)[:chunk_size])
+                if not pks:
+                    break
+                model.objects.filter(pk__in=pks).delete()
+            archived[label] = count
+        start = _next_month(start)
+    return archived
+
+
+def _tallied(tally: _Tally, columns: List[str], encoders: List, month, chunk_size: int) -> Iterator[Tuple]:
+    for row in month.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size):
+        tally.add(dict(zip(columns, row)))
+        yield tuple(encode(value) for encode, value in zip(encoders, row))
+
+
+def archived_months(name: str) -> List[str]:
+    """Months (``YYYY-MM``) that have archive files, oldest first"""
+    _archive(name)
+    return sorted(os.path.basename(path) for path in glob.glob(os.path.join(archive_root(), name, '????-??')))
+
+
+def _read_part(path: str) -> Iterator[Dict[str, Any]]:
+    if path.endswith('.parquet'):
+        if pyarrow is None:
+            raise RuntimeError(f"Reading {path} requires pyarrow")
+        yield from pyarrow.parquet.read_table(path).to_pylist()
+    else:
+        with gzip.open(path, 'rt', newline='', encoding='utf-8') as handle:
+            yield from csv.DictReader(handle)
+
+
+def archived_rows(name: str, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """Archived rows with ``since <= timestamp < until``, oldest month first"""
+    model, field = _archive(name)
+    for label in archived_months(name):
+        start = _month_start(date.fromisoformat(f'{label}-01'))
+        if (until is not None and start >= until) or (since is not None and _next_month(start) <= since):
+            continue
+        seen = set()
+        for path in _parts(name, label):
+            for row in _read_part(path):
+                row = _decode(model, row)
+                if row['id'] in seen:
+                    continue
+                seen.add(row['id'])
+                if (since is None or row[field] >= since) and (until is None or row[field] < until):
+                    yield row
+
+
+def archived_counts(name: str, summary: str) -> Counter:
+    """Totals of counter ``summary`` (see ``SUMMARIES``) over every archived month"""
+    _archive(name)
+    if summary not in SUMMARIES.get(name, {}):
+        raise ValueError(f"Unknown summary {summary!r} for archive {name!r}")
+    counts = Counter()
+    for label in archived_months(name):
+        for part in _summaries(name, label):
+            counts.update(part['counts'].get(summary, {}))
+    return counts
+
+
+def history(name: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+            **filters: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Rows of archive ``name`` from both the archive files and the hot table
+
+    ``filters`` are exact matches on column names (e.g. ``action='ea_download'``,
+    ``user_id=3``). Rows are plain dicts keyed like ``.values()``.
+    """
+    model, field = _archive(name)
+    for row in archived_rows(name, since, until):
+        if all(row.get(key) == value for key, value in filters.items()):
+            yield row
+    hot = model.objects.filter(**filters)
+    if since is not None:
+        hot = hot.filter(**{f'{field}__gte': since})
+    if until is not None:
+        hot = hot.filter(**{f'{field}__lt': until})
+    yield from hot.order_by(field, 'pk').values(*_columns(model)).iterator()
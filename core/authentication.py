@@ -0,0 +1,164 @@
+"""
+Unified, cache-backed authentication for the client API.
+
+``ApiAuthentication`` accepts, in order, an ``X-API-KEY`` header (or
+``api_key`` query parameter), an ``Authorization: Token <key>`` header,
+or ``username``/``password`` in the request body. API keys are stored
+hashed and looked up by their indexed prefix.
+
+Resolved principals are cached in the shared cache (core.shared_cache),
+so a revocation in one worker reaches all of them, for
+AUTH_CACHE_TIMEOUT seconds under a keyed hash of the presented secret, so neither plaintext secrets nor
+password hashes end up in the cache. Each entry carries a fingerprint of
+the user's password hash and active flag; it is only honoured while it
+matches the current fingerprint, which the User post_save signal keeps
+up to date. Changing a password or deactivating a user therefore
+invalidates every cached credential at once, and repeated
+username/password calls skip PBKDF2.
+"""
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.utils.crypto import salted_hmac
+from rest_framework import authentication, exceptions
+from rest_framework.authtoken.models import Token
+from typing import Optional, Tuple
+
+from .models import ApiKey, API_KEY_PREFIX_LENGTH, hash_api_key
+from .apikey_usage import touch_api_key
+from .shared_cache import invalidate_on_commit, now_and_on_commit, shared_cache
+
+AUTH_CACHE_TIMEOUT = getattr(settings, 'API_AUTH_CACHE_TIMEOUT', 60)
+
+
+def _digest(kind: str, secret: str) -> str:
+    return salted_hmac(f'core.api_auth.{kind}', secret, algorithm='sha256').hexdigest()
+
+
+def _principal_key(kind: str, secret: str) -> str:
+    return f'api_auth:{kind}:{_digest(kind, secret)}'
+
+
+def _fingerprint_key(user_id: int) -> str:
+    return f'api_auth:fingerprint:{user_id}'
+
+
+def user_fingerprint(user) -> str:
+    """Fingerprint of the credentials state of a user"""
+    return _digest('fingerprint', f'{user.password}:{user.is_active}')
+
+
+def remember_user_fingerprint(user) -> None:
+    key, fingerprint = _fingerprint_key(user.pk), user_fingerprint(user)
+    now_and_on_commit(lambda: shared_cache().set(key, fingerprint, AUTH_CACHE_TIMEOUT))
+
+
+def forget_api_key(hashed_key: str) -> None:
+    invalidate_on_commit(f'api_auth:apikey:{hashed_key}')
+
+
+def forget_token(token_key: str) -> None:
+    invalidate_on_commit(_principal_key('token', token_key))
+
+
+def _cached_user(cache_key: str):
+    cache = shared_cache()
+    entry = cache.get(cache_key)
+    if entry is None:
+        return None
+    user, fingerprint, api_key_id = entry
+    if cache.get(_fingerprint_key(user.pk)) != fingerprint:
+        cache.delete(cache_key)
+        return None
+    return user, api_key_id
+
+
+def _cache_user(cache_key: str, user, api_key_id: Optional[int] = None) -> None:
+    fingerprint = user_fingerprint(user)
+    shared_cache().set_many({
+        _fingerprint_key(user.pk): fingerprint,
+        cache_key: (user, fingerprint, api_key_id),
+    }, AUTH_CACHE_TIMEOUT)
+
+
+def resolve_api_key(raw_key: str):
+    """Return the active user owning an API key, or None"""
+    if not raw_key:
+        return None
+    # API key entries are keyed by the stored hash so the model signals can drop them
+    cache_key = f'api_auth:apikey:{hash_api_key(raw_key)}'
+    cached = _cached_user(cache_key)
+    if cached is not None:
+        user, api_key_id = cached
+    else:
+        candidates = ApiKey.objects.select_related('user').filter(prefix=raw_key[:API_KEY_PREFIX_LENGTH])
+        api_key = next((candidate for candidate in candidates if candidate.check_key(raw_key)), None)
+        if api_key is None or not api_key.user.is_active:
+            return None
+        user, api_key_id = api_key.user, api_key.id
+        _cache_user(cache_key, user, api_key_id)
+    touch_api_key(api_key_id)
+    return user
+
+
+def resolve_token(token_key: str):
+    """Return the active user owning a DRF token, or None"""
+    if not token_key:
+        return None
+    cache_key = _principal_key('token', token_key)
+    cached = _cached_user(cache_key)
+    if cached is not None:
+        return cached[0]
+    token = Token.objects.select_related('user').filter(key=token_key).first()
+    if token is None or not token.user.is_active:
+        return None
+    _cache_user(cache_key, token.user)
+    return token.user
+
+
+def resolve_credentials(username: str, password: str, request=None):
+    """Return the user for a username/password pair, or None"""
+    if not username or not password:
+        return None
+    cache_key = _principal_key('password', f'{username}\0{password}')
+    cached = _cached_user(cache_key)
+    if cached is not None:
+        return cached[0]
+    user = authenticate(request, username=username, password=password)
+    if user is None:
+        return None
+    _cache_user(cache_key, user)
+    return user
+
+
+class ApiAuthentication(authentication.BaseAuthentication):
+    """API key, token or username/password authentication backed by the cache"""
+    keyword = 'Token'
+
+    def authenticate(self, request) -> Optional[Tuple[object, None]]:
+        api_key = request.headers.get('X-API-KEY') or request.query_params.get('api_key')
+        if api_key:
+            return self._result(resolve_api_key(api_key), 'Invalid API key.')
+
+        auth = authentication.get_authorization_header(request).split()
+        if auth and auth[0].lower() == self.keyword.lower().encode():
+            if len(auth) != 2:
+                raise exceptions.AuthenticationFailed('Invalid token header.')
+            try:
+                token_key = auth[1].decode()
+            except UnicodeError:
+                raise exceptions.AuthenticationFailed('Invalid token header.')
+            return self._result(resolve_token(token_key), 'Invalid token.')
+
+        data = request.data
+        if hasattr(data, 'get') and data.get('username') and data.get('password'):
+            user = resolve_credentials(data.get('username'), data.get('password'), request._request)
+            return self._result(user, 'Invalid username or password.')
+        return None
+
+    def _result(self, user, message):
+        if user is None:
+            raise exceptions.AuthenticationFailed(message)
+        return (user, None)
+
+    def authenticate_header(self, request):
+        return self.keyword
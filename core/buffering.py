@@ -0,0 +1,122 @@
+"""
+In-process write-behind buffering for high-volume inserts.
+
+A ``BatchBuffer`` collects rows from request threads and hands them to a
+flush function in batches: as soon as ``batch_size`` rows are queued, or
+``flush_interval`` seconds after the first queued row, whichever comes
+first. A daemon thread does the flushing, so requests only pay for an
+append under a lock. Once ``max_pending`` rows are waiting the buffer
+refuses new rows (``put`` returns False) and callers push back on the
+client instead of growing memory without bound. ``stats()`` reports
+accepted, dropped, written and failed row counts. Pending rows are
+flushed at interpreter exit.
+
+With ``settings.BATCH_BUFFER_SYNC`` set (e.g. in tests or management
+commands) every ``put`` is flushed immediately in the calling thread.
+"""
+from django.conf import settings
+from django.db import close_old_connections
+from typing import Any, Callable, Dict, List
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BatchBuffer:
+    def __init__(self, flush_func: Callable[[List[Any]], Any], batch_size: int = 500,
+                 flush_interval: float = 0.5, max_pending: int = 10000, name: str = 'buffer'):
+        self.flush_func = flush_func
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.name = name
+        self._rows = []
+        self._first_queued = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._exit_hook = False
+        self._stats = {'accepted': 0, 'dropped': 0, 'written': 0, 'failed': 0, 'batches': 0}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def stats(self) -> Dict[str, int]:
+        """Counters since start: rows accepted, dropped on overflow, written and lost to failed flushes"""
+        with self._lock:
+            return dict(self._stats, pending=len(self._rows))
+
+    def put(self, row: Any) -> bool:
+        """Queue a row; returns False if the buffer is full and the row was dropped"""
+        if getattr(settings, 'BATCH_BUFFER_SYNC', False):
+            with self._lock:
+                self._stats['accepted'] += 1
+            self._write([row])
+            return True
+        with self._lock:
+            if len(self._rows) >= self.max_pending:
+                self._stats['dropped'] += 1
+                if self._stats['dropped'] in (1, 10, 100) or self._stats['dropped'] % 1000 == 0:
+                    logger.warning('%s: queue full, %d rows dropped so far', self.name, self._stats['dropped'])
+                return False
+            self._stats['accepted'] += 1
+            self._rows.append(row)
+            if self._first_queued is None:
+                # Start the flush timer
+                self._first_queued = time.monotonic()
+                self._wakeup.notify()
+            elif len(self._rows) >= self.batch_size:
+                self._wakeup.notify()
+            self._ensure_thread()
+        return True
+
+    def flush(self) -> int:
+        """Write every queued row now; returns the number of rows handed over"""
+        written = 0
+        while True:
+            with self._lock:
+                batch, self._rows = self._rows[:self.batch_size], self._rows[self.batch_size:]
+                self._first_queued = time.monotonic() if self._rows else None
+            if not batch:
+                return written
+            self._write(batch)
+            written += len(batch)
+
+    def _write(self, batch: List[Any]) -> None:
+        with self._flush_lock:
+            try:
+                self.flush_func(batch)
+            except Exception:
+                logger.exception('%s: dropped a batch of %d rows', self.name, len(batch))
+                outcome = 'failed'
+            else:
+                outcome = 'written'
+        with self._lock:
+            self._stats[outcome] += len(batch)
+            self._stats['batches'] += 1
+
+    def _ensure_thread(self) -> None:
+        # Called with the lock held
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-flusher', daemon=True)
+            self._thread.start()
+            if not self._exit_hook:
+                atexit.register(self.flush)
+                self._exit_hook = True
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._rows:
+                    self._wakeup.wait()
+                while len(self._rows) < self.batch_size:
+                    remaining = self._first_queued + self.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+            close_old_connections()
+            self.flush()
@@ -0,0 +1,111 @@
+"""
+Compiled, versioned EA configuration per license.
+
+EAConfigProfile rows are merged from the most general to the most
+specific scope (global, plan, EA, EA and plan) on top of
+DEFAULT_EA_SETTINGS. The compiled blob is cached per license together
+with an ETag derived from its content, so polling EAs are answered from
+the cache and, when nothing changed, with an empty 304.
+
+Any change to a profile, EA or plan bumps a global config version that
+is part of every cache key; license (and license owner) changes drop
+that license's entry. Entries live in the shared cache
+(core.shared_cache).
+"""
+from django.db.models import Q
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import uuid
+
+from .models import LicenseKey, EAConfigProfile
+from .shared_cache import now_and_on_commit, shared_cache
+
+EA_CONFIG_CACHE_TIMEOUT = 60 * 60
+DEFAULT_EA_SETTINGS = {
+    'max_trades': 5,
+    'risk_level': 'medium',
+}
+_VERSION_KEY = 'ea_config_version'
+
+
+def _scope_rank(profile: EAConfigProfile) -> int:
+    return (profile.ea_id is not None) * 2 + (profile.plan_id is not None)
+
+
+def _cache_key(key: str, version: str) -> str:
+    return f"ea_config:{hashlib.sha1(str(key).encode()).hexdigest()}:{version}"
+
+
+def _active_license(key: str):
+    return LicenseKey.objects.select_related('ea', 'plan', 'user').filter(key=key, status='active')
+
+
+def _profiles(lic: LicenseKey):
+    return EAConfigProfile.objects.filter(
+        Q(ea__isnull=True) | Q(ea_id=lic.ea_id),
+        Q(plan__isnull=True) | Q(plan_id=lic.plan_id),
+    ).order_by('id')
+
+
+def _compile(lic: LicenseKey, profiles) -> Dict[str, Any]:
+    settings = dict(DEFAULT_EA_SETTINGS)
+    for profile in sorted(profiles, key=_scope_rank):
+        settings.update(profile.settings)
+    config = {
+        'ea_name': lic.ea.name,
+        'plan': lic.plan.name,
+        'user': lic.user.username,
+        'settings': settings,
+    }
+    blob = json.dumps(config, sort_keys=True, separators=(',', ':'), default=str)
+    return {'config': config, 'etag': '"%s"' % hashlib.sha256(blob.encode()).hexdigest()[:32]}
+
+
+def compile_ea_config(key: str) -> Optional[Dict[str, Any]]:
+    """Build the config of an active license from the database, or None"""
+    lic = _active_license(key).first()
+    if lic is None:
+        return None
+    return _compile(lic, list(_profiles(lic)))
+
+
+def get_ea_config(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the cached ``{'config': ..., 'etag': ...}`` of a license, or None
+    if the license is unknown or not active
+    """
+    cache = shared_cache()
+    cache_key = _cache_key(key, cache.get(_VERSION_KEY, ''))
+    compiled = cache.get(cache_key)
+    if compiled is None:
+        compiled = compile_ea_config(key)
+        if compiled is None:
+            return None
+        cache.set(cache_key, compiled, EA_CONFIG_CACHE_TIMEOUT)
+    return compiled
+
+
+async def aget_ea_config(key: str) -> Optional[Dict[str, Any]]:
+    """Async variant of ``get_ea_config`` using the async cache and ORM APIs"""
+    cache = shared_cache()
+    cache_key = _cache_key(key, await cache.aget(_VERSION_KEY, ''))
+    compiled = await cache.aget(cache_key)
+    if compiled is None:
+        lic = await _active_license(key).afirst()
+        if lic is None:
+            return None
+        compiled = _compile(lic, [profile async for profile in _profiles(lic)])
+        await cache.aset(cache_key, compiled, EA_CONFIG_CACHE_TIMEOUT)
+    return compiled
+
+
+def invalidate_ea_config(key: Optional[str] = None) -> None:
+    """Drop the compiled config of one license, or of every license if no key is given"""
+    def drop():
+        cache = shared_cache()
+        if key is None:
+            cache.set(_VERSION_KEY, uuid.uuid4().hex, None)
+        else:
+            cache.delete(_cache_key(key, cache.get(_VERSION_KEY, '')))
+    now_and_on_commit(drop)
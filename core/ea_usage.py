@@ -0,0 +1,95 @@
+"""
+EA usage telemetry ingestion.
+
+Usage payloads posted to the EA config endpoint are queued in a
+``BatchBuffer`` and written in batches: one ``bulk_create`` of raw
+EAUsageReport rows plus one locked read-modify-write of the affected
+EAUsageDaily rollups (report count, first/last report time and the sum
+of every numeric usage field).
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from .buffering import BatchBuffer
+from .models import EAUsageReport, EAUsageDaily, LicenseKey
+
+
+def _numeric_fields(usage: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        name: value for name, value in usage.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+
+
+def write_usage_reports(rows: List[Dict[str, Any]]) -> None:
+    """Persist queued usage rows; rows of licenses deleted meanwhile are discarded"""
+    try:
+        _write_usage_reports(rows)
+    except IntegrityError:
+        license_ids = {row['license_id'] for row in rows}
+        existing = set(LicenseKey.objects.filter(pk__in=license_ids).values_list('pk', flat=True))
+        rows = [row for row in rows if row['license_id'] in existing]
+        if rows:
+            _write_usage_reports(rows)
+
+
+def _write_usage_reports(rows: List[Dict[str, Any]]) -> None:
+    """Insert usage rows (``license_id``, ``reported_at``, ``usage``) and roll them up"""
+    days = defaultdict(lambda: {'count': 0, 'first': None, 'last': None, 'totals': defaultdict(int)})
+    for row in rows:
+        day = days[(row['license_id'], timezone.localdate(row['reported_at']))]
+        day['count'] += 1
+        day['first'] = min(filter(None, [day['first'], row['reported_at']]))
+        day['last'] = max(filter(None, [day['last'], row['reported_at']]))
+        for name, value in _numeric_fields(row['usage']).items():
+            day['totals'][name] += value
+
+    with transaction.atomic():
+        EAUsageReport.objects.bulk_create([
+            EAUsageReport(license_id=row['license_id'], reported_at=row['reported_at'], usage=row['usage'])
+            for row in rows
+        ])
+        # Make sure every rollup exists, then lock them all for the update
+        EAUsageDaily.objects.bulk_create(
+            [EAUsageDaily(license_id=license_id, date=date) for license_id, date in days],
+            ignore_conflicts=True,
+        )
+        rollups = EAUsageDaily.objects.select_for_update().filter(
+            license_id__in={license_id for license_id, _ in days},
+            date__in={date for _, date in days},
+        )
+        changed = []
+        for rollup in rollups:
+            day = days.get((rollup.license_id, rollup.date))
+            if day is None:
+                continue
+            rollup.report_count += day['count']
+            rollup.first_report_at = min(filter(None, [rollup.first_report_at, day['first']]))
+            rollup.last_report_at = max(filter(None, [rollup.last_report_at, day['last']]))
+            for name, value in day['totals'].items():
+                rollup.totals[name] = rollup.totals.get(name, 0) + value
+            changed.append(rollup)
+        EAUsageDaily.objects.bulk_update(
+            changed, ['report_count', 'first_report_at', 'last_report_at', 'totals']
+        )
+
+
+usage_buffer = BatchBuffer(
+    write_usage_reports,
+    batch_size=getattr(settings, 'EA_USAGE_BATCH_SIZE', 500),
+    flush_interval=getattr(settings, 'EA_USAGE_FLUSH_INTERVAL_MS', 500) / 1000,
+    max_pending=getattr(settings, 'EA_USAGE_MAX_PENDING', 20000),
+    name='ea-usage',
+)
+
+
+def record_usage(license_id: int, usage: Dict[str, Any], reported_at=None) -> bool:
+    """Queue a usage report; returns False when the pipeline is saturated"""
+    return usage_buffer.put({
+        'license_id': license_id,
+        'reported_at': reported_at or timezone.now(),
+        'usage': usage,
+    })
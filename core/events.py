@@ -0,0 +1,54 @@
+"""
+Buffered AnalyticsEvent collector.
+
+Page views and gamification hooks record analytics events on nearly
+every request; inserting each one inline makes every page view wait on
+the database write lock (on SQLite, behind every other writer).
+``record_event`` only appends to a bounded in-memory ``BatchBuffer``;
+a background thread writes the events with ``bulk_create``. Events
+past ANALYTICS_EVENT_MAX_PENDING are dropped and counted
+(``event_buffer.stats()``) rather than slowing requests down. With
+``settings.BATCH_BUFFER_SYNC`` the events are written immediately.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from typing import Any, Dict, List
+
+from .buffering import BatchBuffer
+from .models import AnalyticsEvent
+
+
+def write_events(rows: List[Dict[str, Any]]) -> None:
+    """Insert queued events; events of users deleted meanwhile are discarded"""
+    events = [AnalyticsEvent(**row) for row in rows]
+    try:
+        with transaction.atomic():
+            AnalyticsEvent.objects.bulk_create(events)
+    except IntegrityError:
+        user_ids = {event.user_id for event in events if event.user_id is not None}
+        existing = set(get_user_model().objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        AnalyticsEvent.objects.bulk_create(
+            [event for event in events if event.user_id is None or event.user_id in existing]
+        )
+
+
+event_buffer = BatchBuffer(
+    write_events,
+    batch_size=getattr(settings, 'ANALYTICS_EVENT_BATCH_SIZE', 500),
+    flush_interval=getattr(settings, 'ANALYTICS_EVENT_FLUSH_INTERVAL_MS', 1000) / 1000,
+    max_pending=getattr(settings, 'ANALYTICS_EVENT_MAX_PENDING', 50000),
+    name='analytics-events',
+)
+
+
+def record_event(user, event_type: str, event_value: str = '') -> bool:
+    """Queue an analytics event; returns False if it was dropped on overflow"""
+    user_id = user.pk if user is not None and getattr(user, 'is_authenticated', False) else None
+    return event_buffer.put({
+        'user_id': user_id,
+        'event_type': event_type,
+        'event_value': str(event_value)[:255],
+        'created_at': timezone.now(),
+    })
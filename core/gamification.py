@@ -0,0 +1,125 @@
+"""
+Declarative badge rules.
+
+Each Rule names the trigger it listens to (``dashboard_view``,
+``referral``, ``payment``, ``social_share``, ``level_up``), the badge it
+grants (a name, or a callable returning names from the trigger context)
+and an optional condition on that context. ``evaluate`` checks a
+trigger's rules against the badge catalog, which is kept in the shared
+cache (and dropped by the Badge signals), and against the user's badges,
+which are read once and kept on the user object for the rest of the
+request (views showing badges reuse them through ``user_badges``). A page
+view that grants nothing costs at most the one query for the user's
+badges.
+
+New awards re-check that their badges still exist, since a catalog read
+just before a badge was deleted still lists it, and are written with a
+single ``bulk_create``. UserBadge is unique per (user, badge): if a
+concurrent request granted one of the badges first, the awards are
+retried one by one and only the ones this request created count.
+"""
+from django.db import IntegrityError, transaction
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Set, Union
+
+from .events import record_event
+from .models import Badge, UserBadge
+from .shared_cache import invalidate_on_commit, shared_cache
+
+BADGE_CATALOG_CACHE_KEY = 'gamification:badge_catalog'
+BADGE_CATALOG_CACHE_TIMEOUT = 3600
+
+
+class Rule(NamedTuple):
+    trigger: str
+    badge: Union[str, Callable[[Dict[str, Any]], Iterable[str]]]
+    when: Callable[[Dict[str, Any]], bool] = lambda context: True
+
+
+RULES = [
+    Rule('dashboard_view', 'First Login'),
+    Rule('referral', 'First Referral', lambda context: context['referred_count'] == 1),
+    Rule('referral', '5 Referrals', lambda context: context['referred_count'] >= 5),
+    Rule('referral', 'Referral Champion', lambda context: context['referred_count'] >= 10),
+    Rule('payment', 'First Payment', lambda context: context['paid_count'] == 1),
+    Rule('payment', '5 Payments', lambda context: context['paid_count'] >= 5),
+    Rule('social_share', 'Social Sharer'),
+    Rule('level_up', lambda context: [f"Level {level}" for level in context['levels']]),
+]
+
+
+def badge_catalog() -> Dict[str, Badge]:
+    """Badges by name (the oldest badge wins if names repeat)"""
+    catalog = shared_cache().get(BADGE_CATALOG_CACHE_KEY)
+    if catalog is None:
+        catalog = {}
+        for badge in Badge.objects.order_by('id'):
+            catalog.setdefault(badge.name, badge)
+        shared_cache().set(BADGE_CATALOG_CACHE_KEY, catalog, BADGE_CATALOG_CACHE_TIMEOUT)
+    return catalog
+
+
+def invalidate_badge_catalog() -> None:
+    invalidate_on_commit(BADGE_CATALOG_CACHE_KEY)
+
+
+def user_badges(user) -> List[UserBadge]:
+    """The user's badges (with their Badge), loaded once per user object (i.e. per request)"""
+    badges = getattr(user, '_user_badges', None)
+    if badges is None:
+        badges = list(UserBadge.objects.filter(user=user).select_related('badge').order_by('awarded_at', 'id'))
+        user._user_badges = badges
+    return badges
+
+
+def awarded_badges(user) -> Set[int]:
+    """Ids of the user's badges"""
+    return {user_badge.badge_id for user_badge in user_badges(user)}
+
+
+def award_badges(user, names: Iterable[str]) -> List[str]:
+    """Grant every named badge the user lacks in one insert; returns the names awarded"""
+    catalog = badge_catalog()
+    awarded = awarded_badges(user)
+    new = {}
+    for name in names:
+        badge = catalog.get(name)
+        if badge is not None and badge.pk not in awarded:
+            awarded.add(badge.pk)
+            new[name] = badge
+    if not new:
+        return []
+    # The catalog may predate a badge's deletion
+    existing = set(Badge.objects.filter(pk__in=[badge.pk for badge in new.values()]).values_list('pk', flat=True))
+    new = {name: badge for name, badge in new.items() if badge.pk in existing}
+    if not new:
+        return []
+    try:
+        with transaction.atomic():
+            created = UserBadge.objects.bulk_create([UserBadge(user=user, badge=badge) for badge in new.values()])
+    except IntegrityError:
+        # Another request awarded some of these first; keep the ones that are still ours
+        created = []
+        for badge in new.values():
+            try:
+                with transaction.atomic():
+                    created.append(UserBadge.objects.create(user=user, badge=badge))
+            except IntegrityError:
+                pass
+        won = {user_badge.badge_id for user_badge in created}
+        new = {name: badge for name, badge in new.items() if badge.pk in won}
+        user._user_badges = None
+    else:
+        user_badges(user).extend(created)
+    for name in new:
+        record_event(user, "badge_awarded", name)
+    return list(new)
+
+
+def evaluate(user, trigger: str, **context: Any) -> List[str]:
+    """Apply the rules of ``trigger`` to the user; returns the names of newly awarded badges"""
+    names = []
+    for rule in RULES:
+        if rule.trigger != trigger or not rule.when(context):
+            continue
+        names.extend([rule.badge] if isinstance(rule.badge, str) else rule.badge(context))
+    return award_badges(user, names) if names else []
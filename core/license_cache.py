@@ -0,0 +1,130 @@
+"""
+Cached license validation for EA heartbeats.
+
+Every running EA instance validates its license repeatedly, so the
+validation payload (status, expiry, plan) is cached per license key and
+answered without touching the database. Unknown keys are cached briefly
+as well so a misconfigured EA cannot hammer the table. Entries live in
+the shared cache (core.shared_cache) and are dropped by the LicenseKey
+save/delete signals, so revocations and renewals are visible on the next
+call everywhere.
+"""
+from django.utils import timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import hashlib
+
+from .models import LicenseKey
+from .serializers import LicenseKeyStatusSerializer
+from .shared_cache import invalidate_on_commit, shared_cache
+
+LICENSE_CACHE_TIMEOUT = 10 * 60
+NEGATIVE_CACHE_TIMEOUT = 60
+MISSING = 'missing'
+
+
+def _cache_key(key: str) -> str:
+    # License keys arrive from clients; hash them into a backend-safe cache key
+    return 'license_validation:' + hashlib.sha1(str(key).encode()).hexdigest()
+
+
+def _status_entry(lic: LicenseKey) -> Dict[str, Any]:
+    return {
+        'license_id': lic.id,
+        'ea_id': lic.ea_id,
+        'expires_at': lic.expires_at,
+        'status_version': lic.status_version,
+        'data': LicenseKeyStatusSerializer(lic).data,
+    }
+
+
+def load_license_status(key: str) -> Optional[Dict[str, Any]]:
+    """Read the validation payload of a license from the database"""
+    lic = LicenseKey.objects.filter(key=key).first()
+    return _status_entry(lic) if lic is not None else None
+
+
+def get_license_status(key: str) -> Optional[Dict[str, Any]]:
+    """Return the cached validation payload of a license, or None if unknown"""
+    cache, cache_key = shared_cache(), _cache_key(key)
+    entry = cache.get(cache_key)
+    if entry is None:
+        entry = load_license_status(key)
+        if entry is None:
+            cache.set(cache_key, MISSING, NEGATIVE_CACHE_TIMEOUT)
+        else:
+            cache.set(cache_key, entry, LICENSE_CACHE_TIMEOUT)
+    return None if entry == MISSING else entry
+
+
+async def aget_license_status(key: str) -> Optional[Dict[str, Any]]:
+    """Async variant of ``get_license_status`` using the async cache and ORM APIs"""
+    cache, cache_key = shared_cache(), _cache_key(key)
+    entry = await cache.aget(cache_key)
+    if entry is None:
+        lic = await LicenseKey.objects.filter(key=key).afirst()
+        if lic is None:
+            entry = MISSING
+            await cache.aset(cache_key, MISSING, NEGATIVE_CACHE_TIMEOUT)
+        else:
+            entry = _status_entry(lic)
+            await cache.aset(cache_key, entry, LICENSE_CACHE_TIMEOUT)
+    return None if entry == MISSING else entry
+
+
+def get_license_statuses(keys: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Return the validation payloads of several licenses at once
+
+    Cache misses are resolved with a single ``key IN (...)`` query and
+    written back, unknown keys included.
+    """
+    cache = shared_cache()
+    cache_keys = {_cache_key(key): key for key in keys}
+    entries = {cache_keys[ck]: entry for ck, entry in cache.get_many(list(cache_keys)).items()}
+    missing = [key for key in cache_keys.values() if key not in entries]
+    if missing:
+        loaded = {lic.key: _status_entry(lic) for lic in LicenseKey.objects.filter(key__in=missing)}
+        cache.set_many({_cache_key(key): entry for key, entry in loaded.items()}, LICENSE_CACHE_TIMEOUT)
+        unknown = [key for key in missing if key not in loaded]
+        if unknown:
+            cache.set_many({_cache_key(key): MISSING for key in unknown}, NEGATIVE_CACHE_TIMEOUT)
+        entries.update(loaded)
+        entries.update({key: MISSING for key in unknown})
+    return {key: None if entry == MISSING else entry for key, entry in entries.items()}
+
+
+def _validated(entry: Optional[Dict[str, Any]], ea_id: int) -> Optional[Dict[str, Any]]:
+    if entry is None or entry['ea_id'] != ea_id:
+        return None
+    expires_at = entry['expires_at']
+    data = dict(entry['data'])
+    data['valid'] = data['status'] == 'active' and (expires_at is None or expires_at > timezone.now())
+    return data
+
+
+def validate_license(key: str, ea_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Validate a license for an EA
+
+    Returns:
+        The license status data with a ``valid`` flag, or None when no
+        license with this key exists for the EA
+    """
+    return _validated(get_license_status(key), ea_id)
+
+
+async def avalidate_license(key: str, ea_id: int) -> Optional[Dict[str, Any]]:
+    """Async variant of ``validate_license``"""
+    return _validated(await aget_license_status(key), ea_id)
+
+
+def validate_licenses(pairs: Iterable[Tuple[str, int]]) -> List[Optional[Dict[str, Any]]]:
+    """Validate ``(key, ea_id)`` pairs in order, as ``validate_license`` would"""
+    pairs = list(pairs)
+    entries = get_license_statuses(key for key, _ in pairs)
+    return [_validated(entries.get(key), ea_id) for key, ea_id in pairs]
+
+
+def invalidate_license(key: str) -> None:
+    """Drop the cached validation payload of a license"""
+    invalidate_on_commit(_cache_key(key))
@@ -0,0 +1,125 @@
+"""
+In-process publish/subscribe for license events pushed to connected EAs.
+
+EAs hold a Server-Sent Events connection open (``license_event_stream``,
+served through ``mt5saas.asgi``) and receive ``revoked``, ``status`` and
+``config`` events as soon as the model signals publish them. Publishing
+is safe from any thread: events are handed to each subscriber's event
+loop with ``call_soon_threadsafe``.
+
+The broker is per process. Events raised in another worker (or by a
+management command) do not reach this process's subscribers; EAs still
+refresh their offline token (core.license_tokens) before it expires and
+pick up such changes then.
+"""
+from django.http import StreamingHttpResponse, JsonResponse
+from asgiref.sync import sync_to_async
+from collections import defaultdict
+from typing import Any, Dict, Optional
+import asyncio
+import json
+import threading
+
+from .api_views_async import async_api_view
+from .license_cache import get_license_status
+
+SUBSCRIBER_QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 15
+
+
+class LicenseEventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, key: str) -> asyncio.Queue:
+        """Register a queue for events of ``key`` on the running event loop"""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers[key].add(subscriber)
+        queue.subscriber = subscriber
+        return queue
+
+    def unsubscribe(self, key: str, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(queue.subscriber)
+                if not subscribers:
+                    del self._subscribers[key]
+
+    def subscriber_count(self, key: Optional[str] = None) -> int:
+        with self._lock:
+            if key is not None:
+                return len(self._subscribers.get(key, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, event: str, data: Dict[str, Any], key: Optional[str] = None) -> None:
+        """Send an event to the subscribers of ``key``, or to every subscriber"""
+        with self._lock:
+            if key is None:
+                targets = [s for subscribers in self._subscribers.values() for s in subscribers]
+            else:
+                targets = list(self._subscribers.get(str(key), ()))
+        message = {'event': event, 'data': data}
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, message)
+            except RuntimeError:
+                # The subscriber's loop has already shut down
+                pass
+
+
+def _offer(queue: asyncio.Queue, message: Dict[str, Any]) -> None:
+    # A slow consumer loses its oldest events rather than stalling publishers
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+broker = LicenseEventBroker()
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _event_stream(key: str, entry: Dict[str, Any]):
+    queue = broker.subscribe(key)
+    try:
+        yield _sse('hello', {'status': entry['data']['status'], 'v': entry['status_version']})
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield _sse(message['event'], message['data'])
+            if message['event'] == 'revoked':
+                return
+    finally:
+        broker.unsubscribe(key, queue)
+
+
+@async_api_view('GET')
+async def license_event_stream(request):
+    """
+    Stream revocation, status and config events of one active license as SSE
+
+    Authenticated like the license validation endpoints (``Authorization:
+    Token <token>`` or a session); anonymous requests get a 403. Only
+    events published in the worker process serving the stream are
+    delivered: changes made by another worker or a management command
+    arrive when the EA next refreshes its offline token.
+    """
+    key = request.headers.get('X-LICENSE-KEY') or request.GET.get('key')
+    if not key:
+        return JsonResponse({'detail': 'Missing license key.'}, status=400)
+    entry = await sync_to_async(get_license_status)(key)
+    if entry is None or entry['data']['status'] != 'active':
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    response = StreamingHttpResponse(_event_stream(key, entry), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,110 @@
+"""
+Signed offline license tokens.
+
+An EA fetches a short-lived token once and verifies it locally until it
+nears expiry, instead of calling the validate endpoint on every tick.
+Tokens are HMAC-SHA256 signed with ``django.core.signing``; the signing
+key is derived per license from SECRET_KEY, so the verify key handed to
+one EA cannot check (or forge) tokens of any other license.
+
+The signature is symmetric: the verify key the EA receives is also the
+signing key, so whoever holds it can mint tokens for that one license,
+later expiry included. Tokens therefore only save an EA round trips;
+they prove nothing to the server, which never accepts one as a
+credential and keeps answering ``validate`` and the revocation list from
+the database. Closing that gap needs asymmetric signatures (e.g. Ed25519
+with only the public key shipped to the EA).
+
+Revocations reach offline EAs through a compact list of key fingerprints
+and status versions: a token whose ``v`` is lower than the listed
+version for its fingerprint must be discarded.
+"""
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, List, Optional
+import hashlib
+
+from .models import LicenseKey
+from .license_cache import get_license_status
+
+LICENSE_TOKEN_SALT = 'core.license_token'
+LICENSE_TOKEN_TTL = getattr(settings, 'LICENSE_TOKEN_TTL', 60 * 60)
+
+
+def license_verify_key(key: str) -> str:
+    """Per-license HMAC key, shared with the EA so it can verify (and so also sign) its tokens"""
+    return salted_hmac('core.license_verify_key', str(key), algorithm='sha256').hexdigest()
+
+
+def key_fingerprint(key: str) -> str:
+    """Short public identifier of a license key, used in the revocation list"""
+    return hashlib.sha256(str(key).encode()).hexdigest()[:16]
+
+
+def issue_license_token(key: str, ea_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Issue a signed token for an active license
+
+    Returns:
+        Dict with ``token``, ``verify_key`` and ``expires_at`` (epoch
+        seconds), or None if the license is unknown, belongs to another
+        EA, or is not currently valid
+    """
+    entry = get_license_status(key)
+    if entry is None or entry['ea_id'] != ea_id or entry['data']['status'] != 'active':
+        return None
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=LICENSE_TOKEN_TTL)
+    if entry['expires_at'] is not None:
+        if entry['expires_at'] <= now:
+            return None
+        expires_at = min(expires_at, entry['expires_at'])
+    payload = {
+        'fp': key_fingerprint(key),
+        'ea_id': ea_id,
+        'plan': entry['data']['plan'],
+        'license_expires_at': int(entry['expires_at'].timestamp()) if entry['expires_at'] else None,
+        'exp': int(expires_at.timestamp()),
+        'v': entry['status_version'],
+    }
+    verify_key = license_verify_key(key)
+    return {
+        'token': signing.dumps(payload, key=verify_key, salt=LICENSE_TOKEN_SALT, compress=True),
+        'verify_key': verify_key,
+        'expires_at': payload['exp'],
+    }
+
+
+def revoked_since(since: Optional[datetime] = None) -> List[List[Any]]:
+    """Return ``[fingerprint, status_version]`` pairs of licenses revoked since ``since``"""
+    qs = LicenseKey.objects.filter(status='revoked')
+    if since is not None:
+        qs = qs.filter(deactivated_at__gte=since)
+    return [[key_fingerprint(key), version] for key, version in qs.values_list('key', 'status_version')]
+
+
+def parse_since(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parse a ``since`` query value given as epoch seconds or ISO 8601
+
+    Raises:
+        ValueError: for unparsable values and out-of-range timestamps
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    if seconds is not None:
+        try:
+            return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+        except (ValueError, OverflowError, OSError):
+            raise ValueError(f"Timestamp out of range: {value}")
+    parsed = datetime.fromisoformat(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import timedelta
+from core.archive import ARCHIVES, archive_before, archive_root
+
+class Command(BaseCommand):
+    help = 'Move AnalyticsEvent/AuditLog rows older than --days into compressed monthly archive files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Keep this many days in the database (default: 90).')
+        parser.add_argument('--table', choices=sorted(ARCHIVES), action='append',
+                            help='Archive only this table (repeatable; default: all).')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows deleted per statement.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1.')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        for name in options['table'] or sorted(ARCHIVES):
+            archived = archive_before(name, cutoff, chunk_size=max(options['chunk_size'], 1))
+            for month, count in archived.items():
+                self.stdout.write(f"{name} {month}: {count} rows archived")
+            self.stdout.write(self.style.SUCCESS(
+                f"{name}: {sum(archived.values())} rows older than {cutoff:%Y-%m-%d} moved to {archive_root()}."
+            ))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from urllib.parse import urlsplit
+import asyncio
+import json
+import time
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent throughput of the sync and async license validate endpoints '
+        'against a running server, e.g. `uvicorn mt5saas.asgi:application --workers 1`.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running server.')
+        parser.add_argument('--token', required=True, help='DRF token used in the Authorization header.')
+        parser.add_argument('--key', required=True, help='License key to validate.')
+        parser.add_argument('--ea-id', type=int, required=True, help='EA id of the license.')
+        parser.add_argument('--concurrency', type=int, default=200, help='Open keep-alive connections.')
+        parser.add_argument('--requests', type=int, default=5000, help='Requests per endpoint.')
+
+    def handle(self, *args, **options):
+        base = urlsplit(options['url'])
+        if base.scheme != 'http' or not base.hostname:
+            raise CommandError('--url must be a plain http:// URL.')
+        body = json.dumps({'key': options['key'], 'ea_id': options['ea_id']}).encode()
+        for label, path in (('sync', '/api/license/validate/'), ('async', '/api/async/license/validate/')):
+            elapsed, ok, failed = asyncio.run(self.run(base, path, body, options))
+            rate = ok / elapsed if elapsed else 0
+            self.stdout.write(f"{label:>5}: {rate:,.0f} req/s, {ok} ok, {failed} failed in {elapsed:.2f}s")
+        self.stdout.write(self.style.SUCCESS('Done.'))
+
+    async def run(self, base, path, body, options):
+        request = (
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {base.netloc}\r\n"
+            f"Authorization: Token {options['token']}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode() + body
+        remaining = [options['requests']]
+        counts = {'ok': 0, 'failed': 0}
+
+        async def client():
+            reader, writer = await asyncio.open_connection(base.hostname, base.port or 80)
+            try:
+                while remaining[0] > 0:
+                    remaining[0] -= 1
+                    writer.write(request)
+                    await writer.drain()
+                    status_line = await reader.readline()
+                    length = 0
+                    while True:
+                        line = await reader.readline()
+                        if line in (b'\r\n', b''):
+                            break
+                        name, _, value = line.decode().partition(':')
+                        if name.lower() == 'content-length':
+                            length = int(value)
+                    await reader.readexactly(length)
+                    counts['ok' if b' 200 ' in status_line else 'failed'] += 1
+            except (ConnectionError, asyncio.IncompleteReadError):
+                counts['failed'] += 1
+            finally:
+                writer.close()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(max(options['concurrency'], 1))))
+        return time.perf_counter() - start, counts['ok'], counts['failed']
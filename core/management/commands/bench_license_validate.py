@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.shortcuts import get_object_or_404
+from core.models import LicenseKey
+from core.serializers import LicenseKeyStatusSerializer
+from core.license_cache import validate_license, invalidate_license
+import time
+
+class Command(BaseCommand):
+    help = 'Benchmark license validations per second with and without the validation cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--key', help='License key to validate (defaults to the first license).')
+        parser.add_argument('--iterations', type=int, default=5000, help='Validations per run.')
+
+    def handle(self, *args, **options):
+        lic = LicenseKey.objects.filter(key=options['key']).first() if options['key'] else LicenseKey.objects.first()
+        if lic is None:
+            raise CommandError('No license to validate; create one or pass --key.')
+        key, ea_id = lic.key, lic.ea_id
+        iterations = max(options['iterations'], 1)
+
+        def uncached():
+            lic = get_object_or_404(LicenseKey, key=key, ea_id=ea_id)
+            data = LicenseKeyStatusSerializer(lic).data
+            data['valid'] = lic.status == 'active'
+            return data
+
+        def cached():
+            return validate_license(key, ea_id)
+
+        invalidate_license(key)
+        results = {}
+        for label, func in (('uncached', uncached), ('cached', cached)):
+            func()  # warm up connections and the cache entry
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            elapsed = time.perf_counter() - start
+            results[label] = iterations / elapsed if elapsed else float('inf')
+            self.stdout.write(f"{label:>8}: {results[label]:,.0f} validations/s ({elapsed * 1000 / iterations:.3f} ms each)")
+        self.stdout.write(self.style.SUCCESS(f"Cache speed-up: {results['cached'] / results['uncached']:.1f}x"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import date, timedelta
+from core.trading_analytics import TradingMetrics
+from core.risk_metrics import update_risk_metrics
+
+class Command(BaseCommand):
+    help = 'Compute drawdown, Sharpe/Sortino, expectancy and R-multiples for daily TradingMetrics rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First day (YYYY-MM-DD, defaults to yesterday).')
+        parser.add_argument('--until', help='Last day (YYYY-MM-DD, defaults to --since).')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users loaded per vectorized batch.')
+
+    def handle(self, *args, **options):
+        try:
+            since = date.fromisoformat(options['since']) if options['since'] else timezone.localdate() - timedelta(days=1)
+            until = date.fromisoformat(options['until']) if options['until'] else since
+        except ValueError:
+            raise CommandError('--since/--until must be in YYYY-MM-DD format.')
+
+        user_ids = sorted(
+            TradingMetrics.objects.filter(date__range=(since, until), total_trades__gt=0)
+            .order_by().values_list('user_id', flat=True).distinct()
+        )
+        size = max(options['chunk_size'], 1)
+        count = 0
+        for i in range(0, len(user_ids), size):
+            count += update_risk_metrics(user_ids[i:i + size], since, until)
+        self.stdout.write(self.style.SUCCESS(f"Risk metrics updated on {count} rows for {len(user_ids)} users ({since} to {until})."))
@@ -12,9 +12,7 @@ class Command(BaseCommand):
         expired = LicenseKey.objects.filter(expires_at__lte=now, status='active')
         count = expired.count()
         for lic in expired:
-            lic.status = 'revoked'
-            lic.deactivated_at = now
-            lic.save()
+            lic.revoke(now)
             # Send email notification to user
             send_mail(
                 subject='Your License Has Expired',
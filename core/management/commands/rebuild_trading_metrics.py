@@ -0,0 +1,113 @@
+from django.core.management.base import BaseCommand, CommandError
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+import json
+import os
+
+
+def _init_worker():
+    # Forked workers must not share the parent's database connections
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    from django.db import connections
+    connections.close_all()
+
+
+def _rebuild_chunk(user_ids, since, until):
+    from core.trading_analytics import rebuild_daily_metrics, rebuild_symbol_daily_stats
+    from core.risk_metrics import update_risk_metrics
+    written = rebuild_daily_metrics(user_ids, since, until)
+    rebuild_symbol_daily_stats(user_ids, since, until)
+    update_risk_metrics(user_ids, since, until)
+    return written
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily TradingMetrics and symbol rollups for all users over a date range, in parallel and resumably.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', required=True, help='First day to rebuild (YYYY-MM-DD).')
+        parser.add_argument('--until', help='Last day to rebuild (YYYY-MM-DD, defaults to today).')
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes.')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Users per grouped aggregate.')
+        parser.add_argument('--checkpoint', help='File recording finished chunks so an interrupted run can resume.')
+
+    def handle(self, *args, **options):
+        from django.db import connection
+        from django.utils import timezone
+        from core.trading_analytics import TradeDetail, TradingMetrics, SymbolDailyStats, local_day_bounds
+
+        try:
+            since = date.fromisoformat(options['since'])
+            until = date.fromisoformat(options['until']) if options['until'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('--since/--until must be in YYYY-MM-DD format.')
+        if since > until:
+            raise CommandError('--since must not be after --until.')
+
+        # Users who traded in the range or still have (possibly stale) rows for it
+        start, end = local_day_bounds(since, until)
+        user_ids = sorted(
+            set(
+                TradeDetail.objects.filter(status='CLOSED', close_time__gte=start, close_time__lt=end)
+                .order_by().values_list('user_id', flat=True).distinct()
+            )
+            | set(TradingMetrics.objects.filter(date__range=(since, until)).order_by().values_list('user_id', flat=True).distinct())
+            | set(SymbolDailyStats.objects.filter(date__range=(since, until)).order_by().values_list('user_id', flat=True).distinct())
+        )
+        size = max(options['chunk_size'], 1)
+        chunks = [user_ids[i:i + size] for i in range(0, len(user_ids), size)]
+
+        checkpoint = self._load_checkpoint(options['checkpoint'], since, until)
+        pending = [c for c in chunks if self._chunk_key(c) not in checkpoint['done']]
+        skipped = len(chunks) - len(pending)
+        if skipped:
+            self.stdout.write(f"Resuming: {skipped} of {len(chunks)} chunks already rebuilt.")
+
+        rows = 0
+        finished = skipped
+        workers = max(options['workers'], 1)
+        if workers > 1 and connection.vendor == 'sqlite':
+            # SQLite allows one writer at a time; parallel workers only fail with "database is locked"
+            self.stdout.write(self.style.WARNING('SQLite supports a single writer; ignoring --workers.'))
+            workers = 1
+        if workers == 1:
+            results = ((chunk, _rebuild_chunk(chunk, since, until)) for chunk in pending)
+            for chunk, written in results:
+                finished, rows = self._record(options['checkpoint'], checkpoint, chunk, written, finished, rows, len(chunks))
+        else:
+            from django.db import connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = {pool.submit(_rebuild_chunk, chunk, since, until): chunk for chunk in pending}
+                for future in as_completed(futures):
+                    finished, rows = self._record(options['checkpoint'], checkpoint, futures[future], future.result(), finished, rows, len(chunks))
+
+        self.stdout.write(self.style.SUCCESS(f"{rows} daily metrics rows rebuilt for {len(user_ids)} users ({since} to {until})."))
+
+    def _chunk_key(self, chunk):
+        return f"{chunk[0]}-{chunk[-1]}"
+
+    def _load_checkpoint(self, path, since, until):
+        state = {'since': since.isoformat(), 'until': until.isoformat(), 'done': []}
+        if path and os.path.exists(path):
+            with open(path) as fh:
+                saved = json.load(fh)
+            if saved.get('since') == state['since'] and saved.get('until') == state['until']:
+                state['done'] = saved.get('done', [])
+        state['done'] = set(state['done'])
+        return state
+
+    def _record(self, path, checkpoint, chunk, written, finished, rows, total):
+        finished += 1
+        rows += written
+        checkpoint['done'].add(self._chunk_key(chunk))
+        if path:
+            tmp = f"{path}.tmp"
+            with open(tmp, 'w') as fh:
+                json.dump({**checkpoint, 'done': sorted(checkpoint['done'])}, fh)
+            os.replace(tmp, path)
+        self.stdout.write(f"[{finished}/{total}] users {self._chunk_key(chunk)}: {written} rows")
+        return finished, rows
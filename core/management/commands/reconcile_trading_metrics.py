@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.db.models.functions import TruncDate
+from datetime import date, timedelta
+from core.trading_analytics import (
+    TradingMetrics, TradeDetail, SymbolDailyStats, aggregate_daily_metrics, rebuild_equity_series,
+    rebuild_symbol_daily_stats, local_day_bounds,
+)
+from core.risk_metrics import update_risk_metrics
+
+# Columns recomputed from the day's trades; a change in any of them means drift
+METRIC_FIELDS = ['total_trades', 'winning_trades', 'losing_trades', 'total_profit', 'total_loss', 'net_profit', 'profit_factor']
+
+class Command(BaseCommand):
+    help = 'Fully recompute daily TradingMetrics to correct drift from incremental updates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Last day to reconcile (YYYY-MM-DD, defaults to yesterday).')
+        parser.add_argument('--days', type=int, default=1, help='Number of days ending at --date to reconcile.')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                end = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('--date must be in YYYY-MM-DD format.')
+        else:
+            end = timezone.localdate() - timedelta(days=1)
+        start = end - timedelta(days=max(options['days'], 1) - 1)
+
+        # Days with closed trades, plus days that already have (possibly stale) rows
+        day_start, day_end = local_day_bounds(start, end)
+        traded = set(
+            TradeDetail.objects.filter(status='CLOSED', close_time__gte=day_start, close_time__lt=day_end)
+            .annotate(day=TruncDate('close_time')).values_list('user_id', 'day').distinct()
+        )
+        before = {
+            (row['user_id'], row['date']): row
+            for row in TradingMetrics.objects.filter(date__range=(start, end)).values('user_id', 'date', *METRIC_FIELDS)
+        }
+        user_ids = set(user_id for user_id, _ in traded | set(before)) | set(
+            SymbolDailyStats.objects.filter(date__range=(start, end))
+            .values_list('user_id', flat=True).distinct()
+        )
+        users = get_user_model().objects.in_bulk(user_ids)
+
+        for user_id, day in sorted(traded | set(before)):
+            aggregate_daily_metrics(users[user_id], day)
+        after = {
+            (row['user_id'], row['date']): row
+            for row in TradingMetrics.objects.filter(date__range=(start, end)).values('user_id', 'date', *METRIC_FIELDS)
+        }
+        changed = set(user_id for user_id, day in after if after[user_id, day] != before.get((user_id, day)))
+        if user_ids:
+            rebuild_symbol_daily_stats(sorted(user_ids), start, end)
+            update_risk_metrics(sorted(user_ids), start, end)
+        for user_id in sorted(changed):
+            rebuild_equity_series(user_id, start)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(traded | set(before))} daily metrics rows reconciled for {len(user_ids)} users ({start} to {end}); "
+            f"{len(changed)} equity series rebuilt."
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import date, timedelta
+from core.rollups import rollup_daily_metrics
+
+class Command(BaseCommand):
+    help = 'Recompute the DailyMetricRollup rows behind the admin analytics (schedule every few minutes).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help='Number of days up to today to recompute (default: today and yesterday).')
+        parser.add_argument('--since', help='First day (YYYY-MM-DD); overrides --days.')
+        parser.add_argument('--until', help='Last day (YYYY-MM-DD, defaults to today).')
+
+    def handle(self, *args, **options):
+        try:
+            until = date.fromisoformat(options['until']) if options['until'] else timezone.localdate()
+            since = date.fromisoformat(options['since']) if options['since'] else until - timedelta(days=max(options['days'], 1) - 1)
+        except ValueError:
+            raise CommandError('--since/--until must be in YYYY-MM-DD format.')
+        if since > until:
+            raise CommandError('--since must not be after --until.')
+        count = rollup_daily_metrics(since, until)
+        self.stdout.write(self.style.SUCCESS(f"{count} rollup rows written ({since} to {until})."))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:35
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicate_tickets(apps, schema_editor):
+    # Keep the most recently inserted row for each (user, ticket_id)
+    TradeDetail = apps.get_model('core', 'TradeDetail')
+    duplicates = (
+        TradeDetail.objects.values('user_id', 'ticket_id')
+        .annotate(rows=Count('id'), keep=Max('id'))
+        .filter(rows__gt=1)
+    )
+    for dup in duplicates:
+        TradeDetail.objects.filter(
+            user_id=dup['user_id'], ticket_id=dup['ticket_id']
+        ).exclude(id=dup['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_learningcategory_learningresource_userprogress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_tickets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tradedetail',
+            constraint=models.UniqueConstraint(fields=('user', 'ticket_id'), name='unique_trade_ticket_per_user'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_tradedetail_unique_ticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tradingmetrics',
+            name='expectancy',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='tradingmetrics',
+            name='sortino_ratio',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+    ]
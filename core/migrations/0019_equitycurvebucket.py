@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_tradingmetrics_sortino_expectancy'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquityCurveBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('timestamps', models.BinaryField(default=b'')),
+                ('balances', models.BinaryField(default=b'')),
+                ('points', models.PositiveIntegerField(default=0)),
+                ('start_balance', models.FloatField(default=0)),
+                ('end_balance', models.FloatField(default=0)),
+                ('last_timestamp', models.FloatField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='equity_buckets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['day'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='unique_equity_bucket_per_day')],
+            },
+        ),
+    ]
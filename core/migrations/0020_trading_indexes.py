@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicate_daily_metrics(apps, schema_editor):
+    # One metrics row per user and day; keep the most recently written one
+    TradingMetrics = apps.get_model('core', 'TradingMetrics')
+    duplicates = (
+        TradingMetrics.objects.values('user_id', 'date')
+        .annotate(rows=Count('id'), keep=Max('id'))
+        .filter(rows__gt=1)
+    )
+    for dup in duplicates:
+        TradingMetrics.objects.filter(
+            user_id=dup['user_id'], date=dup['date']
+        ).exclude(id=dup['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_equitycurvebucket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_daily_metrics, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tradedetail',
+            index=models.Index(fields=['user', 'status', 'close_time', 'profit'], name='trade_user_status_close_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tradedetail',
+            index=models.Index(fields=['user', 'close_time', 'id'], name='trade_user_close_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tradedetail',
+            index=models.Index(fields=['user', 'symbol', 'close_time'], name='trade_user_symbol_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='tradingmetrics',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_metrics_per_user_day'),
+        ),
+    ]
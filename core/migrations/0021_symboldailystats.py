@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_trading_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SymbolDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20)),
+                ('date', models.DateField()),
+                ('trade_count', models.IntegerField(default=0)),
+                ('win_count', models.IntegerField(default=0)),
+                ('loss_count', models.IntegerField(default=0)),
+                ('profit_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('win_profit_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('loss_profit_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('max_profit', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('min_profit', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='symbol_daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Symbol daily stats',
+                'ordering': ['-date', 'symbol'],
+                'indexes': [models.Index(fields=['user', 'date'], name='symbol_stats_user_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'symbol', 'date'), name='unique_symbol_stats_per_day')],
+            },
+        ),
+    ]
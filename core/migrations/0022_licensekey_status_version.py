@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_symboldailystats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='licensekey',
+            name='status_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='licensekey',
+            index=models.Index(fields=['status', 'deactivated_at'], name='license_status_deact_idx'),
+        ),
+    ]
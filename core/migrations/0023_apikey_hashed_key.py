@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:48
+
+import core.models
+import hashlib
+from django.db import migrations, models
+
+
+def hash_existing_keys(apps, schema_editor):
+    # Replace stored plaintext keys with their prefix and SHA-256 hash
+    ApiKey = apps.get_model('core', 'ApiKey')
+    for api_key in ApiKey.objects.exclude(key__isnull=True).exclude(key=''):
+        api_key.prefix = api_key.key[:8]
+        api_key.hashed_key = hashlib.sha256(api_key.key.encode()).hexdigest()
+        api_key.key = None
+        api_key.save(update_fields=['key', 'prefix', 'hashed_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_licensekey_status_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='hashed_key',
+            field=models.CharField(default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='prefix',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=8),
+        ),
+        migrations.AlterField(
+            model_name='apikey',
+            name='key',
+            field=models.CharField(blank=True, default=core.models.generate_api_key, max_length=40, null=True, unique=True),
+        ),
+        migrations.RunPython(hash_existing_keys, migrations.RunPython.noop),
+    ]
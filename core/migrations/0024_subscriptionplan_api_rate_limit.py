@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_apikey_hashed_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='api_rate_limit',
+            field=models.PositiveIntegerField(blank=True, help_text='API requests per hour; leave empty for the default rate', null=True),
+        ),
+    ]
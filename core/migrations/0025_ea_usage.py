@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_subscriptionplan_api_rate_limit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EAUsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('report_count', models.PositiveIntegerField(default=0)),
+                ('first_report_at', models.DateTimeField(blank=True, null=True)),
+                ('last_report_at', models.DateTimeField(blank=True, null=True)),
+                ('totals', models.JSONField(default=dict)),
+                ('license', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_days', to='core.licensekey')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('license', 'date'), name='unique_ea_usage_per_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='EAUsageReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reported_at', models.DateTimeField()),
+                ('usage', models.JSONField(default=dict)),
+                ('license', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_reports', to='core.licensekey')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['license', 'reported_at'], name='ea_usage_license_time_idx')],
+            },
+        ),
+    ]
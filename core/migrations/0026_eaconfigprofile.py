@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_ea_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EAConfigProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('settings', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('ea', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='config_profiles', to='core.expertadvisor')),
+                ('plan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='config_profiles', to='core.subscriptionplan')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ea', 'plan'), name='unique_ea_config_scope')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_analyticsevent_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('metric', models.CharField(max_length=64)),
+                ('dimension', models.CharField(blank=True, default='', max_length=64)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'metric', 'dimension'), name='unique_daily_metric_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:13
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+def merge_duplicate_scopes(apps, schema_editor):
+    # Profiles sharing a scope with a NULL side slipped past unique_ea_config_scope;
+    # fold each group into its newest row, later settings winning
+    EAConfigProfile = apps.get_model('core', 'EAConfigProfile')
+    groups = {}
+    for profile in EAConfigProfile.objects.filter(models.Q(ea__isnull=True) | models.Q(plan__isnull=True)).order_by('id'):
+        groups.setdefault((profile.ea_id, profile.plan_id), []).append(profile)
+    for profiles in groups.values():
+        if len(profiles) < 2:
+            continue
+        keep = profiles[-1]
+        settings = {}
+        for profile in profiles:
+            settings.update(profile.settings)
+        keep.settings = settings
+        keep.save(update_fields=['settings'])
+        EAConfigProfile.objects.filter(id__in=[profile.id for profile in profiles[:-1]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_xpledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_scopes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='eaconfigprofile',
+            constraint=models.UniqueConstraint(condition=models.Q(('plan__isnull', True)), fields=('ea',), name='unique_ea_config_ea_scope'),
+        ),
+        migrations.AddConstraint(
+            model_name='eaconfigprofile',
+            constraint=models.UniqueConstraint(condition=models.Q(('ea__isnull', True)), fields=('plan',), name='unique_ea_config_plan_scope'),
+        ),
+        migrations.AddConstraint(
+            model_name='eaconfigprofile',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('ea', models.Value(0)), condition=models.Q(('ea__isnull', True), ('plan__isnull', True)), name='unique_ea_config_global_scope'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def drop_duplicate_awards(apps, schema_editor):
+    # Concurrent awards could grant a badge twice; keep the earliest grant
+    UserBadge = apps.get_model('core', 'UserBadge')
+    duplicates = (
+        UserBadge.objects.values('user', 'badge')
+        .annotate(first=models.Min('id'), count=models.Count('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        UserBadge.objects.filter(user=row['user'], badge=row['badge']).exclude(id=row['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_eaconfigprofile_scope_constraints'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_awards, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userbadge',
+            constraint=models.UniqueConstraint(fields=('user', 'badge'), name='unique_user_badge'),
+        ),
+    ]
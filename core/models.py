@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.utils import timezone
@@ -6,6 +7,8 @@ from django.contrib.auth import get_user_model
 import uuid
 import json
 import secrets
+import hashlib
+from django.utils.crypto import constant_time_compare
 
 # Create your models here.
 
@@ -14,6 +17,7 @@ class SubscriptionPlan(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=8, decimal_places=2)
     is_active = models.BooleanField(default=True)
+    api_rate_limit = models.PositiveIntegerField(null=True, blank=True, help_text="API requests per hour; leave empty for the default rate")
     # Add more fields as needed (e.g., allowed_eas, max_bots, etc.)
 
     def __str__(self):
@@ -128,6 +132,10 @@ class UserBadge(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
     badge = models.ForeignKey(Badge, on_delete=models.CASCADE)
     awarded_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'badge'], name='unique_user_badge'),
+        ]
     def __str__(self):
         return f"{self.user.username}: {self.badge.name}"
 
@@ -144,14 +152,58 @@ class UserLevel(models.Model):
     def progress_percent(self):
         return int(100 * self.xp / self.xp_for_next_level())
 
+class XPLedger(models.Model):
+    """Append-only record of every XP grant (written by views.add_xp), for XP-over-time charts"""
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='xp_ledger')
+    amount = models.IntegerField()
+    reason = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='xp_ledger_user_time_idx'),
+        ]
+    def __str__(self):
+        return f"{self.user_id}: {self.amount:+} XP ({self.reason}) @{self.created_at}"
+    @staticmethod
+    def daily_totals(user, since, until):
+        """XP gained per local day ``since``..``until`` (inclusive) in one grouped query, as ``{date: xp}``"""
+        from django.db.models.functions import TruncDate
+        from datetime import datetime, time, timedelta
+        start = timezone.make_aware(datetime.combine(since, time.min))
+        end = timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min))
+        rows = (
+            XPLedger.objects.filter(user=user, created_at__gte=start, created_at__lt=end)
+            .annotate(day=TruncDate('created_at')).values('day').order_by()
+            .annotate(xp=models.Sum('amount'))
+        )
+        return {row['day']: row['xp'] for row in rows}
+
 class AnalyticsEvent(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, null=True, blank=True)
     event_type = models.CharField(max_length=64)
     event_value = models.CharField(max_length=255, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when the buffered writer flushes it
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     def __str__(self):
         return f"{self.user}: {self.event_type} at {self.created_at}" if self.user else f"Anon: {self.event_type} at {self.created_at}"
 
+class DailyMetricRollup(models.Model):
+    """
+    One value of a site-wide metric for a local day, optionally split by a
+    dimension (e.g. payment status). Filled by core.rollups; the admin
+    analytics endpoints read only this table.
+    """
+    date = models.DateField()
+    metric = models.CharField(max_length=64)
+    dimension = models.CharField(max_length=64, blank=True, default='')
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'metric', 'dimension'], name='unique_daily_metric_rollup'),
+        ]
+    def __str__(self):
+        return f"{self.date} {self.metric}{'/' + self.dimension if self.dimension else ''}: {self.value}"
+
 class SocialShareEvent(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     platform = models.CharField(max_length=20)
@@ -200,16 +252,81 @@ class LicenseKey(models.Model):
     activated_at = models.DateTimeField(null=True, blank=True)
     deactivated_at = models.DateTimeField(null=True, blank=True)
     expires_at = models.DateTimeField(null=True, blank=True)
+    # Bumped by the pre_save signal on every status change, for offline token checks
+    status_version = models.PositiveIntegerField(default=1)
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'deactivated_at'], name='license_status_deact_idx'),
+        ]
     def __str__(self):
         return f"{self.key} - {self.user.username} - {self.ea.name} - {self.status}"
     @property
     def is_expired(self):
         return self.expires_at and self.expires_at <= timezone.now()
+    def revoke(self, when=None):
+        self.status = 'revoked'
+        self.deactivated_at = when or timezone.now()
+        self.save()
+    def activate(self, when=None):
+        self.status = 'active'
+        self.activated_at = when or timezone.now()
+        self.save()
     @staticmethod
     def generate(user, ea, plan):
         key = str(uuid.uuid4())
         return LicenseKey.objects.create(user=user, ea=ea, plan=plan, key=key)
 
+class EAConfigProfile(models.Model):
+    """
+    EA settings layered by scope: global (no EA, no plan), per plan, per EA,
+    then per EA and plan. core.ea_config merges the layers for each license.
+    """
+    ea = models.ForeignKey(ExpertAdvisor, on_delete=models.CASCADE, null=True, blank=True, related_name='config_profiles')
+    plan = models.ForeignKey(SubscriptionPlan, on_delete=models.CASCADE, null=True, blank=True, related_name='config_profiles')
+    settings = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        # NULLs never conflict, so each partly or fully global scope needs its own constraint
+        constraints = [
+            models.UniqueConstraint(fields=['ea', 'plan'], name='unique_ea_config_scope'),
+            models.UniqueConstraint(fields=['ea'], condition=models.Q(plan__isnull=True), name='unique_ea_config_ea_scope'),
+            models.UniqueConstraint(fields=['plan'], condition=models.Q(ea__isnull=True), name='unique_ea_config_plan_scope'),
+            models.UniqueConstraint(
+                Coalesce('ea', models.Value(0)),
+                condition=models.Q(ea__isnull=True, plan__isnull=True),
+                name='unique_ea_config_global_scope',
+            ),
+        ]
+    def __str__(self):
+        return f"Config: {self.ea or 'all EAs'} / {self.plan or 'all plans'}"
+
+class EAUsageReport(models.Model):
+    """One usage payload posted by a running EA, written in batches by core.ea_usage"""
+    license = models.ForeignKey(LicenseKey, on_delete=models.CASCADE, related_name='usage_reports')
+    reported_at = models.DateTimeField()
+    usage = models.JSONField(default=dict)
+    class Meta:
+        indexes = [
+            models.Index(fields=['license', 'reported_at'], name='ea_usage_license_time_idx'),
+        ]
+    def __str__(self):
+        return f"{self.license_id} @{self.reported_at}"
+
+class EAUsageDaily(models.Model):
+    """Per-license daily rollup of EA usage reports; numeric usage fields are summed into totals"""
+    license = models.ForeignKey(LicenseKey, on_delete=models.CASCADE, related_name='usage_days')
+    date = models.DateField()
+    report_count = models.PositiveIntegerField(default=0)
+    first_report_at = models.DateTimeField(null=True, blank=True)
+    last_report_at = models.DateTimeField(null=True, blank=True)
+    totals = models.JSONField(default=dict)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['license', 'date'], name='unique_ea_usage_per_day'),
+        ]
+    def __str__(self):
+        return f"{self.license_id} {self.date}: {self.report_count} reports"
+
 class AuditLog(models.Model):
     ACTION_CHOICES = [
         ('license_request', 'License Requested'),
@@ -279,11 +396,37 @@ class UserForumBadge(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.badge.name}"
 
+API_KEY_PREFIX_LENGTH = 8
+
+def generate_api_key():
+    return secrets.token_urlsafe(30)
+
+def hash_api_key(raw_key):
+    return hashlib.sha256(raw_key.encode()).hexdigest()
+
 class ApiKey(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    key = models.CharField(max_length=40, unique=True, default=secrets.token_urlsafe)
+    # Plaintext only until the first save; afterwards only the prefix and hash are stored
+    key = models.CharField(max_length=40, unique=True, null=True, blank=True, default=generate_api_key)
+    prefix = models.CharField(max_length=API_KEY_PREFIX_LENGTH, db_index=True, editable=False, default='')
+    hashed_key = models.CharField(max_length=64, editable=False, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     last_used = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"API Key for {self.user.username}"
+
+    def save(self, *args, **kwargs):
+        if self.key:
+            # Keep the plaintext on the instance so it can be shown once
+            self.plain_key = self.key
+            self.replaced_hash = self.hashed_key
+            self.prefix = self.key[:API_KEY_PREFIX_LENGTH]
+            self.hashed_key = hash_api_key(self.key)
+            self.key = None
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'key', 'prefix', 'hashed_key'}
+        super().save(*args, **kwargs)
+
+    def check_key(self, raw_key):
+        return bool(self.hashed_key) and constant_time_compare(self.hashed_key, hash_api_key(raw_key))
@@ -0,0 +1,192 @@
+"""
+Vectorized risk metrics for TradingMetrics rows.
+
+Closed trades of any number of users are loaded once into contiguous NumPy
+arrays sorted by (user, day, close_time), and every per-day statistic is
+computed for all (user, day) groups at once with segmented reductions
+(``np.add.reduceat`` and friends) instead of looping over trades in Python.
+"""
+from django.db import transaction
+from django.db.models.functions import TruncDate
+from decimal import Decimal
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from .trading_analytics import TradingMetrics, TradeDetail, local_day_bounds, notify_trading_data_changed
+
+# Largest magnitude that fits the DecimalField(max_digits=5, decimal_places=2) ratio columns
+RATIO_LIMIT = 999.99
+
+
+def load_trade_arrays(user_ids: List[int], since: Optional[date] = None, until: Optional[date] = None) -> Dict[str, np.ndarray]:
+    """
+    Load closed trades of the given users as column arrays
+    
+    Returns:
+        Dict of equally sized arrays: ``user_id``, ``day`` (proleptic ordinal of
+        the local close date), ``profit`` and ``r_multiple`` (NaN when the trade
+        has no usable stop loss), sorted by user, day and close time
+    """
+    trades = TradeDetail.objects.filter(
+        user_id__in=user_ids,
+        status='CLOSED',
+        close_time__isnull=False,
+    )
+    if since:
+        trades = trades.filter(close_time__gte=local_day_bounds(since)[0])
+    if until:
+        trades = trades.filter(close_time__lt=local_day_bounds(until)[1])
+    rows = list(
+        trades.annotate(day=TruncDate('close_time'))
+        .order_by('user_id', 'day', 'close_time', 'id')
+        .values_list('user_id', 'day', 'profit', 'trade_type', 'open_price', 'close_price', 'stop_loss')
+    )
+    
+    count = len(rows)
+    user_id = np.fromiter((r[0] for r in rows), dtype=np.int64, count=count)
+    day = np.fromiter((r[1].toordinal() for r in rows), dtype=np.int64, count=count)
+    profit = np.fromiter((r[2] for r in rows), dtype=np.float64, count=count)
+    direction = np.fromiter((1.0 if r[3] == 'BUY' else -1.0 for r in rows), dtype=np.float64, count=count)
+    open_price = np.fromiter((r[4] for r in rows), dtype=np.float64, count=count)
+    close_price = np.fromiter((r[5] if r[5] is not None else np.nan for r in rows), dtype=np.float64, count=count)
+    stop_loss = np.fromiter((r[6] if r[6] is not None else np.nan for r in rows), dtype=np.float64, count=count)
+    
+    # R-multiple: realised price move over the price distance risked to the stop
+    risk = direction * (open_price - stop_loss)
+    reward = direction * (close_price - open_price)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_multiple = np.where(risk > 0, reward / risk, np.nan)
+    
+    return {'user_id': user_id, 'day': day, 'profit': profit, 'r_multiple': r_multiple}
+
+
+def equity_curve(profit: np.ndarray, starts: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Cumulative P&L after each trade, restarting from zero at every group start
+    
+    Args:
+        profit: Per-trade profits
+        starts: Indices where a new group begins (defaults to a single group)
+    """
+    cumulative = np.cumsum(profit)
+    if starts is None or len(starts) == 0:
+        return cumulative
+    offsets = cumulative[starts] - profit[starts]
+    lengths = np.diff(np.append(starts, len(profit)))
+    return cumulative - np.repeat(offsets, lengths)
+
+
+def compute_group_metrics(arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Compute risk metrics for every (user, day) group in one vectorized pass
+    
+    Returns:
+        Dict of per-group arrays: ``user_id``, ``day``, ``trades``,
+        ``net_profit``, ``profit_factor``, ``expectancy``, ``sharpe``,
+        ``sortino``, ``max_drawdown`` and ``avg_r_multiple``
+    """
+    profit = arrays['profit']
+    if len(profit) == 0:
+        empty = np.array([], dtype=np.float64)
+        return {key: empty for key in ('user_id', 'day', 'trades', 'net_profit', 'profit_factor', 'expectancy', 'sharpe', 'sortino', 'max_drawdown', 'avg_r_multiple')}
+    
+    user_id, day = arrays['user_id'], arrays['day']
+    boundary = np.ones(len(profit), dtype=bool)
+    boundary[1:] = (user_id[1:] != user_id[:-1]) | (day[1:] != day[:-1])
+    starts = np.flatnonzero(boundary)
+    counts = np.diff(np.append(starts, len(profit))).astype(np.float64)
+    
+    net = np.add.reduceat(profit, starts)
+    gross_profit = np.add.reduceat(np.where(profit > 0, profit, 0.0), starts)
+    gross_loss = np.add.reduceat(np.where(profit <= 0, -profit, 0.0), starts)
+    mean = net / counts
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profit_factor = np.where(gross_loss > 0, gross_profit / gross_loss, gross_profit)
+        # Sample standard deviation; undefined for single-trade groups
+        sum_sq = np.add.reduceat(profit * profit, starts)
+        variance = (sum_sq - counts * mean * mean) / (counts - 1)
+        std = np.sqrt(np.clip(variance, 0, None))
+        sharpe = np.where((counts > 1) & (std > 0), mean / std, np.nan)
+        downside = np.sqrt(np.add.reduceat(np.minimum(profit, 0.0) ** 2, starts) / counts)
+        sortino = np.where(downside > 0, mean / downside, np.nan)
+    
+    # Running peak per group: shifting each group above the previous one lets a
+    # single maximum.accumulate over the whole array restart at group edges
+    equity = equity_curve(profit, starts)
+    group = np.repeat(np.arange(len(starts)), counts.astype(np.int64))
+    span = float(equity.max() - min(equity.min(), 0.0)) + 1.0
+    shifted = equity + group * span
+    peak = np.maximum.accumulate(shifted) - group * span
+    peak = np.maximum(peak, 0.0)
+    max_drawdown = np.maximum.reduceat(peak - equity, starts)
+    
+    r_multiple = arrays['r_multiple']
+    has_r = ~np.isnan(r_multiple)
+    r_count = np.add.reduceat(has_r.astype(np.float64), starts)
+    r_sum = np.add.reduceat(np.where(has_r, r_multiple, 0.0), starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_r_multiple = np.where(r_count > 0, r_sum / r_count, np.nan)
+    
+    return {
+        'user_id': user_id[starts],
+        'day': day[starts],
+        'trades': counts,
+        'net_profit': net,
+        'profit_factor': profit_factor,
+        'expectancy': mean,
+        'sharpe': sharpe,
+        'sortino': sortino,
+        'max_drawdown': max_drawdown,
+        'avg_r_multiple': avg_r_multiple,
+    }
+
+
+def _to_decimal(value: float, limit: Optional[float] = None) -> Optional[Decimal]:
+    if np.isnan(value):
+        return None
+    if limit is not None:
+        value = float(np.clip(value, -limit, limit))
+    return Decimal(str(round(float(value), 2)))
+
+
+def update_risk_metrics(user_ids: List[int], since: Optional[date] = None, until: Optional[date] = None) -> int:
+    """
+    Compute and store max drawdown, Sharpe/Sortino, expectancy and average
+    R-multiple on the existing daily TradingMetrics rows of the given users
+    
+    Returns:
+        Number of TradingMetrics rows updated
+    """
+    metrics = compute_group_metrics(load_trade_arrays(user_ids, since, until))
+    by_key: Dict[Tuple[int, int], int] = {
+        (int(u), int(d)): i for i, (u, d) in enumerate(zip(metrics['user_id'], metrics['day']))
+    }
+    
+    rows = TradingMetrics.objects.filter(user_id__in=user_ids)
+    if since:
+        rows = rows.filter(date__gte=since)
+    if until:
+        rows = rows.filter(date__lte=until)
+    
+    updated = []
+    for row in rows:
+        i = by_key.get((row.user_id, row.date.toordinal()))
+        if i is None:
+            continue
+        row.max_drawdown = _to_decimal(metrics['max_drawdown'][i])
+        row.sharpe_ratio = _to_decimal(metrics['sharpe'][i], RATIO_LIMIT)
+        row.sortino_ratio = _to_decimal(metrics['sortino'][i], RATIO_LIMIT)
+        row.expectancy = _to_decimal(metrics['expectancy'][i])
+        row.avg_risk_reward = _to_decimal(metrics['avg_r_multiple'][i], RATIO_LIMIT) or Decimal('0')
+        updated.append(row)
+    
+    with transaction.atomic():
+        TradingMetrics.objects.bulk_update(
+            updated,
+            ['max_drawdown', 'sharpe_ratio', 'sortino_ratio', 'expectancy', 'avg_risk_reward'],
+            batch_size=500,
+        )
+    notify_trading_data_changed(row.user_id for row in updated)
+    return len(updated)
@@ -0,0 +1,125 @@
+"""
+Site-wide daily metric rollups for the admin analytics endpoints.
+
+``rollup_daily_metrics`` recomputes the DailyMetricRollup rows of a range
+of local days with one grouped query per source table, so the admin
+charts can be served from a single range scan over the rollup table.
+It is idempotent and meant to be run on a schedule (the
+``rollup_daily_metrics`` management command), typically every few
+minutes for today and yesterday.
+
+Flow metrics are bucketed by the day their rows were created (or, for
+trades, closed). Snapshot metrics describe current state and are stored
+on the day the rollup runs.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .models import DailyMetricRollup, LicenseKey, ForumPost, Payment, SupportTicket
+from .trading_analytics import TradeDetail, local_day_bounds
+
+SNAPSHOT_METRICS = ('revenue_total', 'tickets_by_status', 'users_by_state')
+
+
+def _flow_rows(since: date, until: date) -> List[Tuple[date, str, str, Decimal]]:
+    start, end = local_day_bounds(since, until)
+    rows = []
+
+    def daily(queryset, field, metric, dimension=None, **aggregates):
+        # Counts rows per day as ``metric`` unless named aggregates are given
+        grouping = ['day'] + ([dimension] if dimension else [])
+        result = (
+            queryset.filter(**{f'{field}__gte': start, f'{field}__lt': end})
+            .annotate(day=TruncDate(field)).values(*grouping).order_by()
+            .annotate(**(aggregates or {'value': Count('id')}))
+        )
+        for row in result:
+            dim = str(row[dimension]) if dimension else ''
+            for name, value in row.items():
+                if name in grouping:
+                    continue
+                rows.append((row['day'], metric if name == 'value' else name, dim, value or 0))
+
+    User = get_user_model()
+    daily(User.objects.all(), 'date_joined', 'users_joined')
+    daily(LicenseKey.objects.all(), 'created_at', 'licenses_created')
+    daily(ForumPost.objects.all(), 'created_at', 'forum_posts')
+    daily(SupportTicket.objects.all(), 'created_at', 'tickets_opened')
+    daily(Payment.objects.all(), 'created_at', 'payments', 'status',
+          payment_count=Count('id'), payment_amount=Sum('amount'))
+    daily(TradeDetail.objects.all(), 'close_time', 'trades',
+          trades_closed=Count('id'), trades_profitable=Count('id', filter=Q(profit__gt=0)),
+          trade_profit=Sum('profit'))
+    return rows
+
+
+def _snapshot_rows(day: date) -> List[Tuple[date, str, str, Decimal]]:
+    User = get_user_model()
+    rows = [(day, 'revenue_total', '', Payment.objects.aggregate(total=Sum('amount'))['total'] or 0)]
+    for row in SupportTicket.objects.values('status').annotate(value=Count('id')).order_by():
+        rows.append((day, 'tickets_by_status', row['status'], row['value']))
+    for row in User.objects.values('is_active').annotate(value=Count('id')).order_by():
+        rows.append((day, 'users_by_state', 'active' if row['is_active'] else 'inactive', row['value']))
+    return rows
+
+
+def rollup_daily_metrics(since: date, until: Optional[date] = None) -> int:
+    """
+    Recompute the rollups of local days ``since``..``until`` (inclusive)
+
+    Snapshot metrics are refreshed for today. Returns the number of rollup
+    rows written.
+    """
+    until = until or since
+    today = timezone.localdate()
+    rows = _flow_rows(since, until) + _snapshot_rows(today)
+    with transaction.atomic():
+        DailyMetricRollup.objects.filter(date__range=(since, until)).exclude(metric__in=SNAPSHOT_METRICS).delete()
+        DailyMetricRollup.objects.filter(date=today, metric__in=SNAPSHOT_METRICS).delete()
+        DailyMetricRollup.objects.bulk_create([
+            DailyMetricRollup(date=day, metric=metric, dimension=dimension, value=value)
+            for day, metric, dimension, value in rows
+        ])
+    return len(rows)
+
+
+def load_rollups(since: date, until: date, metrics: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+    """
+    Read rollups of ``since``..``until`` in one range query
+
+    Returns:
+        ``{metric: {dimension: {date: value}}}``
+    """
+    queryset = DailyMetricRollup.objects.filter(date__range=(since, until))
+    if metrics is not None:
+        queryset = queryset.filter(metric__in=list(metrics))
+    result = defaultdict(lambda: defaultdict(dict))
+    for day, metric, dimension, value in queryset.values_list('date', 'metric', 'dimension', 'value'):
+        result[metric][dimension][day] = value
+    return result
+
+
+def metric_total(rollups: Dict[str, Dict], metric: str, since: Optional[date] = None) -> Decimal:
+    """Sum a flow metric over every dimension, optionally from ``since`` on"""
+    return sum(
+        (value for values in rollups.get(metric, {}).values() for day, value in values.items()
+         if since is None or day >= since),
+        Decimal('0'),
+    )
+
+
+def latest_snapshot(rollups: Dict[str, Dict], metric: str) -> Dict[str, Decimal]:
+    """Values per dimension of the most recent snapshot of a metric"""
+    by_dimension = rollups.get(metric, {})
+    days = [day for values in by_dimension.values() for day in values]
+    if not days:
+        return {}
+    latest = max(days)
+    return {dimension: values[latest] for dimension, values in by_dimension.items() if latest in values}
@@ -1,14 +1,44 @@
 from rest_framework import serializers
-from .models import LicenseKey
+from .models import LicenseKey, Subscription, Payment
+from .trading_analytics import TradeDetail
 
 class LicenseKeyValidateSerializer(serializers.Serializer):
     key = serializers.CharField()
     ea_id = serializers.IntegerField()
 
+class LicenseKeyBatchValidateSerializer(serializers.Serializer):
+    licenses = LicenseKeyValidateSerializer(many=True, allow_empty=False, max_length=100)
+
 class LicenseKeyActionSerializer(serializers.Serializer):
     key = serializers.CharField()
 
 class LicenseKeyStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = LicenseKey
-        fields = ['key', 'user', 'ea', 'plan', 'status', 'created_at', 'activated_at', 'deactivated_at']
+        fields = ['key', 'user', 'ea', 'plan', 'status', 'created_at', 'activated_at', 'deactivated_at', 'expires_at']
+
+class LicenseKeyListSerializer(serializers.ModelSerializer):
+    ea = serializers.CharField(source='ea.name', read_only=True)
+    plan = serializers.CharField(source='plan.name', read_only=True)
+    class Meta:
+        model = LicenseKey
+        fields = ['key', 'ea', 'plan', 'status', 'created_at', 'expires_at']
+
+class SubscriptionStatusSerializer(serializers.ModelSerializer):
+    plan = serializers.CharField(source='plan.name', read_only=True)
+    class Meta:
+        model = Subscription
+        fields = ['plan', 'is_active', 'start_date', 'end_date']
+
+class PaymentHistorySerializer(serializers.ModelSerializer):
+    invoice_url = serializers.SerializerMethodField()
+    class Meta:
+        model = Payment
+        fields = ['amount', 'status', 'created_at', 'method', 'invoice_url']
+    def get_invoice_url(self, obj):
+        return getattr(obj, 'invoice_url', None)
+
+class TradeIngestSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TradeDetail
+        exclude = ['id', 'user']
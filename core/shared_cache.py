@@ -0,0 +1,31 @@
+"""
+The cache shared by all workers, and invalidation that outlives the
+current transaction.
+
+The 'default' cache is per process, so anything that must disappear in
+every worker once the database changes (license statuses, compiled EA
+configs, the badge catalog, trade facets, authenticated principals)
+lives in the 'shared' alias. Invalidation runs right away and once more
+after the surrounding transaction commits: a reader in another worker
+may have re-cached the rows as they were before the change in between.
+Outside a transaction the second run happens immediately.
+"""
+from django.core.cache import caches
+from django.db import transaction
+from typing import Callable
+
+
+def shared_cache():
+    """The 'shared' cache, looked up per call so settings overrides apply"""
+    return caches['shared']
+
+
+def now_and_on_commit(invalidate: Callable[[], None]) -> None:
+    """Run ``invalidate`` now and again once the current transaction commits"""
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+def invalidate_on_commit(*keys: str) -> None:
+    """Delete ``keys`` from the shared cache now and again after commit"""
+    now_and_on_commit(lambda: shared_cache().delete_many(keys))
@@ -0,0 +1,150 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+from .models import LicenseKey, ApiKey, Subscription, EAConfigProfile, ExpertAdvisor, SubscriptionPlan, Badge
+from .ea_config import invalidate_ea_config
+from .gamification import invalidate_badge_catalog
+from .license_events import broker
+from .throttling import invalidate_plan_rate
+from .authentication import forget_api_key, forget_token, remember_user_fingerprint
+from .license_cache import invalidate_license
+from .trading_analytics import TradeDetail, trade_snapshot, record_trade_changes, trading_data_changed, TRADE_SNAPSHOT_FIELDS
+from .trading_summary import invalidate_trading_summary
+
+
+# --- Keep derived trading data in step with individual trade saves ---
+# Bulk ingestion records its own changes (bulk_create does not send signals).
+
+@receiver(pre_save, sender=TradeDetail)
+def remember_trade_state(sender, instance, raw=False, **kwargs):
+    instance._previous_snapshot = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_snapshot = (
+        TradeDetail.objects.filter(pk=instance.pk).values(*TRADE_SNAPSHOT_FIELDS).first()
+    )
+
+@receiver(post_save, sender=TradeDetail)
+def update_metrics_on_trade_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_snapshot', None)
+    record_trade_changes(
+        instance.user_id,
+        removed=[previous] if previous else [],
+        added=[trade_snapshot(instance)],
+    )
+
+@receiver(post_delete, sender=TradeDetail)
+def update_metrics_on_trade_delete(sender, instance, origin=None, **kwargs):
+    # Cascades from deleting the user take the derived rows with them
+    if origin is not None and not isinstance(origin, TradeDetail) and getattr(origin, 'model', None) is not TradeDetail:
+        return
+    record_trade_changes(instance.user_id, removed=[trade_snapshot(instance)])
+
+@receiver(trading_data_changed)
+def drop_trading_summaries(sender, user_ids, **kwargs):
+    invalidate_trading_summary(user_ids)
+
+
+# --- Version status changes and drop cached license data ---
+
+@receiver(pre_save, sender=LicenseKey)
+def remember_license_key(sender, instance, raw=False, **kwargs):
+    instance._previous_key = None
+    if raw or instance.pk is None:
+        return
+    previous = LicenseKey.objects.filter(pk=instance.pk).values('key', 'status', 'status_version').first()
+    if previous is None:
+        return
+    instance._previous_key = previous['key']
+    instance._previous_status = previous['status']
+    if previous['status'] != instance.status:
+        instance.status_version = previous['status_version'] + 1
+
+def forget_license(key):
+    invalidate_license(key)
+    invalidate_ea_config(key)
+
+@receiver(post_save, sender=LicenseKey)
+def invalidate_license_on_save(sender, instance, created=False, **kwargs):
+    forget_license(instance.key)
+    previous = getattr(instance, '_previous_key', None)
+    if previous and previous != instance.key:
+        forget_license(previous)
+    if created:
+        return
+    # Push the change to EAs holding an event stream open for this license
+    key, version = str(instance.key), instance.status_version
+    if getattr(instance, '_previous_status', instance.status) == instance.status:
+        event, data = 'config', {'reason': 'license'}
+    elif instance.status == 'revoked':
+        event, data = 'revoked', {'v': version}
+    else:
+        event, data = 'status', {'status': instance.status, 'v': version}
+    transaction.on_commit(lambda: broker.publish(event, data, key=key))
+
+@receiver(post_delete, sender=LicenseKey)
+def invalidate_license_on_delete(sender, instance, **kwargs):
+    forget_license(instance.key)
+    key, version = str(instance.key), instance.status_version + 1
+    transaction.on_commit(lambda: broker.publish('revoked', {'v': version}, key=key))
+
+
+# --- Recompile every EA config when profiles, EAs or plans change ---
+
+@receiver(post_save, sender=EAConfigProfile)
+@receiver(post_delete, sender=EAConfigProfile)
+@receiver(post_save, sender=ExpertAdvisor)
+@receiver(post_save, sender=SubscriptionPlan)
+def invalidate_ea_configs(sender, **kwargs):
+    invalidate_ea_config()
+    transaction.on_commit(lambda: broker.publish('config', {'reason': sender._meta.model_name}))
+
+
+# --- Keep cached API principals in step with keys, tokens and credentials ---
+
+@receiver(post_save, sender=get_user_model())
+def refresh_user_fingerprint(sender, instance, raw=False, **kwargs):
+    if not raw:
+        remember_user_fingerprint(instance)
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_owner_ea_configs(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    # Compiled EA configs embed the owner's username
+    if raw or created or (update_fields is not None and 'username' not in update_fields):
+        return
+    for key in LicenseKey.objects.filter(user=instance).values_list('key', flat=True):
+        invalidate_ea_config(key)
+
+@receiver(post_save, sender=ApiKey)
+def forget_replaced_api_key(sender, instance, **kwargs):
+    replaced = getattr(instance, 'replaced_hash', '')
+    if replaced and replaced != instance.hashed_key:
+        forget_api_key(replaced)
+
+@receiver(post_delete, sender=ApiKey)
+def forget_deleted_api_key(sender, instance, **kwargs):
+    forget_api_key(instance.hashed_key)
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_token(instance.key)
+
+
+# --- Re-read plan rate limits when a user's subscriptions change ---
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def refresh_plan_rate_limit(sender, instance, **kwargs):
+    invalidate_plan_rate(instance.user_id)
+
+
+# --- Reload the cached badge catalog when badges change ---
+
+@receiver(post_save, sender=Badge)
+@receiver(post_delete, sender=Badge)
+def refresh_badge_catalog(sender, **kwargs):
+    invalidate_badge_catalog()
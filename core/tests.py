@@ -1,3 +1,1309 @@
-from django.test import TestCase
+from django.test import Client, TestCase, override_settings
+from django.core import signing
+from django.core.management import call_command
+from django.core.cache import cache, caches
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Sum, Count
+from django.utils import timezone
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+import glob
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+from .trading_analytics import (
+    TradingMetrics, TradeDetail, local_day_bounds, upsert_trades, aggregate_daily_metrics,
+    EquityCurveBucket, rebuild_equity_series, ensure_equity_series, equity_series_built_key,
+    SymbolDailyStats, rebuild_symbol_daily_stats, get_trade_facets,
+)
+from .risk_metrics import compute_group_metrics, equity_curve, load_trade_arrays, update_risk_metrics
+from .license_cache import _cache_key as _license_cache_key, get_license_status, validate_license
+from .license_tokens import LICENSE_TOKEN_SALT, LICENSE_TOKEN_TTL, key_fingerprint
+from .shared_cache import shared_cache
+from .buffering import BatchBuffer
+from .authentication import resolve_token
+from .views import add_xp
+from .rollups import rollup_daily_metrics
+from .ea_config import DEFAULT_EA_SETTINGS
+from .ea_usage import usage_buffer as ea_usage_buffer, write_usage_reports
+from .apikey_usage import flush_api_key_usage, touch_api_key, usage_buffer
+from .throttling import plan_rate_limit
+from .cache_backends import PeriodicCullFileBasedCache
+from .archive import archive_before, archived_counts, archived_months, archived_rows, history
+from .gamification import BADGE_CATALOG_CACHE_KEY, award_badges, awarded_badges, badge_catalog, user_badges
+from .models import API_KEY_PREFIX_LENGTH, hash_api_key, AnalyticsEvent, ApiKey, AuditLog, Badge, DailyMetricRollup, EAConfigProfile, EAUsageDaily, EAUsageReport, UserBadge, LicenseKey, ExpertAdvisor, SubscriptionPlan, Subscription, Payment, SupportTicket, XPLedger
 
-# Create your tests here.
+# In-memory caches for tests that read cached data, so nothing carries over
+# between test runs through the file-based throttle and shared caches
+LOCAL_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'tests-{alias}'}
+    for alias in ('default', 'throttle', 'shared')
+}
+
+
+def clear_caches():
+    for alias in LOCAL_CACHES:
+        caches[alias].clear()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Plan assertions are written against the SQLite planner')
+class TradingQueryPlanTests(TestCase):
+    """The trading dashboard hot queries must be answered from the composite indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='trader')
+        now = timezone.now()
+        TradeDetail.objects.bulk_create([
+            TradeDetail(
+                user=cls.user, ticket_id=str(i), symbol=['EURUSD', 'XAUUSD'][i % 2],
+                trade_type='BUY', open_time=now - timedelta(hours=i + 1), close_time=now - timedelta(hours=i),
+                open_price=1, close_price=1, lot_size=1, profit=i - 5, status='CLOSED',
+            )
+            for i in range(10)
+        ])
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_top_symbols_uses_status_close_index(self):
+        since = timezone.localdate() - timedelta(days=30)
+        qs = TradeDetail.objects.filter(
+            user=self.user, status='CLOSED', close_time__gte=local_day_bounds(since)[0]
+        ).values('symbol').annotate(total_profit=Sum('profit'), trade_count=Count('id'))
+        self.assertUsesIndex(qs, 'trade_user_status_close_idx')
+
+    def test_daily_aggregate_uses_status_close_index(self):
+        start, end = local_day_bounds(timezone.localdate())
+        qs = TradeDetail.objects.filter(user=self.user, status='CLOSED', close_time__gte=start, close_time__lt=end)
+        self.assertUsesIndex(qs, 'trade_user_status_close_idx')
+
+    def test_trade_history_page_uses_keyset_index(self):
+        qs = TradeDetail.objects.filter(user=self.user, close_time__isnull=False).order_by('-close_time', '-id')[:51]
+        self.assertUsesIndex(qs, 'trade_user_close_id_idx')
+
+    def test_symbol_filter_uses_symbol_index(self):
+        qs = TradeDetail.objects.filter(user=self.user, symbol='EURUSD', close_time__isnull=False).order_by('-close_time', '-id')[:51]
+        self.assertUsesIndex(qs, 'trade_user_symbol_idx')
+
+    def test_metrics_range_uses_unique_constraint_index(self):
+        qs = TradingMetrics.objects.filter(user=self.user, date__gte=timezone.localdate() - timedelta(days=30))
+        plan = qs.explain()
+        # SQLite backs the (user, date) constraint with an automatic index
+        self.assertRegex(plan, r'USING (COVERING )?INDEX (sqlite_autoindex_core_tradingmetrics|unique_metrics_per_user_day)')
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class IncrementalTradeMaintenanceTests(TestCase):
+    """Derived trading data kept up to date per trade must match a full recompute"""
+
+    METRIC_FIELDS = [
+        'total_trades', 'winning_trades', 'losing_trades', 'total_profit',
+        'total_loss', 'net_profit', 'profit_factor',
+    ]
+
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create(username='incremental')
+        self.day = timezone.localdate()
+        self.close_time = local_day_bounds(self.day)[0] + timedelta(hours=12)
+
+    def trade(self, ticket_id, profit, **fields):
+        row = {
+            'ticket_id': ticket_id, 'symbol': 'EURUSD', 'trade_type': 'BUY',
+            'open_time': self.close_time - timedelta(hours=1), 'close_time': self.close_time,
+            'open_price': 1, 'lot_size': 1, 'profit': profit, 'status': 'CLOSED',
+        }
+        row.update(fields)
+        return row
+
+    def assertMetricsMatchRecompute(self):
+        incremental = TradingMetrics.objects.filter(user=self.user, date=self.day).values(*self.METRIC_FIELDS).get()
+        recomputed = aggregate_daily_metrics(self.user, self.day)
+        recomputed.refresh_from_db()
+        self.assertEqual(incremental, {field: getattr(recomputed, field) for field in self.METRIC_FIELDS})
+
+    def test_daily_metrics_after_insert_update_delete(self):
+        upsert_trades(self.user, [self.trade('1', 100), self.trade('2', -30)])
+        self.assertMetricsMatchRecompute()
+        self.assertEqual(str(TradingMetrics.objects.get(user=self.user, date=self.day).profit_factor), '3.33')
+
+        upsert_trades(self.user, [self.trade('1', 50)])
+        self.assertMetricsMatchRecompute()
+
+        TradeDetail.objects.get(user=self.user, ticket_id='2').delete()
+        self.assertMetricsMatchRecompute()
+
+    def equity_series(self):
+        return [
+            (b.day, b.timestamp_array.tolist(), b.balance_array.tolist(), b.start_balance, b.end_balance, b.last_timestamp)
+            for b in EquityCurveBucket.objects.filter(user=self.user).order_by('day')
+        ]
+
+    def assertEquitySeriesMatchesRebuild(self):
+        incremental = self.equity_series()
+        rebuild_equity_series(self.user.pk)
+        self.assertEqual(incremental, self.equity_series())
+        return incremental
+
+    def test_equity_series_after_insert_update_delete(self):
+        yesterday = self.close_time - timedelta(days=1)
+        upsert_trades(self.user, [self.trade('1', 100, close_time=yesterday), self.trade('2', -30)])
+        self.assertEquitySeriesMatchesRebuild()
+
+        # Appended to the latest bucket
+        upsert_trades(self.user, [self.trade('3', 20, close_time=self.close_time + timedelta(hours=1))])
+        series = self.assertEquitySeriesMatchesRebuild()
+        self.assertEqual(series[-1][2], [70.0, 90.0])
+
+        upsert_trades(self.user, [self.trade('1', 50, close_time=yesterday)])
+        self.assertEquitySeriesMatchesRebuild()
+
+        TradeDetail.objects.get(user=self.user, ticket_id='2').delete()
+        series = self.assertEquitySeriesMatchesRebuild()
+        self.assertEqual(series[-1][4], 70.0)
+
+    def symbol_stats(self):
+        return list(
+            SymbolDailyStats.objects.filter(user=self.user).order_by('date', 'symbol').values(
+                'symbol', 'date', 'trade_count', 'win_count', 'loss_count', 'profit_sum',
+                'win_profit_sum', 'loss_profit_sum', 'max_profit', 'min_profit',
+            )
+        )
+
+    def assertSymbolStatsMatchRebuild(self):
+        incremental = self.symbol_stats()
+        rebuild_symbol_daily_stats([self.user.pk], self.day - timedelta(days=1), self.day)
+        self.assertEqual(incremental, self.symbol_stats())
+        return incremental
+
+    def test_symbol_stats_after_insert_update_delete(self):
+        upsert_trades(self.user, [self.trade('1', 100), self.trade('2', -30), self.trade('3', 10, symbol='XAUUSD')])
+        self.assertSymbolStatsMatchRebuild()
+
+        # Folded into the existing row with F() updates
+        upsert_trades(self.user, [self.trade('4', 250)])
+        stats = self.assertSymbolStatsMatchRebuild()
+        self.assertEqual(stats[0]['max_profit'], 250)
+
+        # Moving a trade to another symbol and day recomputes both rows
+        upsert_trades(self.user, [self.trade('4', 5, symbol='XAUUSD', close_time=self.close_time - timedelta(days=1))])
+        self.assertSymbolStatsMatchRebuild()
+
+        TradeDetail.objects.get(user=self.user, ticket_id='3').delete()
+        stats = self.assertSymbolStatsMatchRebuild()
+        self.assertEqual([(row['symbol'], row['trade_count']) for row in stats], [('XAUUSD', 1), ('EURUSD', 2)])
+
+    def test_equity_series_of_user_without_trades_is_built_once(self):
+        cache.delete(equity_series_built_key(self.user.pk))
+        ensure_equity_series(self.user.pk)
+        with self.assertNumQueries(0):
+            ensure_equity_series(self.user.pk)
+
+    def test_trade_facets_follow_committed_changes(self):
+        upsert_trades(self.user, [self.trade('1', 100, strategy='scalp')])
+        self.assertEqual(get_trade_facets(self.user.pk), {'symbols': ['EURUSD'], 'strategies': ['scalp']})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_trades(self.user, [self.trade('2', 10, symbol='XAUUSD')])
+        self.assertEqual(get_trade_facets(self.user.pk)['symbols'], ['EURUSD', 'XAUUSD'])
+
+        # A rolled-back ingest leaves nothing behind once the facets are read again
+        try:
+            with transaction.atomic():
+                upsert_trades(self.user, [self.trade('3', 10, symbol='USDJPY')])
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(get_trade_facets(self.user.pk)['symbols'], ['EURUSD', 'XAUUSD'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TradeDetail.objects.get(user=self.user, ticket_id='1').delete()
+        self.assertEqual(get_trade_facets(self.user.pk), {'symbols': ['XAUUSD'], 'strategies': []})
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'client-api-tests'},
+    'throttle': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'client-api-throttle-tests'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'client-api-shared-tests'},
+})
+class ClientApiQueryCountTests(TestCase):
+    """License, subscription and payment listings must not issue a query per row"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='client')
+        plans = [SubscriptionPlan.objects.create(name=f'Plan {i}', price=10) for i in range(3)]
+        eas = [ExpertAdvisor.objects.create(name=f'EA {i}') for i in range(3)]
+        for i in range(30):
+            LicenseKey.objects.create(user=cls.user, ea=eas[i % 3], plan=plans[i % 3], key=f'key-{i}')
+            Subscription.objects.create(user=cls.user, plan=plans[i % 3])
+            Payment.objects.create(user=cls.user, plan=plans[i % 3], amount=10)
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Warm the per-user plan rate limit used by the throttle
+        self.client.post(reverse('api_license_list'))
+
+    def assertListQueries(self, url_name, key):
+        # One COUNT for the paginator and one SELECT for the page
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse(url_name) + '?page_size=25')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 30)
+        self.assertEqual(len(response.data[key]), 25)
+        self.assertIsNotNone(response.data['next'])
+        return response.data[key]
+
+    def test_license_list(self):
+        licenses = self.assertListQueries('api_license_list', 'licenses')
+        self.assertTrue(licenses[0]['ea'].startswith('EA '))
+        self.assertTrue(licenses[0]['plan'].startswith('Plan '))
+
+    def test_subscription_status(self):
+        subscriptions = self.assertListQueries('api_subscription_status', 'subscriptions')
+        self.assertTrue(subscriptions[0]['plan'].startswith('Plan '))
+
+    def test_payment_history(self):
+        self.assertListQueries('api_payment_history', 'payments')
+
+
+class LicenseEventStreamAuthTests(TestCase):
+    """The SSE stream is authenticated like license validation"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='streamer')
+        cls.token = Token.objects.create(user=cls.user)
+        LicenseKey.objects.create(
+            user=cls.user, ea=ExpertAdvisor.objects.create(name='EA'),
+            plan=SubscriptionPlan.objects.create(name='Plan', price=10), key='stream-key',
+        )
+
+    async def test_anonymous_request_is_rejected(self):
+        response = await self.async_client.get(reverse('api_license_events'), headers={'X-License-Key': 'stream-key'})
+        self.assertEqual(response.status_code, 403)
+
+    async def test_token_request_streams(self):
+        response = await self.async_client.get(
+            reverse('api_license_events'),
+            headers={'X-License-Key': 'stream-key', 'Authorization': f'Token {self.token.key}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertTrue((await anext(stream)).startswith(b'event: hello'))
+        finally:
+            await stream.aclose()
+
+
+class LogArchiveTests(TestCase):
+    """Archiving moves rows to monthly files without losing or double-counting any"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(ARCHIVE_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.cutoff = timezone.make_aware(datetime(2024, 3, 1))
+
+    def log(self, when, object_id='bot.ex5', action='ea_download', **fields):
+        entry = AuditLog.objects.create(action=action, object_type='EAFile', object_id=object_id, extra_data={'n': 1}, **fields)
+        AuditLog.objects.filter(pk=entry.pk).update(timestamp=timezone.make_aware(when))
+        return entry
+
+    def test_round_trip_with_chunked_deletes(self):
+        user = User.objects.create(username='archived')
+        old = [self.log(datetime(2024, 1, 5 + i), user=user) for i in range(5)]
+        old.append(self.log(datetime(2024, 2, 10), action='user_login'))
+        recent = self.log(datetime(2024, 3, 2))
+        expected = list(AuditLog.objects.filter(pk__in=[entry.pk for entry in old]).order_by('pk').values())
+
+        self.assertEqual(archive_before('audit_logs', self.cutoff, chunk_size=2), {'2024-01': 5, '2024-02': 1})
+        self.assertEqual(list(AuditLog.objects.values_list('pk', flat=True)), [recent.pk])
+        self.assertEqual(archived_months('audit_logs'), ['2024-01', '2024-02'])
+        self.assertEqual(list(archived_rows('audit_logs')), expected)
+        self.assertEqual(
+            [row['id'] for row in history('audit_logs', action='ea_download')],
+            [entry.pk for entry in old[:5]] + [recent.pk],
+        )
+        since = timezone.make_aware(datetime(2024, 1, 7))
+        self.assertEqual([row['id'] for row in archived_rows('audit_logs', since=since)], [entry.pk for entry in old[2:]])
+
+    def test_rearchived_rows_are_read_and_counted_once(self):
+        entries = [self.log(datetime(2024, 1, 5)), self.log(datetime(2024, 1, 6), object_id='other.ex5')]
+        archive_before('audit_logs', self.cutoff)
+        # A run that crashed after writing its part but before deleting the rows
+        for entry in entries:
+            entry.save()
+        AuditLog.objects.update(timestamp=timezone.make_aware(datetime(2024, 1, 5)))
+        self.log(datetime(2024, 1, 7))
+        archive_before('audit_logs', self.cutoff)
+
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(len([row['id'] for row in archived_rows('audit_logs')]), 3)
+        self.assertEqual(archived_counts('audit_logs', 'ea_downloads'), {'bot.ex5': 2, 'other.ex5': 1})
+
+    def test_counts_of_parts_without_summary_are_backfilled(self):
+        self.log(datetime(2024, 1, 5))
+        self.log(datetime(2024, 2, 5), action='user_login')
+        archive_before('audit_logs', self.cutoff)
+        for path in glob.glob(os.path.join(self.root, 'audit_logs', '*', '*.summary.json')):
+            os.remove(path)
+        self.assertEqual(archived_counts('audit_logs', 'ea_downloads'), {'bot.ex5': 1})
+        self.assertEqual(len(glob.glob(os.path.join(self.root, 'audit_logs', '*', '*.summary.json'))), 2)
+        self.assertEqual(archived_counts('audit_logs', 'ea_downloads'), {'bot.ex5': 1})
+
+    def test_bot_analytics_adds_archived_and_hot_downloads(self):
+        self.log(datetime(2024, 1, 5))
+        self.log(datetime(2024, 1, 6), object_id='other.ex5')
+        archive_before('audit_logs', self.cutoff)
+        self.log(datetime(2024, 3, 2))
+        self.client.force_login(User.objects.create(username='staff', is_staff=True))
+        response = self.client.get(reverse('admin_bot_analytics'))
+        self.assertEqual(response.context['bot_stats'], [{'name': 'bot.ex5', 'count': 2}, {'name': 'other.ex5', 'count': 1}])
+
+
+@override_settings(
+    BATCH_BUFFER_SYNC=True,
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'badge-tests-shared'},
+    },
+)
+class BadgeAwardTests(TestCase):
+    """Badge awards survive stale catalogs and concurrent grants"""
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.user = User.objects.create(username='badger')
+        self.first_login = Badge.objects.create(name='First Login', description='')
+        self.sharer = Badge.objects.create(name='Social Sharer', description='')
+
+    def test_badge_deleted_after_catalog_was_cached_is_skipped(self):
+        stale = badge_catalog()
+        self.first_login.delete()
+        # Another worker still holds the catalog read before the delete
+        caches['shared'].set(BADGE_CATALOG_CACHE_KEY, stale)
+        self.assertEqual(award_badges(self.user, ['First Login', 'Social Sharer']), ['Social Sharer'])
+        self.assertEqual(list(UserBadge.objects.filter(user=self.user).values_list('badge', flat=True)), [self.sharer.pk])
+
+    def test_concurrent_award_is_granted_once(self):
+        # Both requests loaded the user's (empty) badges before either awarded
+        this_request = User.objects.get(pk=self.user.pk)
+        other_request = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user_badges(this_request), [])
+        self.assertEqual(award_badges(other_request, ['First Login']), ['First Login'])
+
+        self.assertEqual(award_badges(this_request, ['First Login', 'Social Sharer']), ['Social Sharer'])
+        self.assertEqual(UserBadge.objects.filter(user=self.user, badge=self.first_login).count(), 1)
+        self.assertEqual(awarded_badges(this_request), {self.first_login.pk, self.sharer.pk})
+        self.assertEqual(AnalyticsEvent.objects.filter(user=self.user, event_type='badge_awarded').count(), 2)
+
+    def test_catalog_follows_badge_changes(self):
+        self.assertIn('First Login', badge_catalog())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first_login.delete()
+            Badge.objects.create(name='Level 2', description='')
+        self.assertNotIn('First Login', badge_catalog())
+        self.assertIn('Level 2', badge_catalog())
+
+
+@override_settings(CACHES=LOCAL_CACHES, BATCH_BUFFER_SYNC=True)
+class ApiAuthenticationCacheTests(TestCase):
+    """Cached API principals live in the shared cache and die with their credentials"""
+
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create(username='keyholder')
+        self.api_key = ApiKey.objects.create(user=self.user)
+        self.raw_key = self.api_key.plain_key
+        self.client = APIClient()
+
+    def list_licenses(self, **headers):
+        return self.client.post(reverse('api_license_list'), headers=headers)
+
+    def test_deleted_api_key_is_rejected(self):
+        self.assertEqual(self.list_licenses(x_api_key=self.raw_key).status_code, 200)
+        self.assertIsNotNone(caches['shared'].get(f'api_auth:apikey:{self.api_key.hashed_key}'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api_key.delete()
+        self.assertIsNone(caches['shared'].get(f'api_auth:apikey:{self.api_key.hashed_key}'))
+        self.assertEqual(self.list_licenses(x_api_key=self.raw_key).status_code, 401)
+
+    def test_api_key_is_stored_hashed_and_found_by_prefix(self):
+        stored = ApiKey.objects.get(pk=self.api_key.pk)
+        self.assertIsNone(stored.key)
+        self.assertEqual(stored.prefix, self.raw_key[:API_KEY_PREFIX_LENGTH])
+        self.assertEqual(stored.hashed_key, hash_api_key(self.raw_key))
+        # Another key sharing the prefix must not shadow this one
+        ApiKey.objects.create(user=User.objects.create(username='lookalike'), key=self.raw_key[:API_KEY_PREFIX_LENGTH] + 'x' * 32)
+
+        self.assertEqual(self.list_licenses(x_api_key=self.raw_key).status_code, 200)
+        self.assertIsNotNone(ApiKey.objects.get(pk=self.api_key.pk).last_used)
+        self.assertEqual(self.list_licenses(x_api_key=self.raw_key[:API_KEY_PREFIX_LENGTH] + 'y' * 32).status_code, 401)
+
+    def test_admin_shows_only_the_prefix(self):
+        self.client.force_login(User.objects.create(username='staff', is_staff=True, is_superuser=True))
+        response = self.client.get(reverse('admin:core_apikey_changelist'))
+        self.assertContains(response, self.raw_key[:API_KEY_PREFIX_LENGTH])
+        self.assertNotContains(response, self.raw_key)
+
+        owner = User.objects.create(username='newholder')
+        response = self.client.post(reverse('admin:core_apikey_add'), {'user': owner.pk}, follow=True)
+        created = ApiKey.objects.get(user=owner)
+        # The plaintext is shown once, right after creation
+        [shown] = [str(message) for message in response.context['messages'] if 'New API key' in str(message)]
+        self.assertEqual(hash_api_key(shown.split(': ')[1].split(' ')[0]), created.hashed_key)
+        response = self.client.get(reverse('admin:core_apikey_change', args=[created.pk]))
+        self.assertContains(response, created.prefix)
+        self.assertNotContains(response, created.hashed_key)
+
+    def test_password_change_rejects_cached_password(self):
+        self.user.set_password('old-secret')
+        self.user.save()
+        credentials = {'username': 'keyholder', 'password': 'old-secret'}
+        self.assertEqual(self.client.post(reverse('api_license_list'), credentials).status_code, 200)
+        self.assertEqual(self.client.post(reverse('api_license_list'), credentials).status_code, 200)
+
+        self.user.set_password('new-secret')
+        self.user.save()
+        self.assertEqual(self.client.post(reverse('api_license_list'), credentials).status_code, 401)
+        credentials['password'] = 'new-secret'
+        self.assertEqual(self.client.post(reverse('api_license_list'), credentials).status_code, 200)
+
+    def test_credential_change_drops_cached_token(self):
+        token = Token.objects.create(user=self.user)
+        auth = {'authorization': f'Token {token.key}'}
+        self.assertEqual(self.list_licenses(**auth).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_token(token.key), self.user)
+
+        self.user.set_password('rotated')
+        self.user.save()
+        # The cached principal no longer matches the fingerprint and is read again
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_token(token.key), self.user)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.list_licenses(**auth).status_code, 401)
+
+
+class ApiKeyLastUsedTests(TestCase):
+    """Key uses are buffered and written with the latest use per key"""
+
+    def setUp(self):
+        self.first = ApiKey.objects.create(user=User.objects.create(username='stamped'))
+        self.second = ApiKey.objects.create(user=User.objects.create(username='stamped-too'))
+        self.now = timezone.now()
+
+    def test_flush_writes_latest_use_per_key(self):
+        usage_buffer.put((self.first.pk, self.now))
+        usage_buffer.put((self.first.pk, self.now - timedelta(minutes=5)))
+        usage_buffer.put((self.second.pk, self.now - timedelta(minutes=1)))
+        self.assertIsNone(ApiKey.objects.get(pk=self.first.pk).last_used)
+
+        self.assertEqual(flush_api_key_usage(), 3)
+        self.assertEqual(ApiKey.objects.get(pk=self.first.pk).last_used, self.now)
+        self.assertEqual(ApiKey.objects.get(pk=self.second.pk).last_used, self.now - timedelta(minutes=1))
+
+    def test_pending_uses_are_flushed_after_the_interval(self):
+        # The flush thread has its own connection, outside this test's transaction
+        with mock.patch.object(usage_buffer, 'flush_interval', 0.05), \
+                mock.patch.object(usage_buffer, 'flush_func') as write:
+            touch_api_key(self.first.pk, self.now)
+            deadline = time.monotonic() + 5
+            while not write.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+        write.assert_called_once_with([(self.first.pk, self.now)])
+
+
+@override_settings(CACHES=LOCAL_CACHES, BATCH_BUFFER_SYNC=True)
+class TradeBulkIngestViewTests(TestCase):
+    """Bulk trade uploads upsert trades and keep the daily rollups in step"""
+
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create(username='ingest')
+        self.license = LicenseKey.objects.create(
+            user=self.user, ea=ExpertAdvisor.objects.create(name='EA'),
+            plan=SubscriptionPlan.objects.create(name='Plan', price=10), key='ingest-key',
+        )
+        self.day = timezone.localdate()
+        self.close_time = local_day_bounds(self.day)[0] + timedelta(hours=12)
+        self.client = APIClient()
+
+    def trade(self, ticket_id, profit, **fields):
+        row = {
+            'ticket_id': ticket_id, 'symbol': 'EURUSD', 'trade_type': 'BUY',
+            'open_time': (self.close_time - timedelta(hours=1)).isoformat(),
+            'close_time': self.close_time.isoformat(),
+            'open_price': '1.10000', 'lot_size': '0.10', 'profit': str(profit), 'status': 'CLOSED',
+        }
+        row.update(fields)
+        return row
+
+    def post(self, data, content_type='application/json', **headers):
+        headers.setdefault('x_license_key', 'ingest-key')
+        if content_type == 'application/json':
+            data = json.dumps(data)
+        return self.client.post(reverse('api_trade_bulk_ingest'), data, content_type=content_type, headers=headers)
+
+    def assertDerivedRows(self, trades, net_profit, symbols):
+        self.assertEqual(TradeDetail.objects.filter(user=self.user).count(), trades)
+        metrics = TradingMetrics.objects.get(user=self.user, date=self.day)
+        self.assertEqual((metrics.total_trades, metrics.net_profit), (trades, net_profit))
+        self.assertEqual(
+            {row.symbol: (row.trade_count, row.profit_sum) for row in SymbolDailyStats.objects.filter(user=self.user, date=self.day)},
+            symbols,
+        )
+
+    def test_json_array(self):
+        response = self.post([self.trade('1', 100), self.trade('2', -40, symbol='XAUUSD')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['received'], response.data['created']), (2, 2))
+        self.assertDerivedRows(2, 60, {'EURUSD': (1, 100), 'XAUUSD': (1, -40)})
+
+    def test_trades_object(self):
+        response = self.post({'trades': [self.trade('1', 100)]})
+        self.assertEqual(response.data['created'], 1)
+        self.assertDerivedRows(1, 100, {'EURUSD': (1, 100)})
+
+    def test_ndjson_body(self):
+        body = '\n'.join(json.dumps(row) for row in [self.trade('1', 100), self.trade('2', 20)]) + '\n\n'
+        response = self.post(body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['received'], response.data['created']), (2, 2))
+        self.assertDerivedRows(2, 120, {'EURUSD': (2, 120)})
+
+    def test_malformed_and_invalid_rows_are_reported_per_row(self):
+        body = '\n'.join([json.dumps(self.trade('1', 100)), '{not json', json.dumps(self.trade('2', 5, trade_type='HOLD'))])
+        response = self.post(body, content_type='application/x-ndjson')
+        self.assertEqual((response.data['created'], response.data['invalid']), (1, 2))
+        results = response.data['results']
+        self.assertEqual(results[1]['errors'], {'non_field_errors': ['Malformed trade record.']})
+        self.assertEqual((results[2]['ticket_id'], list(results[2]['errors'])), ('2', ['trade_type']))
+        self.assertDerivedRows(1, 100, {'EURUSD': (1, 100)})
+
+    def test_body_that_is_not_a_list_is_rejected(self):
+        self.assertEqual(self.post({'ticket_id': '1'}).status_code, 400)
+        self.assertFalse(TradeDetail.objects.exists())
+
+    def test_resent_ticket_replaces_the_row(self):
+        self.post([self.trade('1', 100), self.trade('2', 10)])
+        response = self.post([self.trade('1', -30, symbol='XAUUSD'), self.trade('1', -50, symbol='XAUUSD')])
+        self.assertEqual([result['status'] for result in response.data['results']], ['superseded', 'updated'])
+        self.assertEqual(TradeDetail.objects.get(user=self.user, ticket_id='1').profit, -50)
+        self.assertDerivedRows(2, -40, {'EURUSD': (1, 10), 'XAUUSD': (1, -50)})
+
+    def test_api_key_auth(self):
+        api_key = ApiKey.objects.create(user=self.user)
+        response = self.post([self.trade('1', 100)], x_license_key='', x_api_key=api_key.plain_key)
+        self.assertEqual(response.data['created'], 1)
+
+    def test_unknown_license_or_api_key_is_rejected(self):
+        self.assertEqual(self.post([self.trade('1', 100)], x_license_key='nope').status_code, 403)
+        self.assertEqual(self.post([self.trade('1', 100)], x_license_key='', x_api_key='nope').status_code, 403)
+        self.license.status = 'revoked'
+        self.license.save()
+        self.assertEqual(self.post([self.trade('1', 100)]).status_code, 403)
+        self.assertFalse(TradeDetail.objects.exists())
+        self.assertFalse(TradingMetrics.objects.filter(user=self.user).exists())
+
+
+class RiskMetricsTests(TestCase):
+    """Segmented risk metrics match per-group values worked out by hand"""
+
+    def arrays(self):
+        nan = float('nan')
+        # (user 1, day 10): four trades; (user 1, day 11): one; (user 2, day 10): two losses
+        return {
+            'user_id': np.array([1, 1, 1, 1, 1, 2, 2]),
+            'day': np.array([10, 10, 10, 10, 11, 10, 10]),
+            'profit': np.array([100.0, -50.0, -80.0, 60.0, 30.0, -20.0, -10.0]),
+            'r_multiple': np.array([2.0, nan, -1.0, 0.5, nan, 1.0, 3.0]),
+        }
+
+    def test_equity_curve_restarts_per_group(self):
+        profit = self.arrays()['profit']
+        np.testing.assert_allclose(equity_curve(profit, np.array([0, 4, 5])), [100, 50, -30, 30, 30, -20, -30])
+        np.testing.assert_allclose(equity_curve(profit), np.cumsum(profit))
+
+    def test_group_metrics(self):
+        metrics = compute_group_metrics(self.arrays())
+        np.testing.assert_array_equal(metrics['user_id'], [1, 1, 2])
+        np.testing.assert_array_equal(metrics['day'], [10, 11, 10])
+        np.testing.assert_array_equal(metrics['trades'], [4, 1, 2])
+        np.testing.assert_allclose(metrics['net_profit'], [30, 30, -30])
+        np.testing.assert_allclose(metrics['profit_factor'], [160 / 130, 30, 0])
+        np.testing.assert_allclose(metrics['expectancy'], [7.5, 30, -15])
+        # Sample std of group one is sqrt(22275 / 3); single-trade groups have no Sharpe
+        np.testing.assert_allclose(metrics['sharpe'], [7.5 / np.sqrt(7425), np.nan, -15 / np.sqrt(50)])
+        # Downside deviation over all trades of the group; none without losses
+        np.testing.assert_allclose(metrics['sortino'], [7.5 / np.sqrt(2225), np.nan, -15 / np.sqrt(250)])
+        # Peaks start at zero, so a day that only loses draws down from its start
+        np.testing.assert_allclose(metrics['max_drawdown'], [130, 0, 30])
+        np.testing.assert_allclose(metrics['avg_r_multiple'], [0.5, np.nan, 2])
+
+    def test_group_metrics_of_no_trades(self):
+        metrics = compute_group_metrics({key: np.array([]) for key in self.arrays()})
+        self.assertTrue(all(len(values) == 0 for values in metrics.values()))
+
+    def test_r_multiples_and_stored_metrics(self):
+        user = User.objects.create(username='risk')
+        day = timezone.localdate()
+        close_time = local_day_bounds(day)[0] + timedelta(hours=12)
+        base = {'symbol': 'EURUSD', 'open_time': close_time - timedelta(hours=1), 'lot_size': 1, 'status': 'CLOSED'}
+        upsert_trades(user, [
+            # Risked 0.01 to make 0.02
+            dict(base, ticket_id='1', trade_type='BUY', open_price=1.1, stop_loss=1.09, close_price=1.12, profit=20, close_time=close_time),
+            # Risked 0.01 to lose 0.005
+            dict(base, ticket_id='2', trade_type='SELL', open_price=1.1, stop_loss=1.11, close_price=1.105, profit=-5, close_time=close_time + timedelta(minutes=1)),
+            # Stop on the wrong side of the entry: no R-multiple
+            dict(base, ticket_id='3', trade_type='BUY', open_price=1.1, stop_loss=1.2, close_price=1.1, profit=0, close_time=close_time + timedelta(minutes=2)),
+        ])
+        arrays = load_trade_arrays([user.pk])
+        np.testing.assert_allclose(arrays['r_multiple'], [2, -0.5, np.nan])
+        np.testing.assert_array_equal(arrays['profit'], [20, -5, 0])
+
+        self.assertEqual(update_risk_metrics([user.pk]), 1)
+        metrics = TradingMetrics.objects.get(user=user, date=day)
+        self.assertEqual(metrics.max_drawdown, Decimal('5.00'))
+        self.assertEqual(metrics.expectancy, Decimal('5.00'))
+        self.assertEqual(metrics.avg_risk_reward, Decimal('0.75'))
+        self.assertEqual(metrics.sharpe_ratio, Decimal(str(round(5 / np.sqrt(175), 2))))
+        self.assertEqual(metrics.sortino_ratio, Decimal(str(round(5 / np.sqrt(25 / 3), 2))))
+
+
+class LicenseFixtureMixin:
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create(username='licensee')
+        self.ea = ExpertAdvisor.objects.create(name='EA')
+        self.plan = SubscriptionPlan.objects.create(name='Plan', price=10)
+        self.license = LicenseKey.objects.create(user=self.user, ea=self.ea, plan=self.plan, key='active-key')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_license(self, key, **fields):
+        return LicenseKey.objects.create(user=self.user, ea=fields.pop('ea', self.ea), plan=self.plan, key=key, **fields)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class LicenseCacheTests(LicenseFixtureMixin, TestCase):
+    """Cached license statuses never outlive a committed change"""
+
+    def test_revocation_clears_cached_status_after_commit(self):
+        self.assertTrue(validate_license('active-key', self.ea.pk)['valid'])
+        stale = get_license_status('active-key')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.license.revoke()
+            # Another worker re-caches the row as it was before the commit
+            get_license_status('active-key')
+            shared_cache().set(_license_cache_key('active-key'), stale)
+        data = validate_license('active-key', self.ea.pk)
+        self.assertEqual((data['status'], data['valid']), ('revoked', False))
+
+    def test_new_license_clears_negative_cache(self):
+        self.assertIsNone(validate_license('later-key', self.ea.pk))
+        self.assertEqual(shared_cache().get(_license_cache_key('later-key')), 'missing')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_license('later-key')
+        self.assertTrue(validate_license('later-key', self.ea.pk)['valid'])
+
+    def test_cached_validation_skips_the_database(self):
+        validate_license('active-key', self.ea.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(validate_license('active-key', self.ea.pk)['valid'])
+            self.assertIsNone(validate_license('active-key', self.ea.pk + 1))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class LicenseTokenTests(LicenseFixtureMixin, TestCase):
+    """Offline tokens and the revocation list EAs check them against"""
+
+    def issue(self, key='active-key', ea_id=None):
+        return self.client.post(reverse('api_license_token'), {'key': key, 'ea_id': ea_id or self.ea.pk}, format='json')
+
+    def test_token_verifies_with_its_verify_key(self):
+        response = self.issue()
+        self.assertEqual(response.status_code, 200)
+        payload = signing.loads(response.data['token'], key=response.data['verify_key'], salt=LICENSE_TOKEN_SALT)
+        self.assertEqual(payload['fp'], key_fingerprint('active-key'))
+        self.assertEqual((payload['ea_id'], payload['v'], payload['exp']), (self.ea.pk, 1, response.data['expires_at']))
+        self.assertLessEqual(payload['exp'], timezone.now().timestamp() + LICENSE_TOKEN_TTL)
+
+    def test_tampered_or_foreign_token_is_rejected(self):
+        issued = self.issue().data
+        self.add_license('other-key')
+        other = self.issue('other-key').data
+        tampered = issued['token'][:-1] + ('A' if issued['token'][-1] != 'A' else 'B')
+        with self.assertRaises(signing.BadSignature):
+            signing.loads(tampered, key=issued['verify_key'], salt=LICENSE_TOKEN_SALT)
+        with self.assertRaises(signing.BadSignature):
+            signing.loads(issued['token'], key=other['verify_key'], salt=LICENSE_TOKEN_SALT)
+
+    def test_token_expires_with_its_ttl(self):
+        issued = self.issue().data
+        later = time.time() + LICENSE_TOKEN_TTL + 1
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            with self.assertRaises(signing.SignatureExpired):
+                signing.loads(issued['token'], key=issued['verify_key'], salt=LICENSE_TOKEN_SALT, max_age=LICENSE_TOKEN_TTL)
+
+    def test_token_is_capped_at_license_expiry(self):
+        expires_at = timezone.now() + timedelta(minutes=5)
+        self.add_license('short-key', expires_at=expires_at)
+        self.assertEqual(self.issue('short-key').data['expires_at'], int(expires_at.timestamp()))
+
+    def test_no_token_for_revoked_expired_or_foreign_licenses(self):
+        self.add_license('expired-key', expires_at=timezone.now() - timedelta(minutes=1))
+        self.add_license('revoked-key').revoke()
+        for key, ea_id in [('expired-key', None), ('revoked-key', None), ('active-key', self.ea.pk + 1), ('unknown', None)]:
+            self.assertEqual(self.issue(key, ea_id).status_code, 403, key)
+
+    def test_revocation_list(self):
+        start = timezone.now()
+        self.add_license('old-key').revoke(when=start - timedelta(days=2))
+        self.add_license('new-key').revoke(when=start - timedelta(hours=1))
+        revoked_twice = self.add_license('flapping-key')
+        revoked_twice.revoke(when=start - timedelta(minutes=10))
+        revoked_twice.activate()
+        revoked_twice.revoke(when=start - timedelta(minutes=5))
+
+        response = self.client.get(reverse('api_license_revocations'))
+        self.assertEqual(sorted(response.data['revoked']), sorted([
+            [key_fingerprint('old-key'), 2], [key_fingerprint('new-key'), 2], [key_fingerprint('flapping-key'), 4],
+        ]))
+        since = int((start - timedelta(days=1)).timestamp())
+        response = self.client.get(reverse('api_license_revocations'), {'since': since})
+        self.assertEqual(sorted(response.data['revoked']), sorted([[key_fingerprint('new-key'), 2], [key_fingerprint('flapping-key'), 4]]))
+        self.assertEqual(self.client.get(reverse('api_license_revocations'), {'since': '1e400'}).status_code, 400)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class LicenseBatchValidateTests(LicenseFixtureMixin, TestCase):
+    """Batch validation answers each license as the single endpoint would"""
+
+    def test_mixed_batch(self):
+        self.add_license('revoked-key').revoke()
+        self.add_license('expired-key', expires_at=timezone.now() - timedelta(minutes=1))
+        licenses = [
+            {'key': 'active-key', 'ea_id': self.ea.pk},
+            {'key': 'revoked-key', 'ea_id': self.ea.pk},
+            {'key': 'expired-key', 'ea_id': self.ea.pk},
+            {'key': 'active-key', 'ea_id': self.ea.pk + 1},
+            {'key': 'unknown-key', 'ea_id': self.ea.pk},
+        ]
+        # One query for every uncached key of the batch
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('api_license_validate_batch'), {'licenses': licenses}, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['licenses']
+        self.assertEqual([result['valid'] for result in results], [True, False, False, False, False])
+        self.assertEqual([result.get('status') for result in results], ['active', 'revoked', 'active', None, None])
+        self.assertEqual(results[3], {'key': 'active-key', 'ea': self.ea.pk + 1, 'valid': False, 'detail': 'Not found.'})
+        self.assertEqual(results[4]['detail'], 'Not found.')
+
+        with self.assertNumQueries(0):
+            again = self.client.post(reverse('api_license_validate_batch'), licenses, format='json')
+        self.assertEqual(again.data['licenses'], results)
+
+    def test_invalid_batches_are_rejected(self):
+        url = reverse('api_license_validate_batch')
+        self.assertEqual(self.client.post(url, {'licenses': []}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, [{'key': 'active-key'}], format='json').status_code, 400)
+        too_many = [{'key': f'key-{i}', 'ea_id': self.ea.pk} for i in range(101)]
+        self.assertEqual(self.client.post(url, too_many, format='json').status_code, 400)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ApiKeyRateThrottleTests(TestCase):
+    """Token buckets per client, sized by the best active plan"""
+
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create(username='throttled')
+        self.plan = SubscriptionPlan.objects.create(name='Small', price=10, api_rate_limit=3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.now = 1_000_000.0
+        clock = mock.patch('core.throttling.time.time', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def call(self):
+        return self.client.post(reverse('api_license_list'))
+
+    def test_bucket_exhausts_and_refills(self):
+        Subscription.objects.create(user=self.user, plan=self.plan)
+        self.assertEqual([self.call().status_code for _ in range(4)], [200, 200, 200, 429])
+        # Three an hour: one token every 20 minutes
+        self.assertEqual(self.call()['Retry-After'], '1200')
+        self.now += 600
+        self.assertEqual(self.call().status_code, 429)
+        self.now += 600
+        self.assertEqual([self.call().status_code for _ in range(2)], [200, 429])
+        # The bucket never holds more than its capacity
+        self.now += 24 * 60 * 60
+        self.assertEqual([self.call().status_code for _ in range(4)], [200, 200, 200, 429])
+
+    def test_plan_change_clears_cached_rate(self):
+        self.assertIsNone(plan_rate_limit(self.user.pk))
+        subscription = Subscription.objects.create(user=self.user, plan=self.plan)
+        self.assertEqual(plan_rate_limit(self.user.pk), 3)
+        SubscriptionPlan.objects.filter(pk=self.plan.pk).update(api_rate_limit=10)
+        subscription.save()
+        self.assertEqual(plan_rate_limit(self.user.pk), 10)
+        subscription.delete()
+        self.assertIsNone(plan_rate_limit(self.user.pk))
+
+
+class PeriodicCullFileBasedCacheTests(TestCase):
+    """The file cache scans its directory for culling at most once per interval"""
+
+    def test_culls_once_per_interval(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        cache = PeriodicCullFileBasedCache(location, {'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2, 'CULL_INTERVAL': 60}})
+        with mock.patch('core.cache_backends.time.monotonic', return_value=100.0):
+            for i in range(10):
+                cache.set(f'key-{i}', i)
+        self.assertEqual(len(os.listdir(location)), 10)
+        with mock.patch('core.cache_backends.time.monotonic', return_value=161.0):
+            cache.set('key-10', 10)
+        self.assertLess(len(os.listdir(location)), 11)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TradeHistoryPagingTests(TestCase):
+    """Keyset pages of the trade history cover every row exactly once"""
+
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create(username='pager')
+        self.client.force_login(self.user)
+        self.now = timezone.now().replace(microsecond=0)
+        rows = []
+        # Closed trades, three of them closing in the same second
+        for i, minutes in enumerate([10, 20, 20, 20, 30, 40, 50]):
+            rows.append(self.trade(f'c{i}', close_time=self.now - timedelta(minutes=minutes), profit=10 if i % 2 else -5,
+                                   symbol='XAUUSD' if i == 3 else 'EURUSD'))
+        # Open trades, two of them opened in the same second
+        for i, minutes in enumerate([5, 15, 15]):
+            rows.append(self.trade(f'o{i}', open_time=self.now - timedelta(minutes=minutes), close_time=None, status='OPEN'))
+        upsert_trades(self.user, rows)
+
+    def trade(self, ticket_id, **fields):
+        row = {
+            'ticket_id': ticket_id, 'symbol': 'EURUSD', 'trade_type': 'BUY', 'open_time': self.now - timedelta(hours=1),
+            'open_price': 1, 'lot_size': 1, 'profit': 0, 'status': 'CLOSED',
+        }
+        row.update(fields)
+        return row
+
+    def page(self, **params):
+        response = self.client.get(reverse('trade_details_json'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def walk(self, key, cursor_name, **params):
+        tickets, cursor = [], None
+        while True:
+            extra = {cursor_name: cursor} if cursor else {}
+            data = self.page(limit=2, **params, **extra)
+            tickets += [trade['ticket_id'] for trade in data[key]]
+            cursor = data[f'next_{cursor_name}']
+            if not cursor:
+                return tickets
+
+    def ordered(self, status, time_field):
+        return list(
+            TradeDetail.objects.filter(user=self.user, status=status)
+            .order_by(f'-{time_field}', '-id').values_list('ticket_id', flat=True)
+        )
+
+    def test_closed_pages_cover_ties_once(self):
+        tickets = self.walk('trades', 'cursor')
+        self.assertEqual(tickets, self.ordered('CLOSED', 'close_time'))
+        self.assertEqual(len(set(tickets)), 7)
+
+    def test_open_pages_cover_ties_once(self):
+        first = self.page(limit=2)
+        self.assertEqual(len(first['open_trades']), 2)
+        tickets = [trade['ticket_id'] for trade in first['open_trades']]
+        tickets += self.walk('open_trades', 'open_cursor', open_cursor=first['next_open_cursor'])
+        self.assertEqual(tickets, self.ordered('OPEN', 'open_time'))
+        # Pages of open trades do not repeat the closed ones
+        self.assertEqual(self.page(limit=2, open_cursor=first['next_open_cursor'])['trades'], [])
+
+    def test_filters(self):
+        self.assertEqual([trade['ticket_id'] for trade in self.page(symbol='XAUUSD')['trades']], ['c3'])
+        self.assertEqual(sorted(trade['ticket_id'] for trade in self.page(result='win')['trades']), ['c1', 'c3', 'c5'])
+        TradeDetail.objects.filter(user=self.user, ticket_id='c6').update(open_time=self.now - timedelta(days=10))
+        self.assertNotIn('c6', [trade['ticket_id'] for trade in self.page(days=7)['trades']])
+        self.assertEqual(self.page(symbol='XAUUSD')['filters']['symbol'], 'XAUUSD')
+
+    def test_bad_limit_or_cursor_falls_back(self):
+        self.assertEqual(len(self.page(limit='lots')['trades']), 7)
+        self.assertEqual(len(self.page(limit=0)['trades']), 1)
+        self.assertEqual(len(self.page(cursor='not-a-cursor')['trades']), 7)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ReconcileTradingMetricsTests(TestCase):
+    """The reconcile job repairs drifted days without inventing empty ones"""
+
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create(username='reconciled')
+        self.day = timezone.localdate() - timedelta(days=5)
+        self.midnight = local_day_bounds(self.day)[1]
+        upsert_trades(self.user, [
+            self.trade('1', 100, self.midnight - timedelta(hours=12)),
+            # Closed exactly at the next midnight: belongs to the next day only
+            self.trade('2', -40, self.midnight),
+        ])
+
+    def trade(self, ticket_id, profit, close_time):
+        return {
+            'ticket_id': ticket_id, 'symbol': 'EURUSD', 'trade_type': 'BUY', 'open_time': close_time - timedelta(hours=1),
+            'close_time': close_time, 'open_price': 1, 'lot_size': 1, 'profit': profit, 'status': 'CLOSED',
+        }
+
+    def reconcile(self):
+        out = StringIO()
+        call_command('reconcile_trading_metrics', date=str(self.day + timedelta(days=1)), days=4, stdout=out)
+        return out.getvalue()
+
+    def metrics(self):
+        return {
+            row.date: (row.total_trades, row.net_profit)
+            for row in TradingMetrics.objects.filter(user=self.user)
+        }
+
+    def test_only_traded_or_existing_days_are_written(self):
+        stale_day = self.day - timedelta(days=2)
+        TradingMetrics.objects.create(user=self.user, date=stale_day, total_trades=3, net_profit=50)
+        TradingMetrics.objects.filter(user=self.user, date=self.day).update(net_profit=999)
+        self.reconcile()
+        self.assertEqual(self.metrics(), {
+            stale_day: (0, 0),
+            self.day: (1, 100),
+            self.day + timedelta(days=1): (1, -40),
+        })
+
+    def test_drifted_users_get_their_equity_series_rebuilt(self):
+        expected = list(EquityCurveBucket.objects.filter(user=self.user).order_by('day').values_list('day', 'end_balance'))
+        EquityCurveBucket.objects.filter(user=self.user).delete()
+        self.assertIn('0 equity series rebuilt', self.reconcile())
+        self.assertFalse(EquityCurveBucket.objects.filter(user=self.user).exists())
+
+        TradingMetrics.objects.filter(user=self.user, date=self.day).update(total_trades=7)
+        self.assertIn('1 equity series rebuilt', self.reconcile())
+        self.assertEqual(
+            list(EquityCurveBucket.objects.filter(user=self.user).order_by('day').values_list('day', 'end_balance')),
+            expected,
+        )
+
+
+@override_settings(CACHES=LOCAL_CACHES, BATCH_BUFFER_SYNC=True)
+class EAUsageRollupTests(LicenseFixtureMixin, TestCase):
+    """Usage batches are stored raw and merged into the daily rollups"""
+
+    def setUp(self):
+        super().setUp()
+        self.start = local_day_bounds(timezone.localdate() - timedelta(days=1))[0]
+
+    def report(self, hours, **usage):
+        return {'license_id': self.license.pk, 'reported_at': self.start + timedelta(hours=hours), 'usage': usage}
+
+    def test_batches_merge_into_the_daily_rollup(self):
+        write_usage_reports([self.report(2, trades=2, equity=100.5), self.report(30, trades=1)])
+        write_usage_reports([self.report(1, trades=3, mode='live', paused=True), self.report(5, trades=1, equity=99.5)])
+
+        first_day = EAUsageDaily.objects.get(license=self.license, date=timezone.localdate(self.start))
+        self.assertEqual(first_day.report_count, 3)
+        self.assertEqual(first_day.first_report_at, self.start + timedelta(hours=1))
+        self.assertEqual(first_day.last_report_at, self.start + timedelta(hours=5))
+        # Only numbers are summed; strings and booleans stay in the raw reports
+        self.assertEqual(first_day.totals, {'trades': 6, 'equity': 200.0})
+        self.assertEqual(EAUsageDaily.objects.get(license=self.license, date=timezone.localdate()).report_count, 1)
+
+        reports = EAUsageReport.objects.filter(license=self.license)
+        self.assertEqual(sum(day.report_count for day in EAUsageDaily.objects.all()), reports.count())
+        self.assertEqual(
+            sum(day.totals.get('trades', 0) for day in EAUsageDaily.objects.all()),
+            sum(report.usage['trades'] for report in reports),
+        )
+
+    def test_posted_usage_reaches_the_rollup(self):
+        response = self.client.post(reverse('api_ea_config'), {'key': 'active-key', 'usage': {'trades': 4}}, format='json')
+        self.assertEqual(response.json(), {'received': True})
+        self.assertEqual(EAUsageDaily.objects.get(license=self.license).totals, {'trades': 4})
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class EAConfigViewTests(LicenseFixtureMixin, TestCase):
+    """Compiled EA configs merge the scopes in order and are revalidated by ETag"""
+
+    def get(self, **headers):
+        return self.client.get(reverse('api_ea_config'), {'key': 'active-key'}, headers=headers)
+
+    def test_scopes_merge_from_global_to_ea_and_plan(self):
+        EAConfigProfile.objects.create(settings={'risk_level': 'low', 'lot': 0.1, 'news_filter': True})
+        EAConfigProfile.objects.create(plan=self.plan, settings={'lot': 0.2, 'max_trades': 8})
+        EAConfigProfile.objects.create(ea=self.ea, settings={'lot': 0.3, 'session': 'london'})
+        EAConfigProfile.objects.create(ea=self.ea, plan=self.plan, settings={'session': 'tokyo'})
+        # Profiles of other plans and EAs do not apply
+        EAConfigProfile.objects.create(plan=SubscriptionPlan.objects.create(name='Other', price=5), settings={'lot': 9})
+        EAConfigProfile.objects.create(ea=ExpertAdvisor.objects.create(name='Other EA'), settings={'session': 'ny'})
+
+        self.assertEqual(self.get().json()['config'], {
+            'ea_name': 'EA', 'plan': 'Plan', 'user': 'licensee',
+            'settings': {'risk_level': 'low', 'lot': 0.3, 'news_filter': True, 'max_trades': 8, 'session': 'tokyo'},
+        })
+
+    def test_unchanged_config_is_answered_with_304(self):
+        response = self.get()
+        etag = response['ETag']
+        self.assertEqual(response.json()['config']['settings'], DEFAULT_EA_SETTINGS)
+
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            EAConfigProfile.objects.create(ea=self.ea, settings={'max_trades': 2})
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['config']['settings']['max_trades'], 2)
+
+    def test_inactive_license_has_no_config(self):
+        self.license.revoke()
+        self.assertEqual(self.get().status_code, 404)
+
+
+class BatchBufferTests(TestCase):
+    """Rows are flushed by size or age, and refused once the queue is full"""
+
+    def buffer(self, **options):
+        self.batches = []
+        self.flushed = threading.Event()
+
+        def write(rows):
+            self.batches.append(list(rows))
+            self.flushed.set()
+        return BatchBuffer(write, name='test-buffer', **options)
+
+    def test_full_batch_is_flushed_at_once(self):
+        buffer = self.buffer(batch_size=3, flush_interval=60)
+        for row in range(3):
+            self.assertTrue(buffer.put(row))
+        self.assertTrue(self.flushed.wait(5))
+        self.assertEqual(self.batches, [[0, 1, 2]])
+        self.assertEqual(len(buffer), 0)
+
+    def test_partial_batch_is_flushed_after_the_interval(self):
+        buffer = self.buffer(batch_size=100, flush_interval=0.05)
+        started = time.monotonic()
+        buffer.put('row')
+        self.assertTrue(self.flushed.wait(5))
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(self.batches, [['row']])
+
+    def test_put_is_refused_when_full(self):
+        buffer = self.buffer(batch_size=100, flush_interval=60, max_pending=2)
+        self.assertEqual([buffer.put(row) for row in range(3)], [True, True, False])
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self.batches, [[0, 1]])
+        self.assertEqual(
+            {name: buffer.stats()[name] for name in ('accepted', 'dropped', 'written', 'pending')},
+            {'accepted': 2, 'dropped': 1, 'written': 2, 'pending': 0},
+        )
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_saturated_usage_ingestion_answers_503(self):
+        clear_caches()
+        user = User.objects.create(username='busy')
+        LicenseKey.objects.create(
+            user=user, ea=ExpertAdvisor.objects.create(name='EA'),
+            plan=SubscriptionPlan.objects.create(name='Plan', price=10), key='busy-key',
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch.object(ea_usage_buffer, 'max_pending', 0):
+            response = client.post(reverse('api_ea_config'), {'key': 'busy-key', 'usage': {'trades': 1}}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(EAUsageReport.objects.exists())
+
+
+class DailyMetricRollupTests(TestCase):
+    """Rollups equal a recompute of the same days from the raw rows"""
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.days = [self.today - timedelta(days=offset) for offset in (3, 2, 1)]
+        plan = SubscriptionPlan.objects.create(name='Plan', price=10)
+        for index, day in enumerate(self.days):
+            noon = local_day_bounds(day)[0] + timedelta(hours=12)
+            user = User.objects.create(username=f'member-{index}', date_joined=noon, is_active=index != 1)
+            for number, (status, amount) in enumerate([('confirmed', 10 + index), ('failed', 5), ('confirmed', 2.5)][:index + 1]):
+                payment = Payment.objects.create(user=user, plan=plan, amount=amount, status=status)
+                Payment.objects.filter(pk=payment.pk).update(created_at=noon + timedelta(minutes=number))
+            ticket = SupportTicket.objects.create(user=user, subject='Help', message='', status=['open', 'closed'][index % 2])
+            SupportTicket.objects.filter(pk=ticket.pk).update(created_at=noon)
+            for number, profit in enumerate([25, -10, 0][:3 - index]):
+                TradeDetail.objects.create(
+                    user=user, ticket_id=f'{index}-{number}', symbol='EURUSD', trade_type='BUY',
+                    open_time=noon - timedelta(hours=1), close_time=noon + timedelta(hours=number),
+                    open_price=1, close_price=1, lot_size=1, profit=profit, status='CLOSED',
+                )
+
+    def recomputed(self, since, until):
+        expected = defaultdict(Decimal)
+
+        def add(when, metric, dimension='', value=1):
+            day = timezone.localdate(when)
+            if since <= day <= until:
+                expected[(day, metric, dimension)] += Decimal(str(value))
+
+        for user in User.objects.all():
+            add(user.date_joined, 'users_joined')
+        for payment in Payment.objects.all():
+            add(payment.created_at, 'payment_count', payment.status)
+            add(payment.created_at, 'payment_amount', payment.status, payment.amount)
+        for ticket in SupportTicket.objects.all():
+            add(ticket.created_at, 'tickets_opened')
+        for trade in TradeDetail.objects.all():
+            add(trade.close_time, 'trades_closed')
+            add(trade.close_time, 'trades_profitable', value=int(trade.profit > 0))
+            add(trade.close_time, 'trade_profit', value=trade.profit)
+        expected[(self.today, 'revenue_total', '')] = sum(Payment.objects.values_list('amount', flat=True))
+        for ticket in SupportTicket.objects.all():
+            expected[(self.today, 'tickets_by_status', ticket.status)] += 1
+        for user in User.objects.all():
+            expected[(self.today, 'users_by_state', 'active' if user.is_active else 'inactive')] += 1
+        return dict(expected)
+
+    def stored(self):
+        return {
+            (row.date, row.metric, row.dimension): row.value
+            for row in DailyMetricRollup.objects.all()
+        }
+
+    def test_rollup_matches_raw_rows(self):
+        rollup_daily_metrics(self.days[0], self.days[-1])
+        self.assertEqual(self.stored(), self.recomputed(self.days[0], self.days[-1]))
+
+    def test_rerun_replaces_the_days_it_covers(self):
+        rollup_daily_metrics(self.days[0], self.days[-1])
+        Payment.objects.filter(status='failed').update(status='confirmed')
+        TradeDetail.objects.filter(close_time__lt=local_day_bounds(self.days[1])[0]).delete()
+        rollup_daily_metrics(self.days[1], self.days[-1])
+
+        expected = self.recomputed(self.days[1], self.days[-1])
+        # The first day keeps the values of the earlier run
+        expected.update({key: value for key, value in self.stored().items() if key[0] == self.days[0]})
+        self.assertEqual(self.stored(), expected)
+        self.assertNotIn((self.days[1], 'payment_count', 'failed'), self.stored())
+
+
+@override_settings(CACHES=LOCAL_CACHES, BATCH_BUFFER_SYNC=True)
+class XPLedgerTests(TestCase):
+    """Every XP grant is in the ledger, whose totals agree with UserLevel"""
+
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create(username='grinder')
+        self.today = timezone.localdate()
+
+    def grant(self, days_ago, amount, reason='dashboard_view'):
+        when = local_day_bounds(self.today - timedelta(days=days_ago))[0] + timedelta(hours=10)
+        with mock.patch('django.utils.timezone.now', return_value=when):
+            return add_xp(self.user, amount, reason=reason)
+
+    def test_ledger_total_matches_user_level(self):
+        grants = [(3, 40), (2, 15), (2, 90), (0, 20), (0, 150)]
+        for days_ago, amount in grants:
+            level = self.grant(days_ago, amount)
+        # Levels spend 100 XP per level reached, on top of the XP left over
+        earned = sum(100 * reached for reached in range(1, level.level)) + level.xp
+        self.assertGreater(level.level, 1)
+        self.assertEqual(XPLedger.objects.filter(user=self.user).aggregate(total=Sum('amount'))['total'], earned)
+
+        daily = XPLedger.daily_totals(self.user, self.today - timedelta(days=6), self.today)
+        self.assertEqual(sum(daily.values()), earned)
+        self.assertEqual(set(daily), {self.today - timedelta(days=days_ago) for days_ago, _ in grants})
+
+    def test_weekend_double_xp_is_recorded_as_granted(self):
+        level = self.grant(0, 10)
+        doubled = self.today.weekday() in (5, 6)
+        self.assertEqual(list(XPLedger.objects.values_list('amount', flat=True)), [20 if doubled else 10])
+        self.assertEqual(level.xp, 20 if doubled else 10)
+
+    def test_chart_reads_the_ledger(self):
+        self.grant(1, 30)
+        self.grant(1, 5)
+        self.grant(0, 7)
+        self.client.force_login(self.user)
+        chart = self.client.get(reverse('user_analytics_data'), {'days': 3}).json()['xp_over_time']
+        self.assertEqual([point['date'] for point in chart], [(self.today - timedelta(days=i)).isoformat() for i in (2, 1, 0)])
+        self.assertEqual([point['xp'] for point in chart], [
+            0,
+            sum(XPLedger.objects.filter(created_at__lt=local_day_bounds(self.today)[0]).values_list('amount', flat=True)),
+            sum(XPLedger.objects.filter(created_at__gte=local_day_bounds(self.today)[0]).values_list('amount', flat=True)),
+        ])
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class AsyncApiAuthenticationTests(LicenseFixtureMixin, TestCase):
+    """Session calls to the async API need a CSRF token, token calls do not"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client(enforce_csrf_checks=True)
+        self.url = reverse('api_async_license_validate')
+        self.payload = json.dumps({'key': 'active-key', 'ea_id': self.ea.pk})
+
+    def test_session_post_without_csrf_token_is_forbidden(self):
+        self.client.force_login(self.user)
+        response = self.client.post(self.url, self.payload, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertIn(b'CSRF', response.content)
+
+    def test_session_post_with_csrf_token_is_accepted(self):
+        self.client.force_login(self.user)
+        token = 'a' * 32
+        self.client.cookies['csrftoken'] = token
+        response = self.client.post(self.url, self.payload, content_type='application/json', headers={'x_csrftoken': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['valid'])
+
+    def test_token_post_needs_no_csrf_token(self):
+        token = Token.objects.create(user=self.user)
+        response = self.client.post(self.url, self.payload, content_type='application/json', headers={'authorization': f'Token {token.key}'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_anonymous_post_is_forbidden(self):
+        response = self.client.post(self.url, self.payload, content_type='application/json')
+        self.assertEqual(response.json(), {'detail': 'Authentication credentials were not provided.'})
@@ -0,0 +1,92 @@
+"""
+Token-bucket throttling for the client API.
+
+Bucket state is two numbers per client (tokens left and the last refill
+time) kept in the shared ``throttle`` cache, so every worker draws from
+the same bucket and memory stays constant no matter how busy a key is.
+Reads and writes are not atomic across workers; concurrent requests can
+overshoot the limit by a handful of calls, never by a multiple of it.
+
+The hourly budget comes from the best ``SubscriptionPlan.api_rate_limit``
+among the user's active subscriptions, falling back to the ``apikey``
+rate in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'].
+"""
+from django.core.cache import caches
+from django.db.models import Max
+from rest_framework.throttling import SimpleRateThrottle
+import hashlib
+import time
+
+from .models import Subscription
+
+PLAN_RATE_CACHE_TIMEOUT = 5 * 60
+NO_PLAN_RATE = 0
+
+
+def _plan_rate_key(user_id: int) -> str:
+    return f'throttle_plan_rate:{user_id}'
+
+
+def plan_rate_limit(user_id: int):
+    """Hourly request budget of the user's best active plan, or None"""
+    cache = caches['throttle']
+    limit = cache.get(_plan_rate_key(user_id))
+    if limit is None:
+        limit = Subscription.objects.filter(user_id=user_id, is_active=True).aggregate(
+            limit=Max('plan__api_rate_limit')
+        )['limit'] or NO_PLAN_RATE
+        cache.set(_plan_rate_key(user_id), limit, PLAN_RATE_CACHE_TIMEOUT)
+    return limit or None
+
+
+def invalidate_plan_rate(user_id: int) -> None:
+    caches['throttle'].delete(_plan_rate_key(user_id))
+
+
+class ApiKeyRateThrottle(SimpleRateThrottle):
+    scope = 'apikey'
+
+    @property
+    def cache(self):
+        return caches['throttle']
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            api_key = request.headers.get('X-API-KEY') or request.GET.get('api_key')
+            if api_key:
+                ident = 'key:' + hashlib.sha256(api_key.encode()).hexdigest()
+            else:
+                ident = 'ip:' + self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def get_bucket(self, request):
+        """Return ``(capacity, refill rate per second)`` for the request"""
+        capacity, duration = self.num_requests, self.duration
+        if request.user and request.user.is_authenticated:
+            plan_limit = plan_rate_limit(request.user.pk)
+            if plan_limit:
+                capacity, duration = plan_limit, 60 * 60
+        return capacity, capacity / duration
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        capacity, refill_rate = self.get_bucket(request)
+        now = time.time()
+        tokens, updated = self.cache.get(self.key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_rate)
+        self.tokens, self.refill_rate = tokens, refill_rate
+        if tokens < 1:
+            return False
+        self.tokens = tokens - 1
+        # A bucket left alone until it is full again carries no state worth keeping
+        self.cache.set(self.key, (self.tokens, now), int(capacity / refill_rate) + 1)
+        return True
+
+    def wait(self):
+        return (1 - self.tokens) / self.refill_rate if self.refill_rate else None
@@ -1,11 +1,18 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, FloatField, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, TruncDate
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 from django.utils import timezone
-from typing import Dict, List, Union, Any, Optional, cast, TypedDict, Literal
+from django.core.cache import cache
+from django.dispatch import Signal
+from typing import Dict, Iterable, List, Union, Any, Optional, Tuple, cast, TypedDict, Literal
 from decimal import Decimal
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, time, timedelta
 import json
+import numpy as np
+
+from .shared_cache import invalidate_on_commit, shared_cache
 
 class TradingMetrics(models.Model):
     """Model to store metrics from trading activities"""
@@ -25,6 +32,8 @@ class TradingMetrics(models.Model):
     max_drawdown = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     avg_risk_reward = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     sharpe_ratio = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    sortino_ratio = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    expectancy = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     
     # Strategy metrics
     strategy = models.CharField(max_length=100, blank=True)
@@ -35,6 +44,10 @@ class TradingMetrics(models.Model):
         verbose_name = "Trading Metrics"
         verbose_name_plural = "Trading Metrics"
         ordering = ['-date']
+        constraints = [
+            # One row per user and day; also serves (user, date range) lookups
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_metrics_per_user_day'),
+        ]
         
     def __str__(self):
         return f"{self.user.username} - {self.date} - {self.net_profit}"
@@ -91,6 +104,17 @@ class TradeDetail(models.Model):
     
     class Meta:
         ordering = ['-open_time']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ticket_id'], name='unique_trade_ticket_per_user'),
+        ]
+        indexes = [
+            # Closed-trade aggregates by period; profit is carried in the index
+            # so sums and win/loss counts never touch the table
+            models.Index(fields=['user', 'status', 'close_time', 'profit'], name='trade_user_status_close_idx'),
+            # Trade history keyset pagination on (close_time, id)
+            models.Index(fields=['user', 'close_time', 'id'], name='trade_user_close_id_idx'),
+            models.Index(fields=['user', 'symbol', 'close_time'], name='trade_user_symbol_idx'),
+        ]
         
     def __str__(self):
         return f"{self.user.username} - {self.symbol} - {self.ticket_id}"
@@ -108,6 +132,92 @@ class TradeDetail(models.Model):
         return None
 
 
+class EquityCurveBucket(models.Model):
+    """Packed closed-trade balance points of one user for one (local) day"""
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='equity_buckets')
+    day = models.DateField()
+    
+    # float64 arrays: close time as epoch seconds, and balance after each trade
+    timestamps = models.BinaryField(default=b'')
+    balances = models.BinaryField(default=b'')
+    points = models.PositiveIntegerField(default=0)
+    
+    start_balance = models.FloatField(default=0)
+    end_balance = models.FloatField(default=0)
+    last_timestamp = models.FloatField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_equity_bucket_per_day'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.day} - {self.points} points"
+    
+    @property
+    def timestamp_array(self) -> np.ndarray:
+        return np.frombuffer(bytes(self.timestamps), dtype=np.float64)
+    
+    @property
+    def balance_array(self) -> np.ndarray:
+        return np.frombuffer(bytes(self.balances), dtype=np.float64)
+
+
+class SymbolDailyStats(models.Model):
+    """Per-user, per-symbol daily rollup of closed trades"""
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='symbol_daily_stats')
+    symbol = models.CharField(max_length=20)
+    date = models.DateField()
+    
+    trade_count = models.IntegerField(default=0)
+    win_count = models.IntegerField(default=0)
+    loss_count = models.IntegerField(default=0)
+    profit_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    win_profit_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    loss_profit_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    max_profit = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    min_profit = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    
+    class Meta:
+        verbose_name_plural = "Symbol daily stats"
+        ordering = ['-date', 'symbol']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'symbol', 'date'], name='unique_symbol_stats_per_day'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'date'], name='symbol_stats_user_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.symbol} - {self.date}"
+
+
+# Sent with ``user_ids`` once a change to those users' trades or derived
+# metrics is committed; core.signals drops their cached summaries.
+trading_data_changed = Signal()
+
+
+def notify_trading_data_changed(user_ids: Iterable[int]) -> None:
+    """Send ``trading_data_changed`` after the current transaction commits"""
+    user_ids = sorted(set(user_ids))
+    if user_ids:
+        transaction.on_commit(lambda: trading_data_changed.send(sender=TradingMetrics, user_ids=user_ids))
+
+
+def local_day_bounds(since: date, until: Optional[date] = None) -> Tuple[datetime, datetime]:
+    """
+    Aware ``[start, end)`` datetimes covering local days ``since``..``until``
+    
+    Filtering ``close_time`` on these bounds instead of ``close_time__date``
+    keeps the predicate a plain range the composite indexes can seek on.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(since, time.min), tz)
+    end = timezone.make_aware(datetime.combine((until or since) + timedelta(days=1), time.min), tz)
+    return start, end
+
+
 def aggregate_daily_metrics(user: User, date: Optional[date] = None) -> TradingMetrics:
     """
     Calculate aggregated metrics for a specific day
@@ -123,45 +233,554 @@ def aggregate_daily_metrics(user: User, date: Optional[date] = None) -> TradingM
         date = timezone.now().date()
     
     # Get all closed trades for the user on the specified date
+    day_start, day_end = local_day_bounds(date)
     trades = TradeDetail.objects.filter(
         user=user,
         status='CLOSED',
-        close_time__date=date
+        close_time__gte=day_start,
+        close_time__lt=day_end,
     )
     
-    # Initialize metrics
-    total_trades = trades.count()
-    winning_trades = trades.filter(profit__gt=0).count()
-    losing_trades = trades.filter(profit__lte=0).count()
+    # Counts and profit/loss sums in a single pass over the day's trades
+    totals = trades.aggregate(
+        total_trades=Count('id'),
+        winning_trades=Count('id', filter=Q(profit__gt=0)),
+        losing_trades=Count('id', filter=Q(profit__lte=0)),
+        total_profit=Sum('profit', filter=Q(profit__gt=0)),
+        total_loss=Sum('profit', filter=Q(profit__lte=0)),
+    )
+    total_trades = totals['total_trades']
+    winning_trades = totals['winning_trades']
+    losing_trades = totals['losing_trades']
     
-    total_profit = sum(t.profit for t in trades.filter(profit__gt=0))
-    total_loss = abs(sum(t.profit for t in trades.filter(profit__lte=0)))
+    total_profit = totals['total_profit'] or Decimal('0')
+    total_loss = abs(totals['total_loss'] or Decimal('0'))
     net_profit = total_profit - total_loss
     
     # Calculate profit factor
     profit_factor = total_profit / total_loss if total_loss > 0 else total_profit
     
-    # Get unique strategies
-    strategies = set(t.strategy for t in trades if t.strategy)
+    # Get unique strategies and pairs
+    combos = trades.order_by().values_list('symbol', 'strategy').distinct()
+    strategies = set(strategy for _, strategy in combos if strategy)
+    pairs = list(set(symbol for symbol, _ in combos))
     
-    # Get unique pairs
-    pairs = list(set(t.symbol for t in trades))
+    # Create or update metrics record. Concurrent creators collide on the
+    # (user, date) constraint and get_or_create falls back to the row that won.
+    metrics, created = TradingMetrics.objects.get_or_create(user=user, date=date)
+    metrics.total_trades = total_trades
+    metrics.winning_trades = winning_trades
+    metrics.losing_trades = losing_trades
+    metrics.total_profit = total_profit
+    metrics.total_loss = total_loss
+    metrics.net_profit = net_profit
+    metrics.profit_factor = profit_factor
+    metrics.strategy = ', '.join(strategies) if strategies else ''
+    metrics.traded_pairs = pairs
+    metrics.save()
+    notify_trading_data_changed([user.pk])
     
-    # Create or update metrics record
-    metrics, created = TradingMetrics.objects.update_or_create(
-        user=user,
-        date=date,
-        defaults={
-            'total_trades': total_trades,
-            'winning_trades': winning_trades,
-            'losing_trades': losing_trades,
-            'total_profit': total_profit,
-            'total_loss': total_loss,
-            'net_profit': net_profit,
-            'profit_factor': profit_factor,
-            'strategy': ', '.join(strategies) if strategies else '',
-            'traded_pairs': pairs,
+    return metrics
+
+
+
+def rebuild_daily_metrics(user_ids: List[int], since: date, until: date) -> int:
+    """
+    Recompute the daily TradingMetrics of many users over a date range at once
+    
+    Uses one grouped aggregate (and one distinct symbol/strategy query) for the
+    whole set of users instead of per-user, per-day ``aggregate_daily_metrics``
+    calls, then replaces the existing rows in the range.
+    
+    Args:
+        user_ids: Users to rebuild
+        since: First day (inclusive)
+        until: Last day (inclusive)
+    
+    Returns:
+        Number of TradingMetrics rows written
+    """
+    start, end = local_day_bounds(since, until)
+    trades = TradeDetail.objects.filter(
+        user_id__in=user_ids,
+        status='CLOSED',
+        close_time__gte=start,
+        close_time__lt=end,
+    ).annotate(day=TruncDate('close_time')).order_by()
+    
+    totals = trades.values('user_id', 'day').annotate(
+        total_trades=Count('id'),
+        winning_trades=Count('id', filter=Q(profit__gt=0)),
+        losing_trades=Count('id', filter=Q(profit__lte=0)),
+        total_profit=Sum('profit', filter=Q(profit__gt=0)),
+        total_loss=Sum('profit', filter=Q(profit__lte=0)),
+    )
+    
+    symbols: Dict[Tuple[int, date], set] = {}
+    strategies: Dict[Tuple[int, date], set] = {}
+    for user_id, day, symbol, strategy in trades.values_list('user_id', 'day', 'symbol', 'strategy').distinct():
+        symbols.setdefault((user_id, day), set()).add(symbol)
+        if strategy:
+            strategies.setdefault((user_id, day), set()).add(strategy)
+    
+    rows = []
+    for row in totals:
+        key = (row['user_id'], row['day'])
+        total_profit = row['total_profit'] or Decimal('0')
+        total_loss = abs(row['total_loss'] or Decimal('0'))
+        rows.append(TradingMetrics(
+            user_id=row['user_id'],
+            date=row['day'],
+            total_trades=row['total_trades'],
+            winning_trades=row['winning_trades'],
+            losing_trades=row['losing_trades'],
+            total_profit=total_profit,
+            total_loss=total_loss,
+            net_profit=total_profit - total_loss,
+            profit_factor=total_profit / total_loss if total_loss > 0 else total_profit,
+            strategy=', '.join(sorted(strategies.get(key, ()))),
+            traded_pairs=sorted(symbols.get(key, ())),
+        ))
+    
+    with transaction.atomic():
+        TradingMetrics.objects.filter(user_id__in=user_ids, date__range=(since, until)).delete()
+        TradingMetrics.objects.bulk_create(rows, batch_size=500)
+    notify_trading_data_changed(user_ids)
+    return len(rows)
+
+# Fields refreshed when an ingested trade collides with an existing (user, ticket_id)
+TRADE_UPSERT_FIELDS = [
+    'symbol', 'strategy', 'bot_name', 'trade_type', 'open_time', 'close_time',
+    'open_price', 'close_price', 'lot_size', 'stop_loss', 'take_profit', 'profit',
+    'status', 'timeframe', 'entry_reason', 'exit_reason',
+]
+
+
+def upsert_trades(user: User, rows: List[Dict[str, Any]], batch_size: int = 500) -> Dict[str, str]:
+    """
+    Insert or update a batch of validated trades for a user in one statement
+    
+    Rows are keyed by ``ticket_id``; when the same ticket appears more than once
+    in a batch the last occurrence wins. Derived data (daily TradingMetrics,
+    equity series) is adjusted incrementally in the same transaction.
+    
+    Args:
+        user: Owner of the trades
+        rows: Validated trade dicts (TradeDetail field names, without ``user``)
+        batch_size: Maximum rows per INSERT statement
+    
+    Returns:
+        Mapping of ticket_id to ``'created'`` or ``'updated'``
+    """
+    latest: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        latest[row['ticket_id']] = row
+    if not latest:
+        return {}
+    
+    objs = [TradeDetail(user=user, **row) for row in latest.values()]
+    with transaction.atomic():
+        previous = {
+            row['ticket_id']: row
+            for row in TradeDetail.objects.filter(user=user, ticket_id__in=list(latest))
+            .values(*TRADE_SNAPSHOT_FIELDS)
         }
+        TradeDetail.objects.bulk_create(
+            objs,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['user', 'ticket_id'],
+            update_fields=TRADE_UPSERT_FIELDS,
+        )
+        record_trade_changes(
+            user.pk,
+            removed=previous.values(),
+            added=[trade_snapshot(obj) for obj in objs],
+        )
+    existing = set(previous)
+    
+    return {
+        ticket_id: 'updated' if ticket_id in existing else 'created'
+        for ticket_id in latest
+    }
+
+
+# --- Incremental metrics maintenance ---
+# A trade contributes to the TradingMetrics row of the (local) day it closed on.
+# Each change is expressed as the snapshot it had before and after, and only
+# the difference is applied to the stored totals with F() expressions, so
+# concurrent writers never overwrite each other. ``aggregate_daily_metrics``
+# remains the authoritative full recompute used by the reconcile job.
+
+TRADE_SNAPSHOT_FIELDS = ['ticket_id', 'status', 'close_time', 'profit', 'symbol', 'strategy']
+
+
+def trade_snapshot(trade: Union[TradeDetail, Dict[str, Any]]) -> Dict[str, Any]:
+    """Extract the fields that drive daily metrics from a trade or row dict"""
+    if isinstance(trade, TradeDetail):
+        return {field: getattr(trade, field) for field in TRADE_SNAPSHOT_FIELDS}
+    return {field: trade.get(field) for field in TRADE_SNAPSHOT_FIELDS}
+
+
+def _metrics_contribution(snapshot: Dict[str, Any]) -> Optional[Tuple[date, Decimal]]:
+    if snapshot.get('status') != 'CLOSED' or not snapshot.get('close_time'):
+        return None
+    return timezone.localdate(snapshot['close_time']), Decimal(snapshot.get('profit') or 0)
+
+
+def apply_metrics_delta(user_id: int, removed: Iterable[Dict[str, Any]] = (), added: Iterable[Dict[str, Any]] = ()) -> None:
+    """
+    Adjust the daily TradingMetrics rows for trade snapshots leaving and entering them
+    
+    Args:
+        user_id: Owner of the trades
+        removed: Snapshots (see ``trade_snapshot``) of the previous trade state
+        added: Snapshots of the new trade state
+    """
+    deltas: Dict[date, Dict[str, Any]] = {}
+    
+    def accumulate(snapshot: Dict[str, Any], sign: int) -> None:
+        contribution = _metrics_contribution(snapshot)
+        if contribution is None:
+            return
+        day, profit = contribution
+        delta = deltas.setdefault(day, {
+            'trades': 0, 'wins': 0, 'losses': 0,
+            'profit': Decimal('0'), 'loss': Decimal('0'),
+            'symbols': set(), 'strategies': set(),
+        })
+        delta['trades'] += sign
+        if profit > 0:
+            delta['wins'] += sign
+            delta['profit'] += sign * profit
+        else:
+            delta['losses'] += sign
+            delta['loss'] += sign * abs(profit)
+        if sign > 0:
+            delta['symbols'].add(snapshot['symbol'])
+            if snapshot.get('strategy'):
+                delta['strategies'].add(snapshot['strategy'])
+    
+    for snapshot in removed:
+        accumulate(snapshot, -1)
+    for snapshot in added:
+        accumulate(snapshot, 1)
+    
+    with transaction.atomic():
+        rows = {
+            m.date: m
+            for m in TradingMetrics.objects.filter(user_id=user_id, date__in=list(deltas))
+        }
+        for day, delta in deltas.items():
+            metrics = rows.get(day)
+            if metrics is None:
+                metrics, _ = TradingMetrics.objects.get_or_create(user_id=user_id, date=day)
+            
+            if delta['trades'] or delta['wins'] or delta['losses'] or delta['profit'] or delta['loss']:
+                new_profit = F('total_profit') + delta['profit']
+                new_loss = F('total_loss') + delta['loss']
+                TradingMetrics.objects.filter(pk=metrics.pk).update(
+                    total_trades=F('total_trades') + delta['trades'],
+                    winning_trades=F('winning_trades') + delta['wins'],
+                    losing_trades=F('losing_trades') + delta['losses'],
+                    total_profit=new_profit,
+                    total_loss=new_loss,
+                    net_profit=F('net_profit') + (delta['profit'] - delta['loss']),
+                    # Right-hand sides see the pre-update column values
+                    # Cast so SQLite does not truncate with integer division
+                    profit_factor=Case(
+                        When(Q(total_loss__gt=-delta['loss']), then=ExpressionWrapper(
+                            Cast(new_profit, FloatField()) / new_loss, output_field=FloatField(),
+                        )),
+                        default=Cast(new_profit, FloatField()),
+                        output_field=FloatField(),
+                    ),
+                )
+            
+            # Symbols/strategies only ever grow here; the reconcile job prunes them
+            strategies = set(s for s in metrics.strategy.split(', ') if s)
+            if not (delta['symbols'] <= set(metrics.traded_pairs) and delta['strategies'] <= strategies):
+                metrics = TradingMetrics.objects.select_for_update().get(pk=metrics.pk)
+                strategies = set(s for s in metrics.strategy.split(', ') if s) | delta['strategies']
+                metrics.traded_pairs = sorted(set(metrics.traded_pairs) | delta['symbols'])
+                metrics.strategy = ', '.join(sorted(strategies))
+                metrics.save(update_fields=['traded_pairs', 'strategy'])
+
+
+def record_trade_changes(user_id: int, removed: Iterable[Dict[str, Any]] = (), added: Iterable[Dict[str, Any]] = ()) -> None:
+    """
+    Propagate trade changes to all derived per-user data
+    
+    Args:
+        user_id: Owner of the trades
+        removed: Snapshots of the previous state of changed/deleted trades
+        added: Snapshots of the new state of created/changed trades
+    """
+    removed, added = list(removed), list(added)
+    apply_metrics_delta(user_id, removed, added)
+    apply_symbol_stats_delta(user_id, removed, added)
+    update_equity_series(user_id, removed, added)
+    invalidate_trade_facets(user_id, removed, added)
+    notify_trading_data_changed([user_id])
+
+
+# --- Symbol daily rollups ---
+# New closes are folded into SymbolDailyStats with F() updates (Greatest/Least
+# for the extremes). Because a min/max cannot be "un-applied", any (symbol, day)
+# that loses or changes a closed trade is recomputed from TradeDetail instead.
+
+def apply_symbol_stats_delta(user_id: int, removed: Iterable[Dict[str, Any]] = (), added: Iterable[Dict[str, Any]] = ()) -> None:
+    """Update SymbolDailyStats for trade snapshots leaving and entering them"""
+    before = {s['ticket_id']: s for s in removed}
+    additions: Dict[Tuple[str, date], List[Decimal]] = {}
+    recompute = set()
+    for snapshot in added:
+        old = before.pop(snapshot['ticket_id'], None)
+        old_key, new_key = _symbol_key(old), _symbol_key(snapshot)
+        if old_key and old_key == new_key and Decimal(old['profit'] or 0) == Decimal(snapshot['profit'] or 0):
+            continue
+        if old_key:
+            recompute.add(old_key)
+        if new_key:
+            additions.setdefault(new_key, []).append(Decimal(snapshot['profit'] or 0))
+    for old in before.values():
+        if _symbol_key(old):
+            recompute.add(_symbol_key(old))
+    
+    with transaction.atomic():
+        for key, profits in additions.items():
+            if key in recompute:
+                continue
+            symbol, day = key
+            stats, _ = SymbolDailyStats.objects.get_or_create(user_id=user_id, symbol=symbol, date=day)
+            wins = [p for p in profits if p > 0]
+            losses = [p for p in profits if p <= 0]
+            highest = Value(max(profits), output_field=DecimalField())
+            lowest = Value(min(profits), output_field=DecimalField())
+            SymbolDailyStats.objects.filter(pk=stats.pk).update(
+                trade_count=F('trade_count') + len(profits),
+                win_count=F('win_count') + len(wins),
+                loss_count=F('loss_count') + len(losses),
+                profit_sum=F('profit_sum') + sum(profits),
+                win_profit_sum=F('win_profit_sum') + sum(wins),
+                loss_profit_sum=F('loss_profit_sum') + sum(losses),
+                max_profit=Greatest(Coalesce('max_profit', highest), highest),
+                min_profit=Least(Coalesce('min_profit', lowest), lowest),
+            )
+        for symbol, day in recompute:
+            rebuild_symbol_daily_stats([user_id], day, day, symbol=symbol)
+
+
+def _symbol_key(snapshot: Optional[Dict[str, Any]]) -> Optional[Tuple[str, date]]:
+    contribution = _metrics_contribution(snapshot) if snapshot else None
+    if contribution is None:
+        return None
+    return snapshot['symbol'], contribution[0]
+
+
+def rebuild_symbol_daily_stats(user_ids: List[int], since: date, until: date, symbol: Optional[str] = None) -> int:
+    """
+    Recompute SymbolDailyStats of the given users over a date range from raw trades
+    
+    Returns:
+        Number of rollup rows written
+    """
+    start, end = local_day_bounds(since, until)
+    trades = TradeDetail.objects.filter(
+        user_id__in=user_ids,
+        status='CLOSED',
+        close_time__gte=start,
+        close_time__lt=end,
     )
+    stats = SymbolDailyStats.objects.filter(user_id__in=user_ids, date__range=(since, until))
+    if symbol is not None:
+        trades = trades.filter(symbol=symbol)
+        stats = stats.filter(symbol=symbol)
     
-    return metrics
+    rows = [
+        SymbolDailyStats(
+            user_id=row['user_id'],
+            symbol=row['symbol'],
+            date=row['day'],
+            trade_count=row['trade_count'],
+            win_count=row['win_count'],
+            loss_count=row['loss_count'],
+            profit_sum=row['profit_sum'],
+            win_profit_sum=row['win_profit_sum'] or Decimal('0'),
+            loss_profit_sum=row['loss_profit_sum'] or Decimal('0'),
+            max_profit=row['max_profit'],
+            min_profit=row['min_profit'],
+        )
+        for row in trades.annotate(day=TruncDate('close_time')).order_by()
+        .values('user_id', 'symbol', 'day').annotate(
+            trade_count=Count('id'),
+            win_count=Count('id', filter=Q(profit__gt=0)),
+            loss_count=Count('id', filter=Q(profit__lte=0)),
+            profit_sum=Sum('profit'),
+            win_profit_sum=Sum('profit', filter=Q(profit__gt=0)),
+            loss_profit_sum=Sum('profit', filter=Q(profit__lte=0)),
+            max_profit=Max('profit'),
+            min_profit=Min('profit'),
+        )
+    ]
+    with transaction.atomic():
+        stats.delete()
+        SymbolDailyStats.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+# --- Equity curve series ---
+# The closed-trade balance curve is stored pre-computed in per-day buckets so
+# chart endpoints never have to scan TradeDetail. New closes are appended to
+# the latest bucket; anything that rewrites history (late or edited trades,
+# deletions) rebuilds the buckets from the earliest affected day onwards.
+
+EQUITY_SERIES_BUILT_TIMEOUT = 24 * 60 * 60
+
+def _closed_point(snapshot: Dict[str, Any]) -> Optional[Tuple[datetime, float]]:
+    if snapshot.get('status') != 'CLOSED' or not snapshot.get('close_time'):
+        return None
+    return snapshot['close_time'], float(snapshot.get('profit') or 0)
+
+
+def update_equity_series(user_id: int, removed: Iterable[Dict[str, Any]] = (), added: Iterable[Dict[str, Any]] = ()) -> None:
+    """Append new closed trades to the equity series, or rebuild it where history changed"""
+    before = {s['ticket_id']: _closed_point(s) for s in removed}
+    new_points = []
+    rebuild_from = None
+    for snapshot in added:
+        point = _closed_point(snapshot)
+        old = before.pop(snapshot['ticket_id'], None)
+        if old == point:
+            continue
+        if old is not None:
+            rebuild_from = min(filter(None, [rebuild_from, old[0], point and point[0]]))
+        elif point is not None:
+            new_points.append(point)
+    for old in before.values():
+        if old is not None:
+            rebuild_from = min(filter(None, [rebuild_from, old[0]]))
+    
+    if not new_points and rebuild_from is None:
+        return
+    
+    with transaction.atomic():
+        last = EquityCurveBucket.objects.select_for_update().filter(user_id=user_id).order_by('-day').first()
+        earliest_new = min(p[0] for p in new_points) if new_points else None
+        if earliest_new and last and last.last_timestamp is not None and earliest_new.timestamp() < last.last_timestamp:
+            rebuild_from = min(filter(None, [rebuild_from, earliest_new]))
+        if rebuild_from is not None:
+            rebuild_equity_series(user_id, since=timezone.localdate(rebuild_from))
+            return
+        
+        new_points.sort()
+        timestamps = np.array([p[0].timestamp() for p in new_points], dtype=np.float64)
+        opening = last.end_balance if last else 0.0
+        balances = opening + np.cumsum([p[1] for p in new_points])
+        days = [timezone.localdate(p[0]) for p in new_points]
+        _write_buckets(user_id, days, timestamps, balances, opening, extend=last)
+
+
+def rebuild_equity_series(user_id: int, since: Optional[date] = None) -> None:
+    """Recompute the equity buckets of a user from ``since`` (or the beginning)"""
+    with transaction.atomic():
+        buckets = EquityCurveBucket.objects.filter(user_id=user_id)
+        trades = TradeDetail.objects.filter(user_id=user_id, status='CLOSED', close_time__isnull=False)
+        opening = 0.0
+        if since is not None:
+            previous = buckets.filter(day__lt=since).order_by('-day').first()
+            opening = previous.end_balance if previous else 0.0
+            buckets = buckets.filter(day__gte=since)
+            trades = trades.filter(close_time__gte=local_day_bounds(since)[0])
+        buckets.delete()
+        
+        rows = list(trades.order_by('close_time', 'id').values_list('close_time', 'profit'))
+        if not rows:
+            return
+        timestamps = np.array([r[0].timestamp() for r in rows], dtype=np.float64)
+        balances = opening + np.cumsum([float(r[1]) for r in rows])
+        days = [timezone.localdate(r[0]) for r in rows]
+        _write_buckets(user_id, days, timestamps, balances, opening)
+
+
+def equity_series_built_key(user_id: int) -> str:
+    return f"equity_series_built:{user_id}"
+
+
+def ensure_equity_series(user_id: int) -> None:
+    """
+    Build the series once for users whose trades predate the buckets
+    
+    Remembered in the cache, so users without closed trades (who never get
+    any buckets) do not trigger a rebuild on every chart request.
+    """
+    if cache.get(equity_series_built_key(user_id)):
+        return
+    if not EquityCurveBucket.objects.filter(user_id=user_id).exists():
+        rebuild_equity_series(user_id)
+    cache.set(equity_series_built_key(user_id), True, EQUITY_SERIES_BUILT_TIMEOUT)
+
+
+def _write_buckets(user_id: int, days: List[date], timestamps: np.ndarray, balances: np.ndarray, opening: float, extend: Optional[EquityCurveBucket] = None) -> None:
+    """Pack time-ordered points into per-day buckets, extending ``extend`` when it covers the first day"""
+    edges = [0] + [i for i in range(1, len(days)) if days[i] != days[i - 1]] + [len(days)]
+    created = []
+    for start, end in zip(edges, edges[1:]):
+        ts, bal = timestamps[start:end], balances[start:end]
+        if extend is not None and extend.day == days[start]:
+            extend.timestamps = bytes(extend.timestamps) + ts.tobytes()
+            extend.balances = bytes(extend.balances) + bal.tobytes()
+            extend.points += len(ts)
+            extend.end_balance = float(bal[-1])
+            extend.last_timestamp = float(ts[-1])
+            extend.save(update_fields=['timestamps', 'balances', 'points', 'end_balance', 'last_timestamp'])
+            continue
+        created.append(EquityCurveBucket(
+            user_id=user_id,
+            day=days[start],
+            timestamps=ts.tobytes(),
+            balances=bal.tobytes(),
+            points=len(ts),
+            start_balance=float(balances[start - 1]) if start else opening,
+            end_balance=float(bal[-1]),
+            last_timestamp=float(ts[-1]),
+        ))
+    EquityCurveBucket.objects.bulk_create(created)
+
+
+# --- Trade filter facets ---
+# Distinct symbols/strategies per user for the trade history filters. Kept in
+# the shared cache and dropped, after the ingest commits, whenever a trade
+# change can add or remove one of them.
+
+TRADE_FACETS_TIMEOUT = 60 * 60
+
+
+def _trade_facets_key(user_id: int) -> str:
+    return f"trade_facets:{user_id}"
+
+
+def get_trade_facets(user_id: int) -> Dict[str, List[str]]:
+    """Return ``{'symbols': [...], 'strategies': [...]}`` for a user's trades"""
+    cache = shared_cache()
+    facets = cache.get(_trade_facets_key(user_id))
+    if facets is None:
+        combos = TradeDetail.objects.filter(user_id=user_id).order_by().values_list('symbol', 'strategy').distinct()
+        facets = {
+            'symbols': sorted(set(symbol for symbol, _ in combos)),
+            'strategies': sorted(set(strategy for _, strategy in combos if strategy)),
+        }
+        cache.set(_trade_facets_key(user_id), facets, TRADE_FACETS_TIMEOUT)
+    return facets
+
+
+def invalidate_trade_facets(user_id: int, removed: Iterable[Dict[str, Any]] = (), added: Iterable[Dict[str, Any]] = ()) -> None:
+    """Drop the cached facets of a user if the trade changes can alter them"""
+    facets = shared_cache().get(_trade_facets_key(user_id))
+    kept = set((s['symbol'], s['strategy']) for s in added)
+    changed = facets is None or any((s['symbol'], s['strategy']) not in kept for s in removed) or any(
+        s['symbol'] not in facets['symbols'] or (s['strategy'] and s['strategy'] not in facets['strategies'])
+        for s in added
+    )
+    if changed:
+        invalidate_on_commit(_trade_facets_key(user_id))
@@ -0,0 +1,81 @@
+"""
+Cached per-user trading summary shared by the trading dashboard and the
+analytics JSON endpoints.
+
+All headline numbers come from one aggregate over the user's daily
+TradingMetrics rows, plus one grouped query over the SymbolDailyStats
+rollups for the top symbols. The result
+is cached per user and window in the cache shared by all workers; any
+change to the user's trades or metrics bumps a per-user version once the
+change is committed (see ``trading_data_changed``), so stale summaries
+are never served.
+"""
+from django.db.models import Max, Sum
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable
+import uuid
+
+from .shared_cache import shared_cache
+from .trading_analytics import TradingMetrics, SymbolDailyStats
+
+SUMMARY_CACHE_TIMEOUT = 5 * 60
+TOP_SYMBOL_COUNT = 5
+
+
+def _version_key(user_id: int) -> str:
+    return f"trading_summary_version:{user_id}"
+
+
+def invalidate_trading_summary(user_ids: Iterable[int]) -> None:
+    """Discard cached summaries of the given users"""
+    shared_cache().set_many({_version_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
+
+
+def get_trading_summary(user_id: int, days: int = 30) -> Dict[str, Any]:
+    """
+    Return the trading summary of a user over the last ``days`` days
+    
+    Returns:
+        Dict with ``total_profit``, ``total_trades``, ``winning_trades``,
+        ``win_rate`` (percent), ``max_drawdown`` (worst daily drawdown) and
+        ``top_symbols`` (list of ``symbol``/``total_profit``/``trade_count``)
+    """
+    cache = shared_cache()
+    version = cache.get(_version_key(user_id), '')
+    key = f"trading_summary:{user_id}:{days}:{version}"
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+    
+    since = timezone.localdate() - timedelta(days=days)
+    totals = TradingMetrics.objects.filter(user_id=user_id, date__gte=since).aggregate(
+        total_profit=Sum('net_profit'),
+        total_trades=Sum('total_trades'),
+        winning_trades=Sum('winning_trades'),
+        max_drawdown=Max('max_drawdown'),
+    )
+    total_trades = totals['total_trades'] or 0
+    winning_trades = totals['winning_trades'] or 0
+    
+    top_symbols = list(
+        SymbolDailyStats.objects.filter(
+            user_id=user_id,
+            date__gte=since,
+        ).values('symbol').annotate(
+            total_profit=Sum('profit_sum'),
+            trade_count=Sum('trade_count'),
+        ).filter(trade_count__gt=0).order_by('-total_profit')[:TOP_SYMBOL_COUNT]
+    )
+    
+    summary = {
+        'total_profit': totals['total_profit'] or Decimal('0'),
+        'total_trades': total_trades,
+        'winning_trades': winning_trades,
+        'win_rate': round((winning_trades / total_trades) * 100, 2) if total_trades > 0 else 0,
+        'max_drawdown': totals['max_drawdown'] or Decimal('0'),
+        'top_symbols': top_symbols,
+    }
+    cache.set(key, summary, SUMMARY_CACHE_TIMEOUT)
+    return summary
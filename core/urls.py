@@ -3,6 +3,7 @@ from . import views
 from django.contrib.auth import views as auth_views
 from django.views.generic import TemplateView
 from core import api_views
+from core import api_views_async
 from core import analytics_views
 from core.views_audit import audit_history, download_audit_log
 from core.admin_analytics import analytics_dashboard
@@ -12,7 +13,8 @@ from core.admin_dashboard_extra import admin_dashboard_extra
 from . import views_share
 from .views import bots_portal, download_bot, SecureLogoutView
 from core.views_notifications import notifications_list
-from core.views_analytics import trading_dashboard, trading_metrics_json, trade_details, symbol_performance
+from core.license_events import license_event_stream
+from core.views_analytics import trading_dashboard, trading_metrics_json, equity_curve_json, trade_details, trade_details_json, symbol_performance
 from core.views_learning import learning_center, category_detail, resource_detail, update_progress, my_learning, download_resource
 
 urlpatterns = [
@@ -78,19 +80,34 @@ urlpatterns = [
 urlpatterns += [
     path('trading/dashboard/', trading_dashboard, name='trading_dashboard'),
     path('trading/metrics/json/', trading_metrics_json, name='trading_metrics_json'),
+    path('trading/equity/json/', equity_curve_json, name='equity_curve_json'),
     path('trading/trades/', trade_details, name='trade_details'),
+    path('trading/trades/json/', trade_details_json, name='trade_details_json'),
     path('trading/symbols/', symbol_performance, name='symbol_performance'),
 ]
 
 # API URLs
 urlpatterns += [
     path('api/license/validate/', api_views.LicenseValidateView.as_view(), name='api_license_validate'),
+    path('api/license/validate/batch/', api_views.LicenseBatchValidateView.as_view(), name='api_license_validate_batch'),
     path('api/license/activate/', api_views.LicenseActivateView.as_view(), name='api_license_activate'),
     path('api/license/deactivate/', api_views.LicenseDeactivateView.as_view(), name='api_license_deactivate'),
+    path('api/license/token/', api_views.LicenseTokenView.as_view(), name='api_license_token'),
+    path('api/license/revocations/', api_views.LicenseRevocationListView.as_view(), name='api_license_revocations'),
+    path('api/license/events/', license_event_stream, name='api_license_events'),
     path('api/ea/config/', api_views.EAConfigView.as_view(), name='api_ea_config'),
     path('api/licenses/', api_views.LicenseListView.as_view(), name='api_license_list'),
     path('api/subscriptions/', api_views.SubscriptionStatusView.as_view(), name='api_subscription_status'),
     path('api/payments/', api_views.PaymentHistoryView.as_view(), name='api_payment_history'),
+    path('api/trades/bulk/', api_views.TradeBulkIngestView.as_view(), name='api_trade_bulk_ingest'),
+]
+
+# Async (ASGI) variants of the license API
+urlpatterns += [
+    path('api/async/license/validate/', api_views_async.license_validate, name='api_async_license_validate'),
+    path('api/async/license/activate/', api_views_async.license_activate, name='api_async_license_activate'),
+    path('api/async/license/deactivate/', api_views_async.license_deactivate, name='api_async_license_deactivate'),
+    path('api/async/ea/config/', api_views_async.ea_config, name='api_async_ea_config'),
 ]
 
 # Learning Center URLs
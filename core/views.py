@@ -2,9 +2,12 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import SubscriptionPlan, Payment, Subscription, Referral, ReferralReward, Ticket, ReferralConfig, Notification, UserProfile, Badge, UserBadge, AnalyticsEvent, UserLevel, SocialShareEvent, SupportTicket, ForumCategory, ForumTopic, ForumPost, ExpertAdvisor, EAFile, LicenseKey, AuditLog, ShareReward
+from .models import SubscriptionPlan, Payment, Subscription, Referral, ReferralReward, Ticket, ReferralConfig, Notification, UserProfile, Badge, UserBadge, AnalyticsEvent, UserLevel, SocialShareEvent, SupportTicket, ForumCategory, ForumTopic, ForumPost, ExpertAdvisor, EAFile, LicenseKey, AuditLog, ShareReward, XPLedger
 from django.http import Http404, JsonResponse
+from .archive import archived_counts
 from .forms import ManualPaymentForm
+from .events import record_event
+from .gamification import award_badges, evaluate as evaluate_badges, user_badges
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from .coinbase import create_charge
@@ -52,9 +55,8 @@ def dashboard(request):
     profile = get_or_create_userprofile(request.user)
     show_onboarding = not profile.onboarding_complete
     # Award "First Login" badge
-    award_badge(request.user, "First Login")
+    evaluate_badges(request.user, "dashboard_view")
     track_event(request.user, "dashboard_view")
-    AnalyticsEvent.objects.create(user=request.user, event_type="dashboard_view")
     ul = add_xp(request.user, 5, reason="dashboard_view")
     subscriptions = Subscription.objects.filter(user=request.user, is_active=True)
     plans = [sub.plan for sub in subscriptions]
@@ -69,7 +71,7 @@ def dashboard(request):
     eas = ExpertAdvisor.objects.all()  # Or filter by another method as appropriate
     licenses = LicenseKey.objects.filter(user=request.user)
     ea_files = EAFile.objects.filter(ea__in=eas)
-    badges = UserBadge.objects.filter(user=request.user).select_related('badge')
+    badges = user_badges(request.user)
     return render(request, 'dashboard.html', {
         'subscriptions': subscriptions,
         'payments': payments,
@@ -212,13 +214,12 @@ def notify(user, message, type='info'):
     Notification.objects.create(user=user, message=message, type=type)
 
 def award_badge(user, badge_name):
-    badge = Badge.objects.filter(name=badge_name).first()
-    if badge and not UserBadge.objects.filter(user=user, badge=badge).exists():
-        UserBadge.objects.create(user=user, badge=badge)
-        AnalyticsEvent.objects.create(user=user, event_type="badge_awarded", event_value=badge_name)
+    # Cached catalog and per-request awarded set (core.gamification)
+    award_badges(user, [badge_name])
 
 def track_event(user, event_type, event_value=""):
-    AnalyticsEvent.objects.create(user=user, event_type=event_type, event_value=event_value)
+    # Buffered and written in batches (core.events)
+    record_event(user, event_type, event_value)
 
 def check_and_grant_referral_reward(referrer):
     config = ReferralConfig.objects.filter(active=True).order_by('-reward_threshold').first()
@@ -247,24 +248,16 @@ def check_and_grant_referral_reward(referrer):
         else:
             notify(referrer, f"You earned a referral reward!", type='success')
         # Award referral badges
-        if referred_count == 1:
-            award_badge(referrer, "First Referral")
-        if referred_count >= 5:
-            award_badge(referrer, "5 Referrals")
-        if referred_count >= 10:
-            award_badge(referrer, "Referral Champion")
+        evaluate_badges(referrer, "referral", referred_count=referred_count)
         add_xp(referrer, 20, reason="referral")
-        AnalyticsEvent.objects.create(user=referrer, event_type="referral_reward", event_value=f"{referred_count}")
+        track_event(referrer, "referral_reward", f"{referred_count}")
         return reward
 
 def confirm_payment_badges(user):
     paid_count = Payment.objects.filter(user=user, status='confirmed').count()
-    if paid_count == 1:
-        award_badge(user, "First Payment")
-    if paid_count >= 5:
-        award_badge(user, "5 Payments")
+    evaluate_badges(user, "payment", paid_count=paid_count)
     add_xp(user, 15, reason="payment")
-    AnalyticsEvent.objects.create(user=user, event_type="payment_confirmed", event_value=str(paid_count))
+    track_event(user, "payment_confirmed", str(paid_count))
 
 @login_required
 def notifications(request):
@@ -316,6 +309,7 @@ def add_xp(user, amount=10, reason=None):
         double_xp = True
     if double_xp:
         amount *= 2
+    XPLedger.objects.create(user=user, amount=amount, reason=reason or '', created_at=now)
     ul.xp += amount
     # Streak logic: +1 if last_activity was yesterday, else reset
     if ul.last_activity:
@@ -328,13 +322,16 @@ def add_xp(user, amount=10, reason=None):
         ul.streak = 1
     ul.last_activity = now
     # Level up
+    levels = []
     while ul.xp >= ul.xp_for_next_level():
         ul.xp -= ul.xp_for_next_level()
         ul.level += 1
-        award_badge(user, f"Level {ul.level}")
+        levels.append(ul.level)
     ul.save()
+    if levels:
+        evaluate_badges(user, "level_up", levels=levels)
     if reason:
-        AnalyticsEvent.objects.create(user=user, event_type="xp_gain", event_value=f"{amount}:{reason}")
+        track_event(user, "xp_gain", f"{amount}:{reason}")
     return ul
 
 # --- Admin analytics summary view ---
@@ -358,14 +355,16 @@ def admin_analytics_summary(request):
 
 @staff_member_required
 def admin_bot_analytics(request):
-    # Aggregate download counts for each .ex5 file
-    bot_stats = (
+    # Aggregate download counts for each .ex5 file, including archived months
+    counts = archived_counts('audit_logs', 'ea_downloads')
+    hot = (
         AuditLog.objects.filter(action='ea_download', object_type='EAFile')
         .values('object_id')
         .annotate(count=Count('id'))
-        .order_by('-count')
     )
-    bot_stats = [{'name': b['object_id'], 'count': b['count']} for b in bot_stats]
+    for b in hot:
+        counts[b['object_id']] += b['count']
+    bot_stats = [{'name': name, 'count': count} for name, count in counts.most_common()]
     return render(request, 'admin_bot_analytics.html', {'bot_stats': bot_stats})
 
 @login_required
@@ -403,8 +402,8 @@ def api_social_share(request):
         if not shared_today:
             SocialShareEvent.objects.create(user=request.user)
             add_xp(request.user, 10, reason="social_share")
-            award_badge(request.user, "Social Sharer")
-            AnalyticsEvent.objects.create(user=request.user, event_type="social_share")
+            evaluate_badges(request.user, "social_share")
+            track_event(request.user, "social_share")
         return JsonResponse({'status':'ok'})
     return JsonResponse({'status':'error'}, status=405)
 
@@ -514,9 +513,7 @@ def request_license(request, ea_id):
 def revoke_license(request, license_id):
     from .models import LicenseKey
     lic = LicenseKey.objects.get(id=license_id, user=request.user)
-    lic.status = 'revoked'
-    lic.deactivated_at = timezone.now()
-    lic.save()
+    lic.revoke()
     AuditLog.objects.create(user=request.user, action='license_revoke', object_type='LicenseKey', object_id=str(lic.id), extra_data={'ea': lic.ea.name})
     return redirect('dashboard')
 
@@ -1,13 +1,18 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpRequest, HttpResponse
-from django.db.models import Sum, Avg, Max, Min, Count, F, Q, ExpressionWrapper, DecimalField, QuerySet
+from django.db.models import Sum, Avg, Max, Min, Count, F, Q, ExpressionWrapper, DecimalField, FloatField, QuerySet
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.utils import timezone
-from datetime import timedelta, date
+from datetime import timedelta, date, datetime
 from typing import Dict, List, Union, Any, Optional, Tuple, cast
 from django.contrib.auth.models import User
-from .models import AnalyticsEvent
-from .trading_analytics import TradingMetrics, TradeDetail
+from .events import record_event
+from .trading_summary import get_trading_summary
+from .trading_analytics import TradingMetrics, TradeDetail, SymbolDailyStats, EquityCurveBucket, ensure_equity_series, get_trade_facets, local_day_bounds
+import numpy as np
+import base64
+import json
 
 
 @login_required
@@ -25,42 +30,23 @@ def trading_dashboard(request: HttpRequest) -> HttpResponse:
         date__gte=last_30_days
     ).order_by('-date')
     
-    # Calculate summary statistics
-    total_profit = metrics.aggregate(sum=Sum('net_profit'))['sum'] or 0
-    win_rate = 0
-    total_trades = metrics.aggregate(sum=Sum('total_trades'))['sum'] or 0
-    winning_trades = metrics.aggregate(sum=Sum('winning_trades'))['sum'] or 0
-    
-    if total_trades > 0:
-        win_rate = (winning_trades / total_trades) * 100
+    # Summary statistics and top symbols (cached, invalidated on trade ingest)
+    summary = get_trading_summary(user.pk, days=30)
     
     # Get latest trades for trade history table
     recent_trades = TradeDetail.objects.filter(
         user=user
     ).order_by('-close_time')[:10]
     
-    # Get top performing symbols
-    top_symbols = TradeDetail.objects.filter(
-        user=user,
-        status='CLOSED',
-        close_time__gte=last_30_days
-    ).values('symbol').annotate(
-        total_profit=Sum('profit'),
-        trade_count=Count('id')
-    ).order_by('-total_profit')[:5]
-    
     # Record analytics event for page view
-    AnalyticsEvent.objects.create(
-        user=user,
-        event_type='view_trading_dashboard'
-    )
+    record_event(user, 'view_trading_dashboard')
     
     context = {
-        'total_profit': total_profit,
-        'win_rate': round(win_rate, 2),
-        'total_trades': total_trades,
+        'total_profit': summary['total_profit'],
+        'win_rate': summary['win_rate'],
+        'total_trades': summary['total_trades'],
         'recent_trades': recent_trades,
-        'top_symbols': top_symbols,
+        'top_symbols': summary['top_symbols'],
         'metrics': metrics[:30],  # Last 30 days of metrics
     }
     
@@ -89,15 +75,17 @@ def trading_metrics_json(request: HttpRequest) -> JsonResponse:
     trade_count_data = []
     win_rate_data = []
     
-    for metric in daily_metrics:
-        labels.append(metric.date.strftime('%Y-%m-%d'))
-        profit_data.append(float(metric.net_profit))
-        trade_count_data.append(metric.total_trades)
+    for day, net_profit, total_trades, winning_trades in daily_metrics.values_list(
+        'date', 'net_profit', 'total_trades', 'winning_trades'
+    ):
+        labels.append(day.strftime('%Y-%m-%d'))
+        profit_data.append(float(net_profit))
+        trade_count_data.append(total_trades)
         
         # Calculate win rate
         win_rate = 0
-        if metric.total_trades > 0:
-            win_rate = (metric.winning_trades / metric.total_trades) * 100
+        if total_trades > 0:
+            win_rate = (winning_trades / total_trades) * 100
         win_rate_data.append(round(win_rate, 2))
     
     return JsonResponse({
@@ -108,16 +96,86 @@ def trading_metrics_json(request: HttpRequest) -> JsonResponse:
     })
 
 
+EQUITY_RESOLUTIONS = {'tick': None, 'hour': 3600, 'day': 86400}
+MAX_TICK_POINTS = 5000
+
+
 @login_required
-def trade_details(request: HttpRequest) -> HttpResponse:
-    """View for detailed trade history with filtering"""
+def equity_curve_json(request: HttpRequest) -> JsonResponse:
+    """Return the closed-trade balance curve from the pre-computed equity buckets"""
     user: User = cast(User, request.user)
     
+    resolution = request.GET.get('resolution', 'day')
+    if resolution not in EQUITY_RESOLUTIONS:
+        return JsonResponse({'error': f"resolution must be one of {', '.join(EQUITY_RESOLUTIONS)}"}, status=400)
+    days = int(request.GET.get('days', 30))
+    start_date = timezone.localdate() - timedelta(days=days)
+    
+    # First request after upgrading: build the series once from the raw trades
+    ensure_equity_series(user.pk)
+    buckets = EquityCurveBucket.objects.filter(user=user, day__gte=start_date).order_by('day')
+    
+    if resolution == 'day':
+        # A day bucket already knows its closing balance
+        rows = list(buckets.values_list('last_timestamp', 'end_balance'))
+        timestamps = np.array([r[0] for r in rows], dtype=np.float64)
+        balances = np.array([r[1] for r in rows], dtype=np.float64)
+    else:
+        rows = list(buckets.values_list('timestamps', 'balances'))
+        timestamps = np.concatenate([np.frombuffer(bytes(r[0]), dtype=np.float64) for r in rows] or [np.empty(0)])
+        balances = np.concatenate([np.frombuffer(bytes(r[1]), dtype=np.float64) for r in rows] or [np.empty(0)])
+        period = EQUITY_RESOLUTIONS[resolution]
+        if period and len(timestamps):
+            # Keep the last point of every period
+            slots = np.floor(timestamps / period)
+            keep = np.flatnonzero(np.append(slots[1:] != slots[:-1], True))
+            timestamps, balances = timestamps[keep], balances[keep]
+        else:
+            timestamps, balances = timestamps[-MAX_TICK_POINTS:], balances[-MAX_TICK_POINTS:]
+    
+    return JsonResponse({
+        'resolution': resolution,
+        'timestamps': (timestamps * 1000).astype(np.int64).tolist(),
+        'balance': np.round(balances, 2).tolist(),
+    })
+
+
+TRADE_PAGE_SIZE = 50
+MAX_TRADE_PAGE_SIZE = 500
+
+
+def _encode_trade_cursor(trade: Dict[str, Any], field: str = 'close_time') -> str:
+    raw = json.dumps([trade[field].isoformat(), trade['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_trade_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, trade_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(trade_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def _trade_history_page(request: HttpRequest, user: User, page_size: int) -> Dict[str, Any]:
+    """
+    Filter a user's trades and return one keyset page of closed trades
+    
+    Closed trades are ordered by ``(close_time, id)`` descending and paged with
+    an opaque cursor holding the last row's key, so every page is an index
+    range scan no matter how deep it is. Open trades (no close time yet) are
+    returned separately, keyset paged the same way on ``(open_time, id)``:
+    their first page comes with the first page of closed trades and later
+    pages are requested with ``open_cursor`` alone.
+    """
     # Get filter parameters
     symbol = request.GET.get('symbol', '')
     strategy = request.GET.get('strategy', '')
     result = request.GET.get('result', '')
     days = int(request.GET.get('days', 30))
+    cursor = _decode_trade_cursor(request.GET.get('cursor', ''))
+    open_cursor = _decode_trade_cursor(request.GET.get('open_cursor', ''))
     
     # Base queryset
     trades = TradeDetail.objects.filter(user=user)
@@ -138,28 +196,103 @@ def trade_details(request: HttpRequest) -> HttpResponse:
         start_date = timezone.now() - timedelta(days=days)
         trades = trades.filter(open_time__gte=start_date)
     
-    # Order by close time descending
-    trades = trades.order_by('-close_time')
+    fields = ['id', 'ticket_id', 'symbol', 'trade_type', 'strategy', 'open_time', 'close_time',
+              'open_price', 'close_price', 'lot_size', 'profit', 'status']
     
-    # Get distinct symbols and strategies for filters
-    symbols = TradeDetail.objects.filter(user=user).values_list('symbol', flat=True).distinct()
-    strategies = TradeDetail.objects.filter(user=user).values_list('strategy', flat=True).distinct()
+    open_trades: List[Dict[str, Any]] = []
+    next_open_cursor = None
+    if cursor is None:
+        opened = trades.filter(close_time__isnull=True)
+        if open_cursor is not None:
+            open_time, trade_id = open_cursor
+            opened = opened.filter(Q(open_time__lt=open_time) | Q(open_time=open_time, id__lt=trade_id))
+        open_trades = list(opened.order_by('-open_time', '-id').values(*fields)[:page_size + 1])
+        if len(open_trades) > page_size:
+            open_trades = open_trades[:page_size]
+            next_open_cursor = _encode_trade_cursor(open_trades[-1], 'open_time')
     
-    context = {
-        'trades': trades,
-        'symbols': symbols,
-        'strategies': strategies,
+    page: List[Dict[str, Any]] = []
+    next_cursor = None
+    if open_cursor is None:
+        closed = trades.filter(close_time__isnull=False)
+        if cursor is not None:
+            close_time, trade_id = cursor
+            closed = closed.filter(Q(close_time__lt=close_time) | Q(close_time=close_time, id__lt=trade_id))
+        page = list(closed.order_by('-close_time', '-id').values(*fields)[:page_size + 1])
+        if len(page) > page_size:
+            page = page[:page_size]
+            next_cursor = _encode_trade_cursor(page[-1])
+    
+    return {
+        'open_trades': open_trades,
+        'trades': page,
+        'next_cursor': next_cursor,
+        'next_open_cursor': next_open_cursor,
         'applied_filters': {
             'symbol': symbol,
             'strategy': strategy,
             'result': result,
             'days': days,
-        }
+        },
+    }
+
+
+@login_required
+def trade_details(request: HttpRequest) -> HttpResponse:
+    """View for detailed trade history with filtering"""
+    user: User = cast(User, request.user)
+    
+    history = _trade_history_page(request, user, TRADE_PAGE_SIZE)
+    
+    # Distinct symbols and strategies for filters, maintained on ingest
+    facets = get_trade_facets(user.pk)
+    
+    next_query = next_open_query = None
+    if history['next_cursor']:
+        params = request.GET.copy()
+        params.pop('open_cursor', None)
+        params['cursor'] = history['next_cursor']
+        next_query = params.urlencode()
+    if history['next_open_cursor']:
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        params['open_cursor'] = history['next_open_cursor']
+        next_open_query = params.urlencode()
+    
+    context = {
+        'trades': history['open_trades'] + history['trades'],
+        'symbols': facets['symbols'],
+        'strategies': facets['strategies'],
+        'applied_filters': history['applied_filters'],
+        'next_query': next_query,
+        'next_open_query': next_open_query,
+        'is_first_page': 'cursor' not in request.GET and 'open_cursor' not in request.GET,
     }
     
     return render(request, 'trading/trade_details.html', context)
 
 
+@login_required
+def trade_details_json(request: HttpRequest) -> JsonResponse:
+    """JSON variant of the trade history with the same filters and cursor"""
+    user: User = cast(User, request.user)
+    
+    try:
+        limit = int(request.GET.get('limit', TRADE_PAGE_SIZE))
+    except ValueError:
+        limit = TRADE_PAGE_SIZE
+    page_size = min(max(limit, 1), MAX_TRADE_PAGE_SIZE)
+    history = _trade_history_page(request, user, page_size)
+    
+    return JsonResponse({
+        'open_trades': history['open_trades'],
+        'trades': history['trades'],
+        'next_cursor': history['next_cursor'],
+        'next_open_cursor': history['next_open_cursor'],
+        'filters': history['applied_filters'],
+    })
+
+
 @login_required
 def symbol_performance(request: HttpRequest) -> HttpResponse:
     """View for symbol-specific performance analysis"""
@@ -170,28 +303,32 @@ def symbol_performance(request: HttpRequest) -> HttpResponse:
     today = timezone.now().date()
     start_date = today - timedelta(days=days)
     
-    # Get symbol performance data
-    symbols = TradeDetail.objects.filter(
+    # Sum the per-day symbol rollups over the range; averages and win rate
+    # are derived from the summed counts in the same query
+    symbols = SymbolDailyStats.objects.filter(
         user=user,
-        status='CLOSED',
-        close_time__date__gte=start_date
+        date__gte=start_date
     ).values('symbol').annotate(
-        total_profit=Sum('profit'),
-        trade_count=Count('id'),
-        win_count=Count('id', filter=Q(profit__gt=0)),
-        loss_count=Count('id', filter=Q(profit__lte=0)),
-        avg_profit=Avg('profit', filter=Q(profit__gt=0)),
-        avg_loss=Avg('profit', filter=Q(profit__lte=0)),
-        max_profit=Max('profit'),
-        max_loss=Min('profit')
-    ).order_by('-total_profit')
-    
-    # Calculate win rate for each symbol
-    for symbol in symbols:
-        if symbol['trade_count'] > 0:
-            symbol['win_rate'] = (symbol['win_count'] / symbol['trade_count']) * 100
-        else:
-            symbol['win_rate'] = 0
+        # Derived values first: later aliases shadow the rollup column names
+        avg_profit=ExpressionWrapper(
+            Cast(Sum('win_profit_sum'), FloatField()) / NullIf(Sum('win_count'), 0), output_field=FloatField()
+        ),
+        avg_loss=ExpressionWrapper(
+            Cast(Sum('loss_profit_sum'), FloatField()) / NullIf(Sum('loss_count'), 0), output_field=FloatField()
+        ),
+        win_rate=Coalesce(
+            ExpressionWrapper(
+                Sum('win_count') * 100.0 / NullIf(Sum('trade_count'), 0), output_field=FloatField()
+            ),
+            0.0,
+        ),
+        max_profit=Max('max_profit'),
+        max_loss=Min('min_profit'),
+        total_profit=Sum('profit_sum'),
+        trade_count=Sum('trade_count'),
+        win_count=Sum('win_count'),
+        loss_count=Sum('loss_count'),
+    ).filter(trade_count__gt=0).order_by('-total_profit')
     
     context = {
         'symbols': symbols,
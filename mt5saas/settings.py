@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -126,6 +127,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # Media files (User uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Monthly AnalyticsEvent/AuditLog archives written by `manage.py archive_logs`
+ARCHIVE_ROOT = os.environ.get('ARCHIVE_ROOT', os.path.join(MEDIA_ROOT, 'archive'))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -159,6 +162,37 @@ COINBASE_COMMERCE_API_KEY = 'your_api_key_here'
 BINANCE_WALLET_ADDRESS = 'your_binance_wallet_address_here'
 # For production, use environment variables or a .env file
 
+# Caches: the default cache stays per-process; throttling state must be shared
+# by every worker, so it lives in a file-based cache (point THROTTLE_CACHE_LOCATION
+# at shared storage, or swap in Redis/Memcached, when running on several hosts).
+# The file cache culls random entries past MAX_ENTRIES, which would reset token
+# buckets, so size it well above the number of active API clients. Listing that
+# many files on every write is slow, so the core backend culls at most once per
+# CULL_INTERVAL seconds (see core/cache_backends.py).
+# 'shared' holds cached data that must be invalidated in every worker at once
+# (license validation results, trading summaries); it needs the same treatment.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'throttle': {
+        'BACKEND': 'core.cache_backends.PeriodicCullFileBasedCache',
+        'LOCATION': os.environ.get('THROTTLE_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'mt5saas-throttle')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('THROTTLE_CACHE_MAX_ENTRIES', 100000)),
+            'CULL_INTERVAL': int(os.environ.get('THROTTLE_CACHE_CULL_INTERVAL', 60)),
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.PeriodicCullFileBasedCache',
+        'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'mt5saas-shared')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('SHARED_CACHE_MAX_ENTRIES', 100000)),
+            'CULL_INTERVAL': int(os.environ.get('SHARED_CACHE_CULL_INTERVAL', 60)),
+        },
+    },
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
@@ -167,4 +201,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_THROTTLE_RATES': {
+        'apikey': '1000/hour',
+    },
 }